@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import argparse
+
+from .pipeline import build
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m bdtopo2refhydro build --workdir /path/to/workdir/
+    """
+    parser = argparse.ArgumentParser(prog='python -m bdtopo2refhydro',
+                                     description='Create the reference hydrographic network from IGN BD TOPO.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='run the create_reference_hydro workflow headless')
+    build_parser.add_argument('--workdir', required=True, help='the main working directory path')
+    build_parser.add_argument('--inputs', default='inputs/', help="the input data folder in workdir (default: inputs/)")
+    build_parser.add_argument('--outputs', default='outputs/', help="the outputs folder in workdir (default: outputs/)")
+    build_parser.add_argument('--buffer-distance', type=float, default=50, help='the outlet distance to the exutoire lines (default: 50)')
+    build_parser.add_argument('--crs', default='EPSG:2154', help='the exutoire layers CRS (default: EPSG:2154)')
+    build_parser.add_argument('--quantization', type=float, default=100000000,
+                              help='quantization factor used to match the endpoints (default: 100000000)')
+    build_parser.add_argument('--snap-tolerance', type=float, default=None,
+                              help='merge the network nodes closer than this distance, in the CRS units (default: no snapping)')
+    build_parser.add_argument('--columnar', action='store_true', default=None,
+                              help='also write the reference troncon and segment layers as Arrow IPC files, the graph '
+                                   'artifact is read from them (needs pyarrow, default: if pyarrow is installed)')
+    build_parser.add_argument('--no-columnar', action='store_false', dest='columnar',
+                              help='do not write the Arrow IPC files')
+    build_parser.add_argument('--no-cache', action='store_true', help='run all the stages')
+    build_parser.add_argument('--partitioned', action='store_true',
+                              help='build the reference network by drainage component in parallel')
+    build_parser.add_argument('--workers', type=int, default=None,
+                              help='number of worker processes (default: the number of cores)')
+    build_parser.add_argument('--artifact', default='reference_hydrographique_graph',
+                              help='name of the graph artifact folder written in the outputs folder, empty to not write it '
+                                   '(default: reference_hydrographique_graph)')
+    build_parser.add_argument('--report', default='run_report',
+                              help='name of the run report saved in the outputs folder (default: run_report)')
+    build_parser.add_argument('--cprofile', action='store_true',
+                              help='dump the cProfile stats of each stage in the outputs profiles folder')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        build(args.workdir, inputs_folder=args.inputs, outputs_folder=args.outputs,
+              buffer_distance=args.buffer_distance, crs=args.crs, quantization=args.quantization,
+              snap_tolerance=args.snap_tolerance, columnar=args.columnar,
+              use_cache=not args.no_cache, partitioned=args.partitioned, workers=args.workers,
+              artifact=args.artifact or None, report=args.report, cprofile=args.cprofile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .columnar import column_names, read_columns, read_lines
+from .graph import csr, gather, topological_levels
+from .intervals import downstream_edges, nested_intervals
+from .orders import network_orders
+
+ARTIFACT_VERSION = 1
+META_NAME = 'meta.json'
+
+# arrays of the artifact, one .npy file each
+ARRAYS = {
+    'fid': "feature id of each troncon in the reference GeoPackage",
+    'cleabs': "BD TOPO identifier of each troncon",
+    'nodea': "from node id of each troncon, nodes numbered from 0",
+    'nodeb': "to node id of each troncon",
+    'down_indptr': "CSR index pointer of the troncons leaving each node",
+    'down_edges': "CSR troncons leaving each node, down_edges[down_indptr[n]:down_indptr[n + 1]]",
+    'up_indptr': "CSR index pointer of the troncons flowing into each node",
+    'up_edges': "CSR troncons flowing into each node, up_edges[up_indptr[n]:up_indptr[n + 1]]",
+    'length': "length of each troncon",
+    'strahler': "Strahler order of each troncon",
+    'outlet': "index of the outlet troncon reached downstream of each troncon, -1 in a cycle",
+    'entry': "DFS entry number of each troncon from its outlet, the upstream troncons x of e have entry[e] <= entry[x] <= exit[e]",
+    'exit': "DFS exit number of each troncon, the last entry number of its upstream troncons",
+}
+
+
+def _compact(values, maximum: int):
+    """
+    Cast ids to int32 when they fit, the artifact is half the size.
+    """
+    return np.asarray(values, dtype=np.int32 if maximum < np.iinfo(np.int32).max else np.int64)
+
+
+def outlet_edges(nodea, nodeb):
+    """
+    Outlet troncon of each troncon, following the first troncon leaving each node (lowest index) downstream,
+    in one downstream pass of the topological levels.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        numpy.ndarray: (E,) index of the outlet edge (without downstream edge) of each edge, -1 for the edges
+            in or upstream of a cycle.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    following = downstream_edges(nodea, nodeb)
+
+    outlet = np.full(len(nodea), -1, dtype=np.int64)
+    for level in reversed(topological_levels(nodea, nodeb)):
+        outlet[level] = np.where(following[level] == -1, level, outlet[np.maximum(following[level], 0)])
+
+    return outlet
+
+
+def write_artifact(path: str, nodea, nodeb, length, fid=None, cleabs=None, strahler=None, meta: dict = None) -> dict:
+    """
+    Write the network graph artifact: one .npy array by item of ARRAYS and a meta.json, in a folder replaced at once.
+
+    The nodes are renumbered from 0 in order of first appearance, the CSR adjacency is stored in both directions.
+
+    Parameters:
+        path (str): The artifact folder.
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each troncon.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each troncon.
+        length (numpy.ndarray): (E,) length of each troncon.
+        fid (numpy.ndarray, optional): (E,) feature id of each troncon in the GeoPackage, 1 to E if None.
+        cleabs (list, optional): (E,) BD TOPO identifier of each troncon, not stored if None.
+        strahler (numpy.ndarray, optional): (E,) Strahler order, computed if None.
+        meta (dict, optional): Additional metadata (ie. the source GeoPackage and layer, the CRS).
+
+    Returns:
+        dict: The artifact metadata.
+
+    Example:
+        write_artifact('outputs/reference_hydrographique_graph', nodea, nodeb, length, fid=fid, cleabs=cleabs)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    length = np.asarray(length, dtype=np.float64)
+    edge_count = len(nodea)
+
+    # dense node ids, in order of first appearance as identify_nodes
+    nodes = np.empty(2 * edge_count, dtype=np.int64)
+    nodes[0::2], nodes[1::2] = nodea, nodeb
+    _, first, inverse = np.unique(nodes, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    nodes = rank[inverse.ravel()]
+    nodea, nodeb = nodes[0::2], nodes[1::2]
+    node_count = len(first)
+
+    if strahler is None:
+        strahler = network_orders(nodea, nodeb, length)['STRAHLER'] if edge_count else np.empty(0, dtype=np.int64)
+    down_indptr, down_edges = csr(nodea, node_count)
+    up_indptr, up_edges = csr(nodeb, node_count)
+
+    arrays = {
+        'fid': np.arange(1, edge_count + 1, dtype=np.int64) if fid is None else np.asarray(fid, dtype=np.int64),
+        'nodea': _compact(nodea, node_count),
+        'nodeb': _compact(nodeb, node_count),
+        'down_indptr': _compact(down_indptr, edge_count),
+        'down_edges': _compact(down_edges, edge_count),
+        'up_indptr': _compact(up_indptr, edge_count),
+        'up_edges': _compact(up_edges, edge_count),
+        'length': length,
+        'strahler': np.asarray(strahler, dtype=np.int8),
+        'outlet': _compact(outlet_edges(nodea, nodeb) if edge_count else np.empty(0), edge_count),
+    }
+    intervals = nested_intervals(nodea, nodeb)
+    arrays['entry'] = _compact(intervals['DFS_ENTRY'], edge_count)
+    arrays['exit'] = _compact(intervals['DFS_EXIT'], edge_count)
+    if cleabs is not None:
+        arrays['cleabs'] = np.array([value or '' for value in cleabs], dtype=bytes)
+
+    meta = dict(meta or dict(),
+                version=ARTIFACT_VERSION, troncons=edge_count, nodes=node_count,
+                outlets=int(np.count_nonzero(arrays['outlet'] == np.arange(edge_count))),
+                arrays={name: {'dtype': str(array.dtype), 'shape': list(array.shape), 'description': ARRAYS[name]}
+                        for name, array in arrays.items()})
+
+    # written aside and renamed, readers never see a partial artifact
+    temporary = f"{path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary, f"{name}.npy"), array)
+    with open(os.path.join(temporary, META_NAME), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temporary, path)
+
+    return meta
+
+
+def line_lengths(coordinates, offsets) -> np.ndarray:
+    """
+    Planar length of each line (z ignored, as QgsGeometry.length), from the cumulative length of all the vertices.
+
+    Parameters:
+        coordinates (numpy.ndarray): (M, 2) or (M, 3) vertex coordinates of all the lines.
+        offsets (numpy.ndarray): (N + 1,) offsets, the vertices of the i-th line being coordinates[offsets[i]:offsets[i + 1]].
+
+    Returns:
+        numpy.ndarray: (N,) float64 length of each line.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    # length from the first vertex of the array to each vertex
+    cumulative = np.zeros(max(len(coordinates), 1), dtype=np.float64)
+    if len(coordinates) > 1:
+        np.cumsum(np.hypot(*np.diff(np.asarray(coordinates, dtype=np.float64)[:, :2], axis=0).T), out=cumulative[1:])
+
+    # between the first and the last vertex of each line, 0 for the lines without vertex
+    first = np.minimum(offsets[:-1], len(cumulative) - 1)
+    last = np.maximum(offsets[1:] - 1, first)
+    return cumulative[last] - cumulative[first]
+
+
+def write_table_artifact(path: str, table_path: str, from_node_field: str = 'NODEA', to_node_field: str = 'NODEB',
+                         meta: dict = None) -> dict:
+    """
+    Write the network graph artifact from a columnar Arrow IPC file (see columnar.write_table). The file is memory
+    mapped and only its node id, fid and cleabs columns and its line coordinates are read.
+
+    Parameters:
+        path (str): The artifact folder.
+        table_path (str): The Arrow IPC file of the troncons, with the from and to node columns.
+        from_node_field (str, optional): The from node column. Default is 'NODEA'.
+        to_node_field (str, optional): The to node column. Default is 'NODEB'.
+        meta (dict, optional): Additional metadata (ie. the source GeoPackage and layer, the CRS).
+
+    Returns:
+        dict: The artifact metadata.
+
+    Example:
+        write_table_artifact('outputs/reference_hydrographique_graph', 'outputs/reference_hydrographique_troncon.arrow')
+    """
+    names = [from_node_field, to_node_field] + [name for name in ('fid', 'cleabs') if name in column_names(table_path)]
+    columns = read_columns(table_path, names)
+    coordinates, offsets = read_lines(table_path)
+
+    return write_artifact(path, columns[from_node_field], columns[to_node_field], line_lengths(coordinates, offsets),
+                          fid=columns.get('fid'), cleabs=columns.get('cleabs'),
+                          meta=dict(meta or dict(), table=os.path.basename(table_path)))
+
+
+class GraphArtifact:
+    """
+    Network graph artifact memory mapped from its folder, topological queries without reading the GeoPackage.
+
+    Example:
+        graph = GraphArtifact('outputs/reference_hydrographique_graph')
+        upstream = graph.upstream(graph.edge_index([fid]))
+        outlet_fids = graph.fid[graph.outlet[upstream]]
+    """
+
+    def __init__(self, path: str):
+        """
+        Parameters:
+            path (str): The artifact folder, from write_artifact.
+
+        Raises:
+            IOError: If the artifact is missing or of another version.
+        """
+        meta_path = os.path.join(path, META_NAME)
+        if not os.path.exists(meta_path):
+            raise IOError(f"{path} n'a pas été chargée correctement")
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != ARTIFACT_VERSION:
+            raise IOError(f"{path}: artifact version {self.meta.get('version')}, expected {ARTIFACT_VERSION}")
+
+        for name in self.meta['arrays']:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+
+        self._fid_order = None
+
+    def __len__(self) -> int:
+        return self.meta['troncons']
+
+    def edge_index(self, fids):
+        """
+        Troncon indices of GeoPackage feature ids, -1 for the unknown ones.
+        """
+        fids = np.asarray(fids, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(fids), -1, dtype=np.int64)
+
+        if self._fid_order is None:
+            self._fid_order = np.argsort(self.fid, kind='stable')
+        index = self._fid_order[np.minimum(np.searchsorted(self.fid, fids, sorter=self._fid_order), len(self) - 1)]
+
+        return np.where(self.fid[index] == fids, index, -1)
+
+    def _walk(self, edges, indptr, items, heads):
+        """
+        Breadth-first search of the edges reached from the seeds on the stored CSR adjacency.
+        """
+        reached = np.zeros(len(self), dtype=bool)
+        frontier = np.unique(np.asarray(edges, dtype=np.int64))
+        reached[frontier] = True
+        visited = np.zeros(self.meta['nodes'], dtype=bool)
+
+        while frontier.size:
+            nodes = np.unique(heads[frontier])
+            nodes = nodes[~visited[nodes]]
+            visited[nodes] = True
+            frontier = gather(indptr, items, nodes).astype(np.int64)
+            frontier = frontier[~reached[frontier]]
+            reached[frontier] = True
+
+        return np.flatnonzero(reached)
+
+    def upstream(self, edges):
+        """
+        Sorted indices of the troncons upstream of the edges, edges included.
+        """
+        return self._walk(edges, self.up_indptr, self.up_edges, self.nodea)
+
+    def downstream(self, edges):
+        """
+        Sorted indices of the troncons downstream of the edges, edges included.
+        """
+        return self._walk(edges, self.down_indptr, self.down_edges, self.nodeb)
+
+    def is_upstream(self, edges, of):
+        """
+        Whether each troncon of edges is upstream of the troncon of (itself included), in constant time
+        with the nested intervals.
+        """
+        entry = self.entry[np.asarray(edges, dtype=np.int64)]
+        return (self.entry[of] >= 0) & (entry >= self.entry[of]) & (entry <= self.exit[of])
+
+    def drainage(self, outlet):
+        """
+        Sorted indices of the troncons draining to an outlet troncon.
+        """
+        return np.flatnonzero(self.outlet == outlet)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import json
+import argparse
+
+from .run import SIZES, run_benchmark
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m bdtopo2refhydro.benchmark --sizes 10000 100000 --output benchmark.json
+    """
+    parser = argparse.ArgumentParser(prog='python -m bdtopo2refhydro.benchmark',
+                                     description='Time the workflow stages on synthetic river networks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES),
+                        help='numbers of troncons of the networks (default: 10000 100000 1000000)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: the number of cores)')
+    parser.add_argument('--qgis', dest='qgis', action='store_true', default=None, help='also time the QGIS stages')
+    parser.add_argument('--no-qgis', dest='qgis', action='store_false', help='only time the native stages')
+    parser.add_argument('--workdir', default=None, help='working directory of the QGIS stages')
+    parser.add_argument('--no-trace-memory', action='store_true', help='do not measure the peak allocations')
+    parser.add_argument('--seed', type=int, default=0, help='random generator seed (default: 0)')
+    parser.add_argument('--output', default=None, help='JSON file of the records')
+
+    args = parser.parse_args(argv)
+
+    records = run_benchmark(sizes=args.sizes, workers=args.workers, qgis=args.qgis, workdir=args.workdir,
+                            trace_memory=not args.no_trace_memory, seed=args.seed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(records, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
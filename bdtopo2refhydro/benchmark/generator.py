@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import struct
+
+import numpy as np
+
+# natures of the synthetic troncons
+COURS_D_EAU = "Cours d'eau"
+CANAL = 'Canal'
+
+
+def _tree_positions(parent, step):
+    """
+    Position of each node of a forest, the sum of the steps from its root, by pointer jumping.
+    The roots have a parent of -1.
+    """
+    position = step.copy()
+    ancestor = parent.copy()
+    while True:
+        linked = ancestor != -1
+        if not linked.any():
+            break
+        position = position + np.where(linked[:, None], position[np.maximum(ancestor, 0)], 0.0)
+        ancestor = np.where(linked, ancestor[np.maximum(ancestor, 0)], -1)
+
+    return position
+
+
+def _line_wkb(coordinates) -> bytes:
+    return struct.pack('<BII', 1, 2, len(coordinates)) + np.ascontiguousarray(coordinates, dtype='<f8').tobytes()
+
+
+def _polygon_wkb(ring) -> bytes:
+    return struct.pack('<BIII', 1, 3, 1, len(ring)) + np.ascontiguousarray(ring, dtype='<f8').tobytes()
+
+
+def synthetic_network(troncons: int, basins: int = None, reach_length: float = 250, braiding: float = 0.02,
+                      canals: float = 0.01, reversed_reaches: float = 0.005, orphans: float = 0.01,
+                      surface: float = 0.1, buffer_distance: float = 50, seed: int = 0) -> dict:
+    """
+    Generate a synthetic dendritic river network with the defects handled by the workflow.
+
+    Each basin is a random tree growing upstream (north) from its outlet on a straight coastline (y = 0):
+    every new node joins a recent node of its basin, which gives long chains of reaches and confluences
+    like a real network. Then are added:
+    - braids, a second channel from a node to the node two reaches downstream,
+    - canals (nature 'Canal'), channels between nodes of neighbouring basins,
+    - reversed reaches, digitised from downstream to upstream (sens_de_l_ecoulement 'Inverse'),
+    - orphan reaches, small networks not connected to any outlet.
+
+    Parameters:
+        troncons (int): Approximate number of troncons (reaches).
+        basins (int, optional): Number of basins (outlets). Default is None, one by 500 troncons.
+        reach_length (float, optional): Mean reach length, in map units. Default is 250.
+        braiding (float, optional): Ratio of braided reaches. Default is 0.02.
+        canals (float, optional): Ratio of canals. Default is 0.01.
+        reversed_reaches (float, optional): Ratio of reversed reaches. Default is 0.005.
+        orphans (float, optional): Ratio of orphan reaches. Default is 0.01.
+        surface (float, optional): Ratio of reaches covered by the hydrographic surface. Default is 0.1.
+        buffer_distance (float, optional): The exutoire buffer distance. Default is 50.
+        seed (int, optional): Random generator seed. Default is 0.
+
+    Returns:
+        dict: The network arrays:
+            - 'coordinates', 'offsets' : the vertices of the troncons, troncon i is coordinates[offsets[i]:offsets[i + 1]],
+            - 'start', 'end' : (N, 2) first and last vertex of each troncon,
+            - 'length', 'nature', 'sens_de_l_ecoulement', 'cleabs' : troncon attributes,
+            - 'outlets' : indices of the troncons flowing into the coastline,
+            - 'exutoire' : the WKB of the coastline lines, 'exutoire_buffer' : their buffer polygons,
+            - 'surface' : the WKB of the hydrographic surface polygons (non overlapping tiles).
+
+    Example:
+        network = synthetic_network(100000, seed=1)
+    """
+    rng = np.random.default_rng(seed)
+    basins = basins or max(1, troncons // 500)
+
+    n_orphans = int(troncons * orphans)
+    n_braids = int(troncons * braiding)
+    n_canals = int(troncons * canals)
+    nodes_per_basin = max(2, (troncons - n_orphans - n_braids - n_canals) // basins + 1)
+
+    # random dendritic trees, a node joins a recent node of its basin
+    local = np.tile(np.arange(nodes_per_basin), basins)
+    basin = np.repeat(np.arange(basins), nodes_per_basin)
+    back = rng.geometric(0.2, size=len(local)) + (rng.random(len(local)) < 0.3) * rng.integers(0, 50, len(local))
+    back = np.minimum(back, np.maximum(local, 1))
+    parent = np.where(local == 0, np.arange(len(local)), np.arange(len(local)) - back)
+
+    # steps growing upstream, the roots (outlets) on the coastline
+    basin_width = reach_length * np.sqrt(nodes_per_basin) * 2
+    angle = rng.uniform(0.15 * np.pi, 0.85 * np.pi, len(local))
+    distance = rng.exponential(reach_length, len(local)) + reach_length * 0.1
+    step = np.column_stack([np.cos(angle) * distance, np.sin(angle) * distance])
+    step[local == 0] = np.column_stack([(basin[local == 0] + 0.5) * basin_width, np.zeros(basins)])
+    position = _tree_positions(np.where(local == 0, -1, parent), step)
+    position[:, 0] = np.clip(position[:, 0], basin * basin_width + 1, (basin + 1) * basin_width - 1)
+
+    child = np.flatnonzero(local > 0)
+    from_node, to_node = child, parent[child]
+    category = np.zeros(len(child), dtype=np.int8)
+
+    # braids, to the node two reaches downstream
+    braided = rng.choice(child[local[parent[child]] > 0], size=min(n_braids, int((local[parent[child]] > 0).sum())),
+                         replace=False)
+    from_node = np.concatenate([from_node, braided])
+    to_node = np.concatenate([to_node, parent[parent[braided]]])
+    category = np.concatenate([category, np.ones(len(braided), dtype=np.int8)])
+
+    # canals, between close nodes of neighbouring basins
+    if basins > 1 and n_canals:
+        a = rng.choice(child, size=n_canals)
+        b_basin = np.minimum(basin[a] + 1, basins - 1)
+        b = b_basin * nodes_per_basin + rng.integers(1, nodes_per_basin, n_canals)
+        keep = b_basin != basin[a]
+        from_node = np.concatenate([from_node, a[keep]])
+        to_node = np.concatenate([to_node, b[keep]])
+        category = np.concatenate([category, np.full(int(keep.sum()), 2, dtype=np.int8)])
+
+    start, end = position[from_node], position[to_node]
+
+    # orphan reaches, short chains in the sea (y < 0), away from the coastline
+    if n_orphans:
+        orphan_start = np.column_stack([rng.uniform(0, basins * basin_width, n_orphans),
+                                        rng.uniform(-50 * reach_length, -10 * reach_length, n_orphans)])
+        orphan_end = orphan_start + rng.normal(0, reach_length, (n_orphans, 2))
+        start = np.concatenate([start, orphan_start])
+        end = np.concatenate([end, orphan_end])
+        category = np.concatenate([category, np.full(n_orphans, 3, dtype=np.int8)])
+
+    n = len(start)
+    outlets = np.flatnonzero((category < 3)[:len(from_node)] & (local[to_node] == 0))
+
+    # a middle vertex, shifted for the braids so both channels do not overlap
+    middle = (start + end) / 2 + rng.normal(0, reach_length * 0.05, (n, 2))
+    middle[category == 1] += reach_length * 0.2
+
+    # reversed reaches, digitised upstream
+    reversed_mask = rng.random(n) < reversed_reaches
+    start[reversed_mask], end[reversed_mask] = end[reversed_mask].copy(), start[reversed_mask].copy()
+
+    coordinates = np.empty((3 * n, 2))
+    coordinates[0::3], coordinates[1::3], coordinates[2::3] = start, middle, end
+    offsets = np.arange(0, 3 * n + 1, 3, dtype=np.int64)
+    length = (np.linalg.norm(middle - start, axis=1) + np.linalg.norm(end - middle, axis=1))
+
+    nature = np.where(category == 2, CANAL, COURS_D_EAU).astype(object)
+    sens = np.where(reversed_mask, 'Inverse', 'Sens direct').astype(object)
+    cleabs = np.array([f"TRON{i:016d}" for i in range(n)], dtype=object)
+
+    # coastline, one line by basin, and its buffer as rectangles
+    xs = np.arange(basins + 1) * basin_width
+    exutoire = [_line_wkb([[xs[i], 0.0], [xs[i + 1], 0.0]]) for i in range(basins)]
+    exutoire_buffer = [_polygon_wkb([[xs[i] - buffer_distance, -buffer_distance],
+                                     [xs[i + 1] + buffer_distance, -buffer_distance],
+                                     [xs[i + 1] + buffer_distance, buffer_distance],
+                                     [xs[i] - buffer_distance, buffer_distance],
+                                     [xs[i] - buffer_distance, -buffer_distance]]) for i in range(basins)]
+
+    # hydrographic surface, square tiles around a part of the reaches (main stems near the outlets)
+    tile = reach_length * 2
+    covered = np.argsort(position[to_node[:len(from_node)], 1])[:int(len(from_node) * surface)]
+    cells = np.unique(np.floor(((start[covered] + end[covered]) / 2) / tile).astype(np.int64), axis=0)
+    surface_wkb = [_polygon_wkb(np.array([[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]) * tile)
+                   for x, y in cells.tolist()]
+
+    return {'coordinates': coordinates, 'offsets': offsets, 'start': start, 'end': end, 'length': length,
+            'nature': nature, 'sens_de_l_ecoulement': sens, 'cleabs': cleabs, 'outlets': outlets,
+            'exutoire': exutoire, 'exutoire_buffer': exutoire_buffer, 'surface': surface_wkb}
+
+
+def lines_wkb(network: dict) -> list:
+    """
+    WKB of the troncons of a synthetic network.
+    """
+    coordinates, offsets = network['coordinates'], network['offsets']
+    return [_line_wkb(coordinates[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
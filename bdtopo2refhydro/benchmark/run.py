@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+import shutil
+import tempfile
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..artifact import GraphArtifact, write_artifact
+from ..dedup import duplicates, line_digests
+from ..directions import infer_directions
+from ..graph import connected_edges, fix_network_connectivity, UPDOWNSTREAM
+from ..intervals import nested_intervals
+from ..nodes import identify_nodes, snap_nodes
+from ..orders import network_orders, upstream_accumulation
+from ..partition import partitioned_build
+from ..principal_stem import principal_stem
+from ..profiling import cpu_time, peak_rss
+from ..segments import aggregate_segments
+from ..validation import validate_network
+from .generator import CANAL, synthetic_network, lines_wkb
+
+try:
+    from osgeo import ogr, osr
+except ImportError:
+    ogr = None
+
+# sizes of the benchmark networks, in troncons
+SIZES = (10000, 100000, 1000000)
+
+
+def _timed(name: str, troncons: int, function, trace_memory: bool):
+    """
+    Run a function and measure it. Returns (result, record).
+    """
+    if trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), cpu_time()
+    result = function()
+    record = {'stage': name, 'troncons': troncons,
+              'wall_time': time.perf_counter() - wall, 'cpu_time': cpu_time() - cpu,
+              'process_peak_rss_mb': peak_rss()}
+    if trace_memory:
+        record['peak_alloc_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    record['throughput'] = troncons / record['wall_time'] if record['wall_time'] > 0 else float('inf')
+
+    print(f"{troncons:>9} {name:<28} {record['wall_time']:>9.2f} s {record['throughput']:>12.0f} troncons/s"
+          + (f" {record['peak_alloc_mb']:>9.0f} MB" if trace_memory else ''))
+    return result, record
+
+
+def native_stages(network: dict, workers: int = None, trace_memory: bool = True) -> list:
+    """
+    Time the native array stages of the workflow on a synthetic network, without QGIS:
+    duplicate geometries, node identification and snapping, topology validation, flow direction inference,
+    canal removal connectivity fix (fix_suppr_canal_auto), connected reaches, principal stem, segments,
+    nested intervals, upstream accumulation, orders (create_5m_width_hydro_network),
+    partitioned build, graph artifact write and upstream query, if pyarrow is installed the columnar interchange
+    and, if shapely is installed, the gap finder and the length in surface overlay.
+
+    Parameters:
+        network (dict): The synthetic network, from generator.synthetic_network.
+        workers (int, optional): Number of worker processes of the parallel stages. Default is None, the number of cores.
+        trace_memory (bool, optional): If True, also measure the peak of the allocations of each stage
+            with tracemalloc (slower). Default is True.
+
+    Returns:
+        list: A record dict by stage.
+    """
+    n = len(network['length'])
+    records = []
+
+    def run(name, function):
+        result, record = _timed(name, n, function, trace_memory)
+        records.append(record)
+        return result
+
+    run('duplicate_geometries', lambda: duplicates(line_digests(network['coordinates'], network['offsets'],
+                                                                quantization=100000000)))
+    nodea, nodeb = run('identify_nodes', lambda: identify_nodes(network['start'], network['end']))
+    run('snap_nodes', lambda: snap_nodes(nodea, nodeb, network['start'], network['end'], tolerance=1.0))
+    run('validate_network', lambda: validate_network(nodea, nodeb, network['outlets']))
+    subset = (network['nature'] != CANAL) | np.isin(np.arange(n), network['outlets'])
+    # the outlet nodes are on the coastline (y = 0)
+    outlet_nodes = np.where(np.abs(network['end'][:, 1]) <= np.abs(network['start'][:, 1]), nodeb, nodea)[network['outlets']]
+    run('infer_directions', lambda: infer_directions(nodea, nodeb, outlet_nodes, subset=subset))
+    run('fix_network_connectivity', lambda: fix_network_connectivity(nodea, nodeb, subset))
+    connected = run('connected_edges', lambda: connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM))
+    stem = connected[run('principal_stem', lambda: principal_stem(nodea[connected], nodeb[connected],
+                                                                  network['length'][connected]))]
+    run('aggregate_segments', lambda: aggregate_segments(nodea[stem], nodeb[stem]))
+    run('nested_intervals', lambda: nested_intervals(nodea[stem], nodeb[stem]))
+    run('upstream_accumulation', lambda: upstream_accumulation(nodea[stem], nodeb[stem], network['length'][stem]))
+    run('network_orders', lambda: network_orders(nodea[stem], nodeb[stem], network['length'][stem]))
+    run('partitioned_build', lambda: partitioned_build(nodea, nodeb, network['length'], network['outlets'],
+                                                       workers=workers))
+
+    try:
+        from ..columnar import read_columns, read_lines, write_table
+        path = os.path.join(tempfile.mkdtemp(), 'network.arrow')
+        run('columnar_write', lambda: write_table(path, {'NODEA': nodea, 'NODEB': nodeb, 'length': network['length'],
+                                                         'nature': network['nature'].tolist()},
+                                                  coordinates=network['coordinates'], offsets=network['offsets']))
+        run('columnar_read', lambda: (read_lines(path), read_columns(path, ['NODEA', 'NODEB'])))
+        shutil.rmtree(os.path.dirname(path))
+    except ImportError:
+        print('pyarrow not installed, columnar interchange not measured')
+
+    folder = tempfile.mkdtemp()
+    run('graph_artifact', lambda: write_artifact(os.path.join(folder, 'graph'), nodea[stem], nodeb[stem], network['length'][stem]))
+    run('graph_artifact_upstream', lambda: GraphArtifact(os.path.join(folder, 'graph')).upstream(np.arange(0, len(stem), 1000)))
+    shutil.rmtree(folder)
+
+    try:
+        from ..gaps import find_gaps
+        connected_mask = np.zeros(n, dtype=bool)
+        connected_mask[connected] = True
+        run('find_gaps', lambda: find_gaps(nodea, nodeb, network['start'], network['end'], network['length'],
+                                           connected_mask, exutoire=network['exutoire']))
+    except ImportError:
+        print('shapely not installed, gap finder not measured')
+
+    try:
+        from ..overlay import length_in_surface
+        lines = lines_wkb(network)
+        run('length_in_surface', lambda: length_in_surface(lines, network['surface'], workers=workers))
+    except ImportError:
+        print('shapely not installed, length_in_surface not measured')
+
+    return records
+
+
+def write_workdir(network: dict, workdir: str, crs: int = 2154) -> None:
+    """
+    Write a synthetic network as the inputs and outputs of the create_reference_hydro workflow (needs GDAL):
+    the troncon layer to correct, empty correction layers and the exutoire creation layers.
+
+    Parameters:
+        network (dict): The synthetic network, from generator.synthetic_network.
+        workdir (str): The working directory, the inputs/ and outputs/ folders are created in it.
+        crs (int, optional): The EPSG code of the layers. Default is 2154.
+    """
+    from ..pipeline import LAYERS
+
+    if ogr is None:
+        raise ImportError("GDAL python bindings are needed to write the benchmark GeoPackages")
+    ogr.UseExceptions()
+
+    inputs, outputs = os.path.join(workdir, 'inputs'), os.path.join(workdir, 'outputs')
+    os.makedirs(inputs, exist_ok=True)
+    os.makedirs(outputs, exist_ok=True)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(crs)
+    driver = ogr.GetDriverByName('GPKG')
+
+    def create(path, layers):
+        if os.path.exists(path):
+            driver.DeleteDataSource(path)
+        datasource = driver.CreateDataSource(path)
+        for name, geometry_type, fields, rows in layers:
+            layer = datasource.CreateLayer(name, srs, geometry_type)
+            for field in fields:
+                layer.CreateField(ogr.FieldDefn(field, ogr.OFTString))
+            definition = layer.GetLayerDefn()
+            layer.StartTransaction()
+            for wkb, *values in rows:
+                feature = ogr.Feature(definition)
+                for field, value in zip(fields, values):
+                    feature.SetField(field, value)
+                feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+                layer.CreateFeature(feature)
+            layer.CommitTransaction()
+        datasource = None
+
+    troncon_fields = ['cleabs', 'nature', 'sens_de_l_ecoulement']
+    create(os.path.join(outputs, LAYERS['troncon_hydrographique_cours_d_eau_corr_gpkg']),
+           [(LAYERS['troncon_hydrographique_cours_d_eau_corr'], ogr.wkbLineString, troncon_fields,
+             zip(lines_wkb(network), network['cleabs'], network['nature'], network['sens_de_l_ecoulement']))])
+
+    corrections = ('troncon_hydrographique_corr_connection_and_dir_ecoulement', 'troncon_hydrographique_corr_connection',
+                   'troncon_hydrographique_corr_dir_ecoulement', 'troncon_hydrographique_corr_geom',
+                   'troncon_hydrographique_corr_suppr_canal_multichenal')
+    create(os.path.join(inputs, LAYERS['corr_reseau_hydrographique_gpkg']),
+           [(LAYERS[key], ogr.wkbLineString, troncon_fields, []) for key in corrections])
+
+    create(os.path.join(inputs, LAYERS['creation_exutoire_gpkg']),
+           [(LAYERS['plan_d_eau_layername'], ogr.wkbPolygon, [], []),
+            (LAYERS['frontiere_layername'], ogr.wkbLineString, [], []),
+            (LAYERS['limite_terre_mer_layername'], ogr.wkbLineString, [], ((wkb, ) for wkb in network['exutoire']))])
+
+
+def qgis_stages(network: dict, workdir: str, workers: int = None) -> list:
+    """
+    Time the QGIS stages of the create_reference_hydro workflow (create_exutoire, fix_corrections,
+    fix_suppr_canal_auto, propose_direction_corrections, create_connected_reference_hydro) on a synthetic network,
+    with the pipeline run report.
+
+    Parameters:
+        network (dict): The synthetic network, from generator.synthetic_network.
+        workdir (str): The working directory of the benchmark run.
+        workers (int, optional): Number of worker processes. Default is None, the number of cores.
+
+    Returns:
+        list: A record dict by stage and by processing.run call.
+    """
+    from ..pipeline import build
+
+    n = len(network['length'])
+    write_workdir(network, workdir)
+    build(workdir, use_cache=False, workers=workers, report='run_report')
+
+    with open(os.path.join(workdir, 'outputs', 'run_report.json'), encoding='utf-8') as report_file:
+        report = json.load(report_file)
+
+    records = []
+    for record in report['stages'] + report['processing_calls']:
+        name = record['stage'] if 'algorithm' not in record else f"{record['stage']}:{record['algorithm']}"
+        throughput = n / record['wall_time'] if record['wall_time'] > 0 else float('inf')
+        records.append(dict(record, stage=name, troncons=n, throughput=throughput))
+        print(f"{n:>9} {name:<28} {record['wall_time']:>9.2f} s {throughput:>12.0f} troncons/s")
+
+    return records
+
+
+def run_benchmark(sizes=SIZES, workers: int = None, qgis: bool = None, workdir: str = None,
+                  trace_memory: bool = True, seed: int = 0) -> list:
+    """
+    Run the benchmark on synthetic networks of each size.
+
+    Parameters:
+        sizes (tuple, optional): Numbers of troncons of the networks. Default is (10000, 100000, 1000000).
+        workers (int, optional): Number of worker processes of the parallel stages. Default is None, the number of cores.
+        qgis (bool, optional): If True, also time the QGIS workflow stages. Default is None, True if qgis is importable.
+        workdir (str, optional): The working directory of the QGIS stages. Default is None, ./benchmark_workdir.
+        trace_memory (bool, optional): If True, measure the peak allocations of the native stages. Default is True.
+        seed (int, optional): Random generator seed. Default is 0.
+
+    Returns:
+        list: A record dict by size and stage (stage, troncons, wall_time, cpu_time, throughput, process_peak_rss_mb...).
+
+    Example:
+        records = run_benchmark(sizes=(10000, 100000))
+    """
+    if qgis is None:
+        try:
+            import qgis.core  # noqa: F401
+            qgis = ogr is not None
+        except ImportError:
+            qgis = False
+
+    records = []
+    for size in sizes:
+        network, generated = _timed('generate', size, lambda: synthetic_network(size, seed=seed), False)
+        records.append(generated)
+        records.extend(native_stages(network, workers=workers, trace_memory=trace_memory))
+        if qgis:
+            records.extend(qgis_stages(network, os.path.join(workdir or 'benchmark_workdir', str(size)), workers=workers))
+
+    return records
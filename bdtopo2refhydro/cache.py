@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+from pathlib import Path
+
+# name of the cache manifest, saved in the outputs folder
+MANIFEST_NAME = 'stage_cache.json'
+
+
+def layer_digest(gpkg_path: str, layername: str, batch_size: int = 10000):
+    """
+    Hash the content (columns and rows, geometry blobs included) of a GeoPackage layer with blake2b.
+    The GeoPackage is read with sqlite3 in read-only mode, without QGIS.
+
+    Parameters:
+        gpkg_path (str): The path of the GeoPackage.
+        layername (str): The name of the layer (table) in the GeoPackage.
+        batch_size (int, optional): Number of rows hashed at once. Default is 10000.
+
+    Returns:
+        str: The hexadecimal digest, None if the file or the layer does not exist.
+    """
+    if not os.path.exists(gpkg_path):
+        return None
+
+    connection = sqlite3.connect(Path(gpkg_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        table = layername.replace('"', '""')
+        try:
+            cursor = connection.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+        except sqlite3.OperationalError:
+            return None
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr([column[0] for column in cursor.description]).encode('utf-8'))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            digest.update(repr(rows).encode('utf-8'))
+    finally:
+        connection.close()
+
+    return digest.hexdigest()
+
+
+def stage_key(stage: str, digests: dict, params: dict) -> str:
+    """
+    Key of a stage run: hash of the stage name, of its input layers digests and of its parameters.
+    """
+    content = json.dumps({'stage': stage, 'inputs': digests, 'params': params}, sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class StageCache:
+    """
+    Content-hashed cache of the workflow stages, recorded in a JSON manifest.
+
+    A stage is skipped when the key of its inputs and parameters is the one of its last run and its outputs
+    are still the ones written by that run. The outputs of a skipped stage are reused as they are in the outputs
+    folder, so the next stages only rerun if their own inputs changed.
+
+    Parameters:
+        outputs_path (str): The outputs folder, where the manifest is saved.
+
+    Example:
+        cache = StageCache(wd + outputs)
+        if not cache.is_fresh('create_exutoire', inputs, outputs, params):
+            digests = cache.digests(inputs)
+            ...  # run the stage
+            cache.record('create_exutoire', digests, outputs, params)
+    """
+
+    def __init__(self, outputs_path: str):
+        self.manifest_path = os.path.join(outputs_path, MANIFEST_NAME)
+        self.manifest = dict()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as manifest_file:
+                self.manifest = json.load(manifest_file)
+
+    @staticmethod
+    def digests(layers) -> dict:
+        """
+        Digests of the (gpkg_path, layername) layers, keyed by 'gpkg_path|layername'.
+        """
+        return {f"{gpkg_path}|{layername}": layer_digest(gpkg_path, layername) for gpkg_path, layername in layers}
+
+    def is_fresh(self, stage: str, inputs, outputs, params: dict = None) -> bool:
+        """
+        Check if a stage can be skipped.
+
+        Parameters:
+            stage (str): The stage name.
+            inputs (list): The (gpkg_path, layername) input layers of the stage.
+            outputs (list): The (gpkg_path, layername) output layers of the stage.
+            params (dict, optional): The stage parameters (buffer_distance, quantization, crs...).
+
+        Returns:
+            bool: True if the inputs, parameters and outputs are unchanged since the last run.
+        """
+        entry = self.manifest.get(stage)
+        if entry is None:
+            return False
+
+        key = stage_key(stage, self.digests(inputs), params or dict())
+        if key != entry['key']:
+            return False
+
+        current = self.digests(outputs)
+        return all(digest is not None for digest in current.values()) and current == entry['outputs']
+
+    def record(self, stage: str, input_digests: dict, outputs, params: dict = None) -> None:
+        """
+        Record a stage run in the manifest.
+
+        Parameters:
+            stage (str): The stage name.
+            input_digests (dict): The input digests computed before the run.
+            outputs (list): The (gpkg_path, layername) output layers of the stage.
+            params (dict, optional): The stage parameters.
+        """
+        params = params or dict()
+        self.manifest[stage] = {'key': stage_key(stage, input_digests, params),
+                                'outputs': self.digests(outputs),
+                                'params': params}
+
+        with open(self.manifest_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2, sort_keys=True, default=str)
+
+    def invalidate(self, stage: str = None) -> None:
+        """
+        Forget a stage (or all the stages if None), to force the next run.
+        """
+        if stage is None:
+            self.manifest.clear()
+        else:
+            self.manifest.pop(stage, None)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'w', encoding='utf-8') as manifest_file:
+                json.dump(self.manifest, manifest_file, indent=2, sort_keys=True, default=str)
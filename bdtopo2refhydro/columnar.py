@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import json
+import struct
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+# name of the geometry column, as in GeoParquet
+GEOMETRY_COLUMN = 'geometry'
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is needed for the columnar files (pip install pyarrow)")
+
+
+def has_pyarrow() -> bool:
+    """
+    Whether pyarrow is installed, the columnar files can be written and read.
+    """
+    return pa is not None
+
+
+def _projjson(crs):
+    """
+    PROJJSON of a CRS for the "geo" metadata, None (unknown CRS) if it is not given or pyproj is not installed.
+    """
+    if crs is None or isinstance(crs, dict):
+        return crs
+    if pyproj is None:
+        return None
+    return pyproj.CRS.from_user_input(crs).to_json_dict()
+
+
+def _line_array(coordinates, offsets):
+    """
+    GeoArrow interleaved linestring array, list of [x, y] or [x, y, z] vertices
+    (64-bit offsets above 2^31 vertices).
+    """
+    dimension = coordinates.shape[1]
+    vertex_type = pa.list_(pa.field('xy' if dimension == 2 else 'xyz', pa.float64()), dimension)
+    vertices = pa.FixedSizeListArray.from_arrays(pa.array(coordinates.ravel()), type=vertex_type)
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if offsets[-1] < np.iinfo(np.int32).max:
+        return pa.ListArray.from_arrays(pa.array(offsets.astype(np.int32)), vertices,
+                                        type=pa.list_(pa.field('vertices', vertex_type)))
+
+    return pa.LargeListArray.from_arrays(pa.array(offsets), vertices,
+                                         type=pa.large_list(pa.field('vertices', vertex_type)))
+
+
+def write_table(path: str, columns: dict, coordinates=None, offsets=None, wkb: list = None, crs=None) -> None:
+    """
+    Write a line network as an uncompressed Arrow IPC file, with the geometries as GeoArrow interleaved
+    linestring coordinates or as WKB, and the "geo" metadata of GeoParquet 1.1.0 (which defines the native
+    'linestring' encoding). The file is memory mapped when read, without copy.
+
+    Parameters:
+        path (str): The output file path (.arrow).
+        columns (dict): Attribute name to (N,) array or list mapping (ie. NODEA and NODEB int64 arrays).
+        coordinates (numpy.ndarray, optional): (M, 2) or (M, 3) vertex coordinates of all the lines.
+        offsets (numpy.ndarray, optional): (N + 1,) offsets, the vertices of the i-th line being coordinates[offsets[i]:offsets[i + 1]].
+        wkb (list, optional): The WKB of each line, used if coordinates is None.
+        crs (str or dict, optional): The CRS of the geometries, a PROJJSON dict or a pyproj input (ie. 'EPSG:2154')
+            written as PROJJSON. Written as null (unknown CRS) if None or if pyproj is not installed.
+
+    Example:
+        write_table('outputs/reference_hydrographique_troncon.arrow', {'NODEA': nodea, 'NODEB': nodeb},
+                    coordinates=coordinates, offsets=offsets, crs='EPSG:2154')
+    """
+    _require_pyarrow()
+
+    arrays = {name: pa.array(values) for name, values in columns.items()}
+
+    geo = None
+    if coordinates is not None:
+        coordinates = np.ascontiguousarray(coordinates, dtype=np.float64)
+        arrays[GEOMETRY_COLUMN] = _line_array(coordinates, offsets)
+        geo = {'encoding': 'linestring', 'geometry_types': ['LineString Z' if coordinates.shape[1] == 3 else 'LineString']}
+    elif wkb is not None:
+        arrays[GEOMETRY_COLUMN] = pa.array(wkb, type=pa.binary())
+        geo = {'encoding': 'WKB', 'geometry_types': []}
+
+    metadata = None
+    if geo is not None:
+        # null and not omitted, a missing crs would mean OGC:CRS84
+        geo['crs'] = _projjson(crs)
+        metadata = {b'geo': json.dumps({'version': '1.1.0', 'primary_column': GEOMETRY_COLUMN,
+                                        'columns': {GEOMETRY_COLUMN: geo}}).encode()}
+
+    table = pa.table(arrays).replace_schema_metadata(metadata)
+
+    # one record batch so that each column is a single zero-copy buffer
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(1, table.num_rows))
+
+
+def read_table(path: str, columns: list = None):
+    """
+    Memory map an Arrow IPC file, only the pages of the selected columns are read.
+
+    Parameters:
+        path (str): The Arrow IPC file path.
+        columns (list, optional): The names of the columns to keep, all if None.
+
+    Returns:
+        pyarrow.Table: The memory mapped table.
+    """
+    _require_pyarrow()
+
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+    return table if columns is None else table.select(columns)
+
+
+def geo_metadata(path: str) -> dict:
+    """
+    The GeoParquet "geo" metadata of an Arrow IPC file, None if it has no geometry.
+    """
+    _require_pyarrow()
+
+    metadata = pa.ipc.open_file(pa.memory_map(path, 'r')).schema.metadata or dict()
+
+    return json.loads(metadata[b'geo']) if b'geo' in metadata else None
+
+
+def column_names(path: str) -> list:
+    """
+    The column names of an Arrow IPC file, read from its schema only.
+    """
+    _require_pyarrow()
+
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).schema.names
+
+
+def read_columns(path: str, names: list) -> dict:
+    """
+    Read attribute columns of an Arrow IPC file as numpy arrays, without copy for the numeric columns without nulls.
+
+    Parameters:
+        path (str): The Arrow IPC file path.
+        names (list): The column names.
+
+    Returns:
+        dict: Column name to (N,) numpy array mapping.
+
+    Example:
+        columns = read_columns('outputs/reference_hydrographique_troncon.arrow', ['NODEA', 'NODEB'])
+    """
+    table = read_table(path, names)
+
+    return {name: table.column(name).combine_chunks().to_numpy(zero_copy_only=False) for name in names}
+
+
+def read_lines(path: str):
+    """
+    Read the GeoArrow linestring geometries of an Arrow IPC file as coordinate and offset arrays.
+    The coordinates are a view on the memory mapped file (for a file written by write_table, in one record batch),
+    the offsets are a copy, rebased to start at 0.
+
+    Parameters:
+        path (str): The Arrow IPC file path.
+
+    Returns:
+        tuple: (coordinates, offsets) the (M, 2) or (M, 3) vertex coordinates and the (N + 1,) offsets,
+            the vertices of the i-th line being coordinates[offsets[i]:offsets[i + 1]].
+
+    Raises:
+        ValueError: If the geometries are not GeoArrow linestrings.
+    """
+    geometry = read_table(path, [GEOMETRY_COLUMN]).column(GEOMETRY_COLUMN).combine_chunks()
+    if not (pa.types.is_list(geometry.type) or pa.types.is_large_list(geometry.type)) \
+            or not pa.types.is_fixed_size_list(geometry.type.value_type):
+        raise ValueError(f"{path} geometries are not GeoArrow linestrings")
+
+    dimension = geometry.type.value_type.list_size
+    offsets = geometry.offsets.to_numpy().astype(np.int64)
+    # the values of a sliced array are not sliced, only the vertices of its lines are kept
+    vertices = geometry.values.slice(offsets[0], offsets[-1] - offsets[0]).flatten().to_numpy()
+
+    return vertices.reshape(-1, dimension), offsets - offsets[0]
+
+
+def read_wkb(path: str) -> np.ndarray:
+    """
+    Read the geometries of an Arrow IPC file as WKB, from WKB or GeoArrow linestring geometries.
+
+    Parameters:
+        path (str): The Arrow IPC file path.
+
+    Returns:
+        numpy.ndarray: (N,) object array of WKB bytes.
+    """
+    geometry = read_table(path, [GEOMETRY_COLUMN]).column(GEOMETRY_COLUMN)
+
+    if pa.types.is_binary(geometry.type) or pa.types.is_large_binary(geometry.type):
+        return geometry.to_numpy(zero_copy_only=False)
+
+    coordinates, offsets = read_lines(path)
+    wkb_type = 1002 if coordinates.shape[1] == 3 else 2
+    wkb = np.empty(len(offsets) - 1, dtype=object)
+    for i, (start, end) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist())):
+        wkb[i] = struct.pack('<BII', 1, wkb_type, end - start) + np.ascontiguousarray(coordinates[start:end], dtype='<f8').tobytes()
+
+    return wkb
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from qgis.core import QgsVectorLayer, QgsFeatureRequest, QgsFeature, QgsGeometry, edit
+
+from .layers import duplicate_features
+
+
+def load_correction_layer(corr_gpkg_path: str, layername: str) -> tuple:
+    """
+    Load a correction layer of corr_reseau_hydrographique.gpkg and the ids of its features without
+    the duplicate geometries (if manual error in the corrections), the layer is not copied.
+
+    Parameters:
+        corr_gpkg_path (str): The path of the corrections GeoPackage.
+        layername (str): The correction layer name.
+
+    Returns:
+        tuple: (layer, fids) the correction layer and the ids of its features to use.
+
+    Raises:
+        IOError: If the layer fails to load correctly.
+    """
+    layer = QgsVectorLayer(f"{corr_gpkg_path}|layername={layername}", layername, 'ogr')
+    if not layer.isValid():
+        raise IOError(f"{layer} n'a pas été chargée correctement")
+
+    fids, keep, duplicate = duplicate_features(layer)
+    if duplicate['duplicates']:
+        print(f"{layername}: duplicate geometry found : {duplicate['duplicates']}")
+
+    return layer, [int(fid) for fid in fids[keep]]
+
+
+def cleabs_index(layer: QgsVectorLayer) -> dict:
+    """
+    Build the cleabs to feature ids dictionary of a layer in one attribute-only scan.
+
+    Parameters:
+        layer (QgsVectorLayer): The layer with a cleabs field.
+
+    Returns:
+        dict: cleabs to list of feature ids mapping.
+    """
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(['cleabs'], layer.fields())
+
+    index = dict()
+    for feature in layer.getFeatures(request):
+        index.setdefault(feature['cleabs'], []).append(feature.id())
+
+    return index
+
+
+def reversed_geometry(geometry: QgsGeometry) -> QgsGeometry:
+    """
+    Reverse the line direction, keeping the z values.
+    """
+    return QgsGeometry(geometry.constGet().reversed())
+
+
+def apply_corrections(corr_gpkg_path: str, cible: QgsVectorLayer,
+                      connection_and_direction: str = None, connection: str = None, direction: str = None,
+                      geometry: str = None, suppression: str = None) -> dict:
+    """
+    Apply all the corrections of corr_reseau_hydrographique.gpkg to the cible layer in one edit transaction.
+
+    The corrections are resolved per cleabs with a cleabs to feature id dictionary, with the same result as running
+    fix_connection_and_direction, fix_connection, fix_direction, fix_modified_geom and fix_suppr_canal_multichenal
+    in this order :
+    - connection_and_direction : features added if their cleabs is not in the cible, then reversed.
+    - connection : features added if their cleabs is not in the cible.
+    - direction : features reversed (twice reversed if also in connection_and_direction).
+    - geometry : geometry replaced by the correction geometry.
+    - suppression : features deleted.
+
+    Parameters:
+        corr_gpkg_path (str): The path of the corrections GeoPackage.
+        cible (QgsVectorLayer): The hydrographic network layer to fix.
+        connection_and_direction (str, optional): Name of the connection and direction correction layer.
+        connection (str, optional): Name of the connection correction layer.
+        direction (str, optional): Name of the direction correction layer.
+        geometry (str, optional): Name of the modified geometry correction layer.
+        suppression (str, optional): Name of the canal and multichenal suppression correction layer.
+
+    Returns:
+        dict: Number of features added, reversed, modified and deleted.
+
+    Raises:
+        IOError: If a layer fails to load correctly.
+
+    Example:
+        apply_corrections('inputs/corr_reseau_hydrographique.gpkg', cible,
+                          connection='troncon_hydrographique_corr_connection',
+                          direction='troncon_hydrographique_corr_dir_ecoulement')
+    """
+    if not cible.isValid():
+        raise IOError(f"{cible} n'a pas été chargée correctement")
+
+    layers = {kind: load_correction_layer(corr_gpkg_path, layername) for kind, layername in
+              (('connection_and_direction', connection_and_direction), ('connection', connection),
+               ('direction', direction), ('geometry', geometry), ('suppression', suppression)) if layername}
+
+    def features(kind):
+        if kind not in layers:
+            return []
+        layer, fids = layers[kind]
+        return layer.getFeatures(QgsFeatureRequest().setFilterFids(fids))
+
+    def identifiants(kind):
+        if kind not in layers:
+            return []
+        layer, fids = layers[kind]
+        request = QgsFeatureRequest().setFilterFids(fids).setFlags(QgsFeatureRequest.NoGeometry)
+        return [feature['cleabs'] for feature in layer.getFeatures(request)]
+
+    index = cleabs_index(cible)
+
+    # features to add, the first correction layer giving a cleabs wins
+    additions = dict()
+    for kind in ('connection_and_direction', 'connection'):
+        for feature in features(kind):
+            if feature['cleabs'] not in index and feature['cleabs'] not in additions:
+                additions[feature['cleabs']] = QgsFeature(feature)
+
+    # a line reversed twice keeps its direction
+    reversals = set()
+    for kind in ('connection_and_direction', 'direction'):
+        reversals ^= set(identifiants(kind))
+
+    # the modified geometry replaces the reversed one
+    geometries = {feature['cleabs']: feature.geometry() for feature in features('geometry')}
+    reversals -= set(geometries)
+
+    deletions = set(identifiants('suppression'))
+
+    counts = {'added': 0, 'reversed': 0, 'modified': 0, 'deleted': 0}
+
+    with edit(cible):
+        # new features, corrected before being added
+        new_features = []
+        for cleabs, feature in additions.items():
+            if cleabs in deletions:
+                continue
+            if cible.fields().indexFromName('fid') != -1:
+                feature['fid'] = None
+            if cleabs in geometries:
+                feature.setGeometry(geometries[cleabs])
+            elif cleabs in reversals:
+                feature.setGeometry(reversed_geometry(feature.geometry()))
+            new_features.append(feature)
+        cible.addFeatures(new_features)
+        counts['added'] = len(new_features)
+
+        # existing features
+        reversed_fids = [fid for cleabs in reversals - deletions for fid in index.get(cleabs, [])]
+        for feature in cible.getFeatures(QgsFeatureRequest().setFilterFids(reversed_fids).setNoAttributes()):
+            cible.changeGeometry(feature.id(), reversed_geometry(feature.geometry()))
+        counts['reversed'] = len(reversed_fids)
+
+        for cleabs, geom in geometries.items():
+            if cleabs in deletions:
+                continue
+            for fid in index.get(cleabs, []):
+                cible.changeGeometry(fid, geom)
+                counts['modified'] += 1
+
+        deleted_fids = [fid for cleabs in deletions for fid in index.get(cleabs, [])]
+        cible.deleteFeatures(deleted_fids)
+        counts['deleted'] = len(deleted_fids)
+
+    return counts
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import hashlib
+
+import numpy as np
+
+from .nodes import quantize
+
+# size in bytes of the geometry digests
+DIGEST_SIZE = 16
+
+
+def line_digests(coordinates, offsets, extent=None, quantization: float = None):
+    """
+    Digest of the normalised geometry of each line, equal for two lines with the same vertices in either direction.
+
+    Only x and y are hashed, as native:deleteduplicategeometries compares the geometries in 2d: two lines
+    with the same planar vertices but different z are duplicates. The lines are oriented from their lowest
+    end vertex (x, then y), then the vertices are hashed with blake2b, as little endian float64 or,
+    if quantization is set, as int64 on the same grid as nodes.quantize.
+
+    Parameters:
+        coordinates (numpy.ndarray): (M, 2) or (M, 3) vertex coordinates of all the lines, z ignored.
+        offsets (numpy.ndarray): (N + 1,) offsets, the vertices of the i-th line being coordinates[offsets[i]:offsets[i + 1]].
+        extent (tuple, optional): (xmin, ymin, xmax, ymax) of the quantization grid, the coordinates extent if None.
+        quantization (float, optional): Quantization factor, None to hash the exact coordinates. Default is None.
+
+    Returns:
+        numpy.ndarray: (N,) digests, of dtype S16.
+
+    Example:
+        digests = line_digests(coordinates, offsets, quantization=100000000)
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)[:, :2]
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    n = len(counts)
+
+    if quantization is not None and len(coordinates):
+        if extent is None:
+            extent = (*coordinates.min(axis=0), *coordinates.max(axis=0))
+        values = quantize(coordinates, extent, quantization).astype('<i8')
+    else:
+        values = coordinates.astype('<f8')
+
+    # reverse the lines whose last vertex is lower than the first one, on the first differing column
+    reverse = np.zeros(n, dtype=bool)
+    valid = np.flatnonzero(counts > 0)
+    first, last = values[offsets[valid]], values[offsets[valid + 1] - 1]
+    lower = last < first
+    column = np.argmax(lower | (last > first), axis=1)
+    reverse[valid] = lower[np.arange(len(valid)), column]
+
+    line = np.repeat(np.arange(n), counts)
+    position = np.arange(len(values), dtype=np.int64)
+    order = np.where(reverse[line], offsets[:-1][line] + offsets[1:][line] - 1 - position, position)
+
+    buffer = np.ascontiguousarray(values[order]).tobytes()
+    stride = 2 * 8
+
+    digests = np.empty(n, dtype=f"S{DIGEST_SIZE}")
+    for i, (start, end) in enumerate(zip((offsets[:-1] * stride).tolist(), (offsets[1:] * stride).tolist())):
+        digests[i] = hashlib.blake2b(buffer[start:end], digest_size=DIGEST_SIZE).digest()
+
+    return digests
+
+
+def duplicates(digests):
+    """
+    Find the duplicate geometries from their digests, the first feature of each geometry is kept
+    (as native:deleteduplicategeometries).
+
+    Parameters:
+        digests (numpy.ndarray): (N,) geometry digests.
+
+    Returns:
+        tuple: (keep, first) the (N,) boolean keep mask and the (N,) index of the kept feature with the same geometry.
+    """
+    if len(digests) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+
+    # return_index gives the first occurrence of each digest
+    _, first_index, inverse = np.unique(digests, return_index=True, return_inverse=True)
+    first = first_index[inverse.ravel()]
+
+    return first == np.arange(len(digests)), first
+
+
+def duplicate_report(fids, keep, first) -> dict:
+    """
+    Report of the duplicate geometries.
+
+    Parameters:
+        fids (numpy.ndarray): (N,) feature ids.
+        keep (numpy.ndarray): (N,) boolean keep mask, from duplicates.
+        first (numpy.ndarray): (N,) index of the kept feature with the same geometry, from duplicates.
+
+    Returns:
+        dict: 'features' the number of features, 'duplicates' the number of duplicates to remove
+            and 'pairs' the [duplicate fid, kept fid] list.
+    """
+    removed = np.flatnonzero(~keep)
+
+    return {'features': int(len(fids)),
+            'duplicates': int(len(removed)),
+            'pairs': np.column_stack([fids[removed], fids[first[removed]]]).tolist()}
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import csr, gather, node_count
+
+# status of the reversal candidates
+INFERRED = 1
+CONFIRMED = 2
+ATTRIBUTE = 3
+
+# labels of the candidate status
+STATUS_LABELS = {INFERRED: 'infere', CONFIRMED: 'confirme', ATTRIBUTE: 'attribut'}
+
+
+def outlet_distances(nodea, nodeb, outlet_nodes, size: int = None):
+    """
+    Number of edges between each node and the nearest outlet node, edge directions ignored
+    (level-synchronous breadth-first search from all the outlet nodes at once).
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        outlet_nodes (numpy.ndarray): Ids of the outlet nodes, at distance 0.
+        size (int, optional): Number of nodes, all node ids must be lower than size. Default is None, the highest node id + 1.
+
+    Returns:
+        numpy.ndarray: (N,) distance of each node, -1 for the nodes not connected to an outlet node.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    if size is None:
+        size = node_count(nodea, nodeb)
+
+    # undirected adjacency, each edge from both of its nodes
+    indptr, items = csr(np.concatenate([nodea, nodeb]), size)
+    neighbours = np.concatenate([nodeb, nodea])
+
+    distance = np.full(size, -1, dtype=np.int64)
+    frontier = np.unique(np.asarray(outlet_nodes, dtype=np.int64))
+    distance[frontier] = 0
+
+    level = 0
+    while frontier.size:
+        level += 1
+        frontier = np.unique(neighbours[gather(indptr, items, frontier)])
+        frontier = frontier[distance[frontier] == -1]
+        distance[frontier] = level
+
+    return distance
+
+
+def infer_directions(nodea, nodeb, outlet_nodes, subset=None):
+    """
+    Orient the edges from the outlets: each edge flows from its node farther from the outlets
+    to its node nearer to the outlets, compared with the digitised direction (NODEA to NODEB).
+
+    The distances are only walked on the subset edges: the canals linking neighbouring basins
+    would give shortcuts to the outlet of the other basin and orient the reaches between them the wrong way.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        outlet_nodes (numpy.ndarray): Ids of the outlet nodes, where the network flows out.
+        subset (numpy.ndarray, optional): (E,) boolean mask of the edges walked and oriented (ie. without the canals).
+            Default is None, all the edges.
+
+    Returns:
+        numpy.ndarray: (E,) int8, 1 if the edge flows in its digitised direction, -1 if it flows the other way,
+            0 if undetermined (both nodes at the same distance, ie. braids, not connected to an outlet
+            or not in the subset).
+
+    Example:
+        inferred = infer_directions(nodea, nodeb, np.where(end_nearer, nodeb, nodea)[outlets], subset=~canal)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    if len(nodea) == 0:
+        return np.empty(0, dtype=np.int8)
+
+    subset = np.ones(len(nodea), dtype=bool) if subset is None else np.asarray(subset, dtype=bool)
+
+    distance = outlet_distances(nodea[subset], nodeb[subset], outlet_nodes, size=node_count(nodea, nodeb))
+    distancea, distanceb = distance[nodea], distance[nodeb]
+
+    inferred = np.sign(distancea - distanceb).astype(np.int8)
+    inferred[(distancea == -1) | (distanceb == -1) | ~subset] = 0
+
+    return inferred
+
+
+def attribute_directions(sens_de_l_ecoulement):
+    """
+    Flow direction given by the BD TOPO sens_de_l_ecoulement attribute.
+
+    Parameters:
+        sens_de_l_ecoulement (numpy.ndarray): (E,) object array of the attribute values.
+
+    Returns:
+        numpy.ndarray: (E,) int8, 1 for 'Sens direct' (flow in the digitised direction), -1 for 'Sens inverse',
+            0 for the other values ('Double sens', 'Sans objet', 'Inconnu' or NULL).
+    """
+    def direction(value):
+        if not isinstance(value, str):
+            return 0
+        value = value.strip().lower()
+        if value in ('sens direct', 'direct'):
+            return 1
+        if value in ('sens inverse', 'inverse'):
+            return -1
+        return 0
+
+    return np.array([direction(value) for value in sens_de_l_ecoulement], dtype=np.int8)
+
+
+def reversal_candidates(inferred, attribute):
+    """
+    Status of the edges to reverse, from the inferred and the attribute flow directions:
+
+    - CONFIRMED: both the inference and sens_de_l_ecoulement flow against the digitised direction.
+    - INFERRED: the inference flows against the digitised direction, not sens_de_l_ecoulement.
+    - ATTRIBUTE: sens_de_l_ecoulement flows against the digitised direction, the inference is undetermined.
+
+    Parameters:
+        inferred (numpy.ndarray): (E,) inferred directions, from infer_directions.
+        attribute (numpy.ndarray): (E,) attribute directions, from attribute_directions.
+
+    Returns:
+        numpy.ndarray: (E,) int8 status of each edge, 0 for the edges which are not candidates.
+    """
+    inferred = np.asarray(inferred)
+    attribute = np.asarray(attribute)
+
+    status = np.zeros(len(inferred), dtype=np.int8)
+    status[inferred == -1] = INFERRED
+    status[(inferred == -1) & (attribute == -1)] = CONFIRMED
+    status[(inferred == 0) & (attribute == -1)] = ATTRIBUTE
+
+    return status
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import node_count
+from .outlets import exutoire_tree
+from .partition import weak_components
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+# nearest target of a gap
+NETWORK = 'reseau'
+EXUTOIRE = 'exutoire'
+
+
+def _require_shapely() -> None:
+    if shapely is None:
+        raise ImportError("shapely >= 2.0 is needed for the gap finder (pip install shapely)")
+
+
+def disconnected_components(nodea, nodeb, connected):
+    """
+    Label the components of the edges which are not connected to an outlet, edge directions ignored.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        connected (numpy.ndarray): (E,) boolean mask of the edges connected to an outlet.
+
+    Returns:
+        numpy.ndarray: (E,) component label of each disconnected edge (the lowest node id of the component),
+            -1 for the connected edges.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    connected = np.asarray(connected, dtype=bool)
+
+    labels = np.full(len(nodea), -1, dtype=np.int64)
+    labels[~connected] = weak_components(nodea[~connected], nodeb[~connected])
+
+    return labels
+
+
+def downstream_endpoints(nodea, nodeb, labels):
+    """
+    Candidate downstream endpoints of the disconnected components: the nodes of a component without any
+    edge of the component leaving them, or all its to nodes for a component without such a node (ie. a cycle).
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        labels (numpy.ndarray): (E,) component label of each edge, -1 for the edges out of any component.
+
+    Returns:
+        tuple: (nodes, components) the endpoint node ids and their component label, sorted by node id.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    member = labels >= 0
+    node_label = np.full(size, -1, dtype=np.int64)
+    node_label[nodea[member]] = labels[member]
+    node_label[nodeb[member]] = labels[member]
+
+    # to nodes of the component edges which no component edge leaves
+    leaving = np.zeros(size, dtype=bool)
+    leaving[nodea[member]] = True
+    ends = np.unique(nodeb[member])
+    sinks = ends[~leaving[ends]]
+
+    # components without sink, all their to nodes
+    without_sink = np.ones(size, dtype=bool)
+    without_sink[node_label[sinks]] = False
+    nodes = np.union1d(sinks, ends[without_sink[node_label[ends]]])
+
+    return nodes, node_label[nodes]
+
+
+def _nearest_network_node(nodea, nodeb, labels, connected, position, points, components, max_distance):
+    """
+    Nearest connected node of each endpoint, excluding the nodes of the endpoint's own component
+    (ie. the start node of a branch leaving the connected network).
+    """
+    network_node = np.full(len(points), -1, dtype=np.int64)
+    network_distance = np.full(len(points), np.inf, dtype=np.float64)
+    network_nodes = np.union1d(nodea[connected], nodeb[connected])
+    if not len(points) or not len(network_nodes):
+        return network_node, network_distance
+
+    # (node, component) pairs of the connected nodes shared with a component, keyed node * size + component
+    size = len(position)
+    member = labels >= 0
+    keys = np.unique(np.concatenate([nodea[member], nodeb[member]]) * size + np.tile(labels[member], 2))
+    keys = keys[np.isin(keys // size, network_nodes)]
+    shared = np.unique(keys // size)
+
+    # nearest of the connected nodes shared with no component
+    free = np.setdiff1d(network_nodes, shared, assume_unique=True)
+    if len(free):
+        tree = shapely.STRtree(shapely.points(position[free]))
+        (point_index, node_index), distance = tree.query_nearest(points, max_distance=max_distance,
+                                                                 return_distance=True, all_matches=False)
+        network_node[point_index] = free[node_index]
+        network_distance[point_index] = distance
+
+    # closer shared nodes which are not of the endpoint's component
+    if len(shared):
+        bound = np.where(np.isfinite(network_distance), network_distance,
+                         np.inf if max_distance is None else max_distance)
+        tree = shapely.STRtree(shapely.points(position[shared]))
+        point_index, node_index = tree.query(points, predicate='dwithin', distance=bound)
+        other = ~np.isin(shared[node_index] * size + components[point_index], keys)
+        point_index, node_index = point_index[other], node_index[other]
+        distance = shapely.distance(points[point_index], tree.geometries[node_index])
+        closer = distance < network_distance[point_index]
+        point_index, node_index, distance = point_index[closer], node_index[closer], distance[closer]
+        order = np.lexsort((distance, point_index))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = point_index[order][1:] != point_index[order][:-1]
+        best = order[first]
+        network_node[point_index[best]] = shared[node_index[best]]
+        network_distance[point_index[best]] = distance[best]
+
+    return network_node, network_distance
+
+
+def find_gaps(nodea, nodeb, start, end, length, connected, exutoire=None, max_distance: float = 1000):
+    """
+    Find the gaps of the disconnected components: the nearest node of the connected network (other than the nodes
+    of the component itself, ie. the start of a branch leaving the network) and the nearest exutoire line of the
+    downstream endpoints of each component (nearest neighbour queries on STR-trees),
+    keeping by component the endpoint with the shortest gap. The components are ranked by gap distance.
+    The targets are only searched within max_distance, which bounds the cost of the nearest neighbour queries.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        start (numpy.ndarray): (E, 2) first vertex of each edge.
+        end (numpy.ndarray): (E, 2) last vertex of each edge.
+        length (numpy.ndarray): (E,) length of each edge.
+        connected (numpy.ndarray): (E,) boolean mask of the edges connected to an outlet.
+        exutoire (shapely.STRtree or list, optional): The exutoire lines tree (outlets.exutoire_tree) or their WKB.
+            Default is None, no exutoire distance.
+        max_distance (float, optional): The search distance of the targets, None for no limit. Default is 1000.
+
+    Returns:
+        dict: Arrays by component, in rank order:
+            - 'component', 'edges', 'length' : the component label, its number of edges and their total length,
+            - 'node', 'point' : the downstream endpoint node id and its (x, y),
+            - 'network_node', 'network_distance' : the nearest connected node (-1 if none) and its distance,
+            - 'exutoire_point', 'exutoire_distance' : the nearest point of the exutoire lines and its distance,
+            - 'target' : NETWORK or EXUTOIRE, the nearest of both (None if none within max_distance),
+              'target_point' its (x, y), 'distance' the gap length (inf if no target).
+
+    Example:
+        gaps = find_gaps(nodea, nodeb, start, end, length, np.isin(np.arange(len(nodea)), connected), exutoire_wkb)
+    """
+    _require_shapely()
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    connected = np.asarray(connected, dtype=bool)
+    size = node_count(nodea, nodeb)
+
+    labels = disconnected_components(nodea, nodeb, connected)
+    nodes, components = downstream_endpoints(nodea, nodeb, labels)
+
+    # node coordinates, the network endpoints share their node
+    position = np.zeros((size, 2), dtype=np.float64)
+    position[nodea] = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+    position[nodeb] = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+    points = shapely.points(position[nodes])
+
+    network_node, network_distance = _nearest_network_node(nodea, nodeb, labels, connected, position, points,
+                                                           components, max_distance)
+
+    exutoire_point = np.full((len(nodes), 2), np.nan, dtype=np.float64)
+    exutoire_distance = np.full(len(nodes), np.inf, dtype=np.float64)
+    if exutoire is not None and len(nodes):
+        tree = exutoire if isinstance(exutoire, shapely.STRtree) else exutoire_tree(exutoire)
+        if len(tree.geometries):
+            (point_index, line_index), distance = tree.query_nearest(points, max_distance=max_distance,
+                                                                     return_distance=True, all_matches=False)
+            gap_lines = shapely.shortest_line(points[point_index], tree.geometries[line_index])
+            exutoire_point[point_index] = shapely.get_coordinates(shapely.get_point(gap_lines, 1))
+            exutoire_distance[point_index] = distance
+
+    # the shortest gap of each component
+    gap = np.minimum(network_distance, exutoire_distance)
+    order = np.lexsort((nodes, gap, components))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = components[order][1:] != components[order][:-1]
+    best = order[first]
+    best = best[np.lexsort((components[best], gap[best]))]
+
+    # component sizes
+    member = labels >= 0
+    component_ids, edges = np.unique(labels[member], return_counts=True)
+    component_length = np.bincount(np.searchsorted(component_ids, labels[member]),
+                                   weights=np.asarray(length, dtype=np.float64)[member], minlength=len(component_ids))
+    index = np.searchsorted(component_ids, components[best])
+
+    to_network = network_distance[best] <= exutoire_distance[best]
+    target_point = np.where(to_network[:, None], position[np.maximum(network_node[best], 0)], exutoire_point[best])
+    target = np.where(to_network, NETWORK, EXUTOIRE).astype(object)
+    target[np.isinf(gap[best])] = None
+    target_point[np.isinf(gap[best])] = np.nan
+
+    return {'component': components[best], 'edges': edges[index], 'length': component_length[index],
+            'node': nodes[best], 'point': position[nodes[best]],
+            'network_node': network_node[best], 'network_distance': network_distance[best],
+            'exutoire_point': exutoire_point[best], 'exutoire_distance': exutoire_distance[best],
+            'target': target, 'target_point': target_point,
+            'distance': gap[best]}
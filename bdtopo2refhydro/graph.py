@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import heapq
+
+import numpy as np
+
+# traversal directions, same values as the fct:selectconnectedcomponents DIRECTION parameter
+UPSTREAM = 0
+DOWNSTREAM = 1
+UPDOWNSTREAM = 2
+
+
+def csr(keys, size: int):
+    """
+    Compressed sparse row grouping of items by key.
+
+    Parameters:
+        keys (numpy.ndarray): (N,) int array, the key (node id) of each item (edge).
+        size (int): Number of keys, all keys must be lower than size.
+
+    Returns:
+        tuple: (indptr, items) the items of key k are items[indptr[k]:indptr[k + 1]].
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    items = np.argsort(keys, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+
+    return indptr, items
+
+
+def gather(indptr, items, keys):
+    """
+    Concatenate the CSR items of several keys.
+
+    Parameters:
+        indptr (numpy.ndarray): CSR index pointer.
+        items (numpy.ndarray): CSR items.
+        keys (numpy.ndarray): (K,) keys to gather.
+
+    Returns:
+        numpy.ndarray: The items of all the keys, in keys order.
+    """
+    starts = indptr[keys]
+    counts = indptr[keys + 1] - starts
+    total = int(counts.sum())
+
+    if total == 0:
+        return np.empty(0, dtype=items.dtype)
+
+    # position of each gathered item in its group, added to the group start
+    group_offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+
+    return items[group_offsets + np.arange(total, dtype=np.int64)]
+
+
+def node_count(nodea, nodeb) -> int:
+    """
+    Number of nodes of the network, the highest node id + 1.
+    """
+    if len(nodea) == 0:
+        return 0
+
+    return int(max(nodea.max(), nodeb.max())) + 1
+
+
+def traverse(from_nodes, to_nodes, seeds, size: int):
+    """
+    Level-synchronous breadth-first search of the edges following the from -> to direction.
+
+    Parameters:
+        from_nodes (numpy.ndarray): (E,) start node of each edge in the walking direction.
+        to_nodes (numpy.ndarray): (E,) end node of each edge in the walking direction.
+        seeds (numpy.ndarray): Indices of the edges to start from.
+        size (int): Number of nodes.
+
+    Returns:
+        numpy.ndarray: (E,) boolean mask of the reached edges, seeds included.
+    """
+    indptr, edges = csr(from_nodes, size)
+
+    reached = np.zeros(len(from_nodes), dtype=bool)
+    visited = np.zeros(size, dtype=bool)
+
+    frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+    reached[frontier] = True
+
+    while frontier.size:
+        nodes = np.unique(to_nodes[frontier])
+        nodes = nodes[~visited[nodes]]
+        visited[nodes] = True
+
+        frontier = gather(indptr, edges, nodes)
+        frontier = frontier[~reached[frontier]]
+        reached[frontier] = True
+
+    return reached
+
+
+def connected_edges(nodea, nodeb, seeds, direction: int = UPDOWNSTREAM):
+    """
+    Native replacement of fct:selectconnectedcomponents. Select the edges connected to the seed edges
+    by moving upstream, downstream or both from the seeds.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        seeds (numpy.ndarray): Indices of the seed edges (ie. the outlets).
+        direction (int, optional): UPSTREAM, DOWNSTREAM or UPDOWNSTREAM (union of both). Default is UPDOWNSTREAM.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the connected edges, seeds included.
+
+    Example:
+        connected = connected_edges(nodea, nodeb, outlets, direction=UPDOWNSTREAM)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    reached = np.zeros(len(nodea), dtype=bool)
+
+    if direction in (UPSTREAM, UPDOWNSTREAM):
+        # walking upstream, an edge leads from its NODEB to its NODEA
+        reached |= traverse(nodeb, nodea, seeds, size)
+
+    if direction in (DOWNSTREAM, UPDOWNSTREAM):
+        reached |= traverse(nodea, nodeb, seeds, size)
+
+    return np.flatnonzero(reached)
+
+
+def fix_network_connectivity(nodea, nodeb, subset):
+    """
+    Native replacement of fct:fixnetworkconnectivity. Restore the connectivity of a network subset
+    by adding the reaches of the full network needed to link each dangling end of the subset downstream to the subset.
+
+    A dangling end is the to node of a subset edge without any subset edge leaving it. From each dangling end,
+    the shortest route (in number of reaches) flowing downstream to a node where a subset edge starts is added.
+    Dangling ends without such a route (ie. the outlets) are left as is.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        subset (numpy.ndarray): (E,) boolean mask of the subset edges.
+
+    Returns:
+        numpy.ndarray: (E,) boolean mask of the fixed subset, the subset edges and the added connecting edges.
+
+    Example:
+        fixed = fix_network_connectivity(nodea, nodeb, ~canal | outlet)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    subset = np.asarray(subset, dtype=bool)
+    size = node_count(nodea, nodeb)
+
+    fixed = subset.copy()
+    if size == 0:
+        return fixed
+
+    # nodes where a subset edge starts, the targets of the downstream routes
+    target = np.zeros(size, dtype=bool)
+    target[nodea[subset]] = True
+
+    # breadth-first search walking upstream from the targets on the edges outside the subset,
+    # each node keeps the edge leading downstream on its shortest route to a target
+    candidates = np.flatnonzero(~subset)
+    indptr, items = csr(nodeb[candidates], size)
+    downstream_edge = np.full(size, -1, dtype=np.int64)
+    visited = target.copy()
+
+    nodes = np.flatnonzero(target)
+    while nodes.size:
+        # lowest edge index first, so ties are resolved the same way on each run
+        edges = np.sort(candidates[gather(indptr, items, nodes)])
+        heads = nodea[edges]
+        new = ~visited[heads]
+        nodes, first = np.unique(heads[new], return_index=True)
+        downstream_edge[nodes] = edges[new][first]
+        visited[nodes] = True
+
+    # follow the routes from the dangling ends, all at once, until the subset or an already added route
+    ends = np.unique(nodeb[subset])
+    nodes = ends[~target[ends]]
+    while nodes.size:
+        edges = downstream_edge[nodes]
+        edges = np.unique(edges[edges >= 0])
+        edges = edges[~fixed[edges]]
+        fixed[edges] = True
+        nodes = nodeb[edges]
+        nodes = nodes[~target[nodes]]
+
+    return fixed
+
+
+def dijkstra(indptr, edges, heads, weights, sources):
+    """
+    Binary-heap Dijkstra shortest paths from several source nodes.
+
+    Parameters:
+        indptr (numpy.ndarray): CSR index pointer of the edges by tail node (the node they are walked from).
+        edges (numpy.ndarray): CSR edges.
+        heads (numpy.ndarray): (E,) node reached when walking each edge.
+        weights (numpy.ndarray): (E,) positive cost of each edge.
+        sources (numpy.ndarray): Source nodes, at distance 0.
+
+    Returns:
+        tuple: (distance, predecessor) arrays by node, the shortest distance to the sources (inf if not reached)
+            and the last edge of the shortest path (-1 for the sources and not reached nodes).
+    """
+    size = len(indptr) - 1
+    distance = np.full(size, np.inf, dtype=np.float64)
+    predecessor = np.full(size, -1, dtype=np.int64)
+
+    # plain lists are much faster than numpy scalars in the heap loop
+    indptr_list = indptr.tolist()
+    edges_list = edges.tolist()
+    heads_list = heads.tolist()
+    weights_list = np.asarray(weights, dtype=np.float64).tolist()
+    distance_list = distance.tolist()
+    predecessor_list = predecessor.tolist()
+    settled_list = [False] * size
+
+    heap = []
+    for source in np.unique(np.asarray(sources, dtype=np.int64)).tolist():
+        distance_list[source] = 0.0
+        heap.append((0.0, source))
+    heapq.heapify(heap)
+
+    while heap:
+        dist, node = heapq.heappop(heap)
+        if settled_list[node]:
+            continue
+        settled_list[node] = True
+
+        for i in range(indptr_list[node], indptr_list[node + 1]):
+            edge = edges_list[i]
+            head = heads_list[edge]
+            new_dist = dist + weights_list[edge]
+            if new_dist < distance_list[head]:
+                distance_list[head] = new_dist
+                predecessor_list[head] = edge
+                heapq.heappush(heap, (new_dist, head))
+
+    distance[:] = distance_list
+    predecessor[:] = predecessor_list
+
+    return distance, predecessor
+
+
+def topological_levels(nodea, nodeb):
+    """
+    Kahn topological sort of the edges by levels, from the sources to the outlets.
+
+    An edge enters a level once all the edges flowing into its from node are in previous levels,
+    so all the edges leaving a node are in the same level. Edges in a cycle, or downstream of one, are never ready.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        list: Arrays of edge indices, one per level, upstream levels first.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    indptr, edges = csr(nodea, size)
+    remaining = np.bincount(nodeb, minlength=size)
+    ready = np.flatnonzero(remaining == 0)
+
+    levels = []
+    while ready.size:
+        level = gather(indptr, edges, ready)
+        if level.size == 0:
+            break
+        levels.append(level)
+
+        touched, counts = np.unique(nodeb[level], return_counts=True)
+        remaining[touched] -= counts
+        ready = touched[remaining[touched] == 0]
+
+    return levels
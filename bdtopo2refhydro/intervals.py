@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import csr, node_count, topological_levels
+
+
+def downstream_edges(nodea, nodeb):
+    """
+    Downstream edge of each edge, the first edge (lowest index) leaving its to node, -1 for the outlets.
+    On a network without multiple channels it is the only one, the edges form a forest rooted at the outlets.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        numpy.ndarray: (E,) index of the downstream edge of each edge.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    if len(nodea) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    indptr, edges = csr(nodea, node_count(nodea, nodeb))
+    has_downstream = indptr[nodeb + 1] > indptr[nodeb]
+
+    return np.where(has_downstream, edges[np.minimum(indptr[nodeb], len(edges) - 1)], -1)
+
+
+def nested_intervals(nodea, nodeb):
+    """
+    Label the edges with the entry and exit numbers of a depth-first walk from the outlets up to the sources
+    (nested set / Euler tour index), computed level by level without recursion.
+
+    The edges upstream of an edge e, e included, are exactly the edges x with
+    DFS_ENTRY[e] <= DFS_ENTRY[x] <= DFS_EXIT[e], so upstream-of and is-tributary-of checks are integer
+    range comparisons (ie. plain SQL on the GeoPackage). The numbers are unique over the whole network,
+    outlets in edge order and the upstream edges of a node in edge order.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        dict: Field name (DFS_ENTRY, DFS_EXIT) to (E,) int64 array mapping, -1 for the edges in, upstream or downstream of a cycle.
+
+    Example:
+        intervals = nested_intervals(nodea, nodeb)
+        upstream = (intervals['DFS_ENTRY'] >= intervals['DFS_ENTRY'][e]) & (intervals['DFS_ENTRY'] <= intervals['DFS_EXIT'][e])
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    edge_count = len(nodea)
+
+    entry = np.full(edge_count, -1, dtype=np.int64)
+    exit_ = np.full(edge_count, -1, dtype=np.int64)
+    if edge_count == 0:
+        return {'DFS_ENTRY': entry, 'DFS_EXIT': exit_}
+
+    parent = downstream_edges(nodea, nodeb)
+    levels = topological_levels(nodea, nodeb)
+
+    # upstream pass, subtree size of each edge
+    size = np.zeros(edge_count, dtype=np.int64)
+    upstream_size = np.zeros(edge_count, dtype=np.int64)
+    for level in levels:
+        size[level] = 1 + upstream_size[level]
+        child = level[parent[level] != -1]
+        np.add.at(upstream_size, parent[child], size[child])
+
+    # edges reached by the walk from the outlets, the cycles and the edges upstream or downstream of them are left out
+    labelled = np.zeros(edge_count, dtype=bool)
+    for level in reversed(levels):
+        labelled[level] = (parent[level] == -1) | labelled[np.maximum(parent[level], 0)]
+
+    # offset of each edge among its siblings (the edges with the same downstream edge, by index),
+    # the outlets being the siblings of a virtual root
+    siblings = np.flatnonzero(labelled)
+    siblings = siblings[np.lexsort((siblings, parent[siblings]))]
+    group = parent[siblings]
+    sizes = size[siblings]
+    cumulative = np.cumsum(sizes) - sizes
+    starts = np.ones(len(siblings), dtype=bool)
+    starts[1:] = group[1:] != group[:-1]
+    offset = np.empty(edge_count, dtype=np.int64)
+    offset[siblings] = cumulative - np.maximum.accumulate(np.where(starts, cumulative, 0))
+
+    # downstream pass, each edge enters right after its downstream edge, after its previous siblings
+    for level in reversed(levels):
+        level = level[labelled[level]]
+        outlet = parent[level] == -1
+        entry[level] = np.where(outlet, offset[level], entry[np.maximum(parent[level], 0)] + 1 + offset[level])
+
+    exit_[labelled] = entry[labelled] + size[labelled] - 1
+
+    return {'DFS_ENTRY': entry, 'DFS_EXIT': exit_}
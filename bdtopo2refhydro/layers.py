@@ -0,0 +1,861 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import struct
+
+import numpy as np
+
+from qgis.core import (QgsVectorLayer, QgsFeatureRequest, QgsField, QgsFields, QgsFeature, QgsGeometry,
+                       QgsSpatialIndex, QgsWkbTypes, QgsMemoryProviderUtils)
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime, QVariant
+
+from .artifact import write_artifact
+from .columnar import write_table
+from .dedup import duplicate_report, duplicates, line_digests
+from .directions import attribute_directions, infer_directions, reversal_candidates, STATUS_LABELS
+from .gaps import find_gaps, NETWORK
+from .intervals import nested_intervals
+from .nodes import identify_nodes, snap_nodes
+from .orders import network_orders, upstream_accumulation
+from .outlets import endpoint_distances, lines_near_exutoire
+from .overlay import length_in_surface
+from .segments import aggregate_segments, merge_lines
+from .validation import error_counts, error_labels, validate_network
+
+
+def read_endpoints(layer: QgsVectorLayer):
+    """
+    Read the first and last vertex of each line of a layer into arrays.
+
+    Parameters:
+        layer (QgsVectorLayer): The line layer to read.
+
+    Returns:
+        tuple: (fids, start, end) with fids the (N,) int64 feature ids in iteration order,
+            start and end the (N, 2) float64 arrays of the first and last vertex coordinates.
+    """
+    fids = []
+    coordinates = []
+
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        geom = feature.geometry()
+        a = geom.vertexAt(0)
+        b = geom.vertexAt(geom.constGet().nCoordinates() - 1)
+        fids.append(feature.id())
+        coordinates.append((a.x(), a.y(), b.x(), b.y()))
+
+    fids = np.array(fids, dtype=np.int64)
+    coordinates = np.array(coordinates, dtype=np.float64).reshape(-1, 4)
+
+    return fids, coordinates[:, 0:2], coordinates[:, 2:4]
+
+
+def _wkb_coordinates(wkb: bytes, dimension: int):
+    """
+    Parse the vertices of a (Multi)LineString ISO WKB, the parts of a multi line are concatenated.
+
+    Parameters:
+        wkb (bytes): The geometry WKB.
+        dimension (int): 2 to read x, y or 3 to read x, y, z.
+
+    Returns:
+        numpy.ndarray: (V, dimension) vertex coordinates.
+    """
+    byteorder = '<' if wkb[0] == 1 else '>'
+    wkb_type = struct.unpack_from(f"{byteorder}I", wkb, 1)[0]
+    has_z, has_m = (wkb_type // 1000) in (1, 3), (wkb_type // 1000) in (2, 3)
+    stride = 2 + has_z + has_m
+
+    # offset of the vertex count of each line part
+    if wkb_type % 1000 == 2:
+        count_offsets = [5]
+    else:
+        count_offsets, offset = [], 9
+        for _ in range(struct.unpack_from(f"{byteorder}I", wkb, 5)[0]):
+            count_offsets.append(offset + 5)
+            offset += 9 + 8 * stride * struct.unpack_from(f"{byteorder}I", wkb, offset + 5)[0]
+
+    vertices = []
+    for count_offset in count_offsets:
+        count = struct.unpack_from(f"{byteorder}I", wkb, count_offset)[0]
+        values = np.frombuffer(wkb, dtype=f"{byteorder}f8", count=count * stride, offset=count_offset + 4)
+        vertices.append(values.reshape(count, stride)[:, :dimension])
+
+    coordinates = np.concatenate(vertices) if vertices else np.empty((0, stride))
+    if coordinates.shape[1] < dimension:
+        # no z in the geometry
+        coordinates = np.hstack([coordinates, np.zeros((len(coordinates), dimension - coordinates.shape[1]))])
+
+    return coordinates
+
+
+def read_lines(layer: QgsVectorLayer):
+    """
+    Read the vertices of all the lines of a layer into one flat coordinate array.
+
+    Parameters:
+        layer (QgsVectorLayer): The line layer to read.
+
+    Returns:
+        tuple: (fids, coordinates, offsets) the (N,) int64 feature ids in iteration order,
+            the (M, 2) or (M, 3) vertex coordinates (3 if the layer has z) and the (N + 1,) offsets,
+            the vertices of the i-th line being coordinates[offsets[i]:offsets[i + 1]].
+    """
+    dimension = 3 if QgsWkbTypes.hasZ(layer.wkbType()) else 2
+
+    fids = []
+    lines = []
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        fids.append(feature.id())
+        lines.append(_wkb_coordinates(bytes(feature.geometry().asWkb()), dimension))
+
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+    coordinates = np.concatenate(lines) if lines else np.empty((0, dimension))
+
+    return np.array(fids, dtype=np.int64), coordinates, offsets
+
+
+def line_wkb(coordinates) -> bytes:
+    """
+    Build the ISO WKB of a LineString (or LineString Z if coordinates have 3 columns).
+    """
+    wkb_type = 1002 if coordinates.shape[1] == 3 else 2
+    return struct.pack('<BII', 1, wkb_type, len(coordinates)) + np.ascontiguousarray(coordinates, dtype='<f8').tobytes()
+
+
+def read_wkb(layer: QgsVectorLayer):
+    """
+    Read the geometries of a layer as WKB.
+
+    Parameters:
+        layer (QgsVectorLayer): The layer to read.
+
+    Returns:
+        tuple: (fids, wkbs) the (N,) int64 feature ids in iteration order and the list of WKB bytes.
+    """
+    fids = []
+    wkbs = []
+
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        fids.append(feature.id())
+        wkbs.append(bytes(feature.geometry().asWkb()))
+
+    return np.array(fids, dtype=np.int64), wkbs
+
+
+def read_lengths(layer: QgsVectorLayer):
+    """
+    Read the length of each line of a layer into an array.
+
+    Parameters:
+        layer (QgsVectorLayer): The line layer to read.
+
+    Returns:
+        tuple: (fids, length) the (N,) int64 feature ids in iteration order and the (N,) float64 lengths.
+    """
+    fids = []
+    lengths = []
+
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        fids.append(feature.id())
+        lengths.append(feature.geometry().length())
+
+    return np.array(fids, dtype=np.int64), np.array(lengths, dtype=np.float64)
+
+
+def read_attributes(layer: QgsVectorLayer, names: list, dtype=np.int64):
+    """
+    Read attribute columns of a layer into arrays, without geometries.
+
+    Parameters:
+        layer (QgsVectorLayer): The layer to read.
+        names (list): The field names to read.
+        dtype (optional): NumPy dtype of the columns. Default is int64.
+
+    Returns:
+        tuple: (fids, columns) with fids the (N,) int64 feature ids in iteration order
+            and columns a field name to (N,) array mapping.
+    """
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(names, layer.fields())
+
+    fids = []
+    rows = []
+    for feature in layer.getFeatures(request):
+        fids.append(feature.id())
+        rows.append([feature[name] for name in names])
+
+    fids = np.array(fids, dtype=np.int64)
+    columns = {name: np.array([row[i] for row in rows], dtype=dtype) for i, name in enumerate(names)}
+
+    return fids, columns
+
+
+def intersecting_features(layer: QgsVectorLayer, overlay: QgsVectorLayer):
+    """
+    Get the ids of the features of a layer intersecting any feature of the overlay layer,
+    without selection on the layers.
+
+    Parameters:
+        layer (QgsVectorLayer): The layer to test.
+        overlay (QgsVectorLayer): The overlay layer (ie. the outlets buffer).
+
+    Returns:
+        numpy.ndarray: Sorted int64 ids of the intersecting features of layer.
+    """
+    index = QgsSpatialIndex(overlay.getFeatures(QgsFeatureRequest().setNoAttributes()),
+                            flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+    engines = dict()
+
+    fids = []
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        geom = feature.geometry()
+        for candidate in index.intersects(geom.boundingBox()):
+            if candidate not in engines:
+                # prepared geometry engine, reused for all the features tested against this candidate
+                candidate_geom = index.geometry(candidate)
+                engine = QgsGeometry.createGeometryEngine(candidate_geom.constGet())
+                engine.prepareGeometry()
+                engines[candidate] = (candidate_geom, engine)
+            if engines[candidate][1].intersects(geom.constGet()):
+                fids.append(feature.id())
+                break
+
+    return np.unique(np.array(fids, dtype=np.int64))
+
+
+def outlet_features(layer: QgsVectorLayer, exutoire: QgsVectorLayer, distance: float = 50):
+    """
+    Get the ids of the features of a network layer within distance of the raw exutoire lines
+    (distance query on an STR-tree, no buffer polygon).
+
+    Parameters:
+        layer (QgsVectorLayer): The network layer.
+        exutoire (QgsVectorLayer): The exutoire line layer (without buffer).
+        distance (float, optional): The outlet distance, the former exutoire buffer distance. Default is 50.
+
+    Returns:
+        numpy.ndarray: Sorted int64 ids of the outlet features of layer.
+    """
+    fids, lines = read_wkb(layer)
+    _, exutoire_lines = read_wkb(exutoire)
+
+    return np.sort(fids[lines_near_exutoire(lines, exutoire_lines, distance=distance)])
+
+
+def duplicate_features(layer: QgsVectorLayer, quantization: float = None):
+    """
+    Find the duplicate geometries of a line layer in one streaming pass, without copying the layer
+    (native:deleteduplicategeometries on the normalised geometries, the direction of the lines and z are ignored).
+    The features without geometry are always kept.
+
+    Parameters:
+        layer (QgsVectorLayer): The line layer.
+        quantization (float, optional): Quantization factor of the coordinates on the layer extent,
+            None to compare the exact coordinates. Default is None.
+
+    Returns:
+        tuple: (fids, keep, report) the (N,) int64 feature ids in iteration order, the (N,) boolean keep mask
+            and the duplicate report (see dedup.duplicate_report).
+
+    Example:
+        fids, keep, report = duplicate_features(troncon_layer)
+        IdentifyNetworkNodes = identify_network_nodes(troncon_layer, fids=fids[keep])
+    """
+    extent = layer.extent()
+    extent = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+
+    # the lines are gathered first and hashed in one call, only x and y are compared
+    fids = []
+    geometry = []
+    lines = []
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        fids.append(feature.id())
+        geometry.append(feature.hasGeometry())
+        if geometry[-1]:
+            lines.append(_wkb_coordinates(bytes(feature.geometry().asWkb()), 2))
+
+    fids = np.array(fids, dtype=np.int64)
+    geometry = np.array(geometry, dtype=bool)
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+    coordinates = np.concatenate(lines) if lines else np.empty((0, 2))
+    digests = line_digests(coordinates, offsets, extent=extent, quantization=quantization)
+
+    keep = np.ones(len(fids), dtype=bool)
+    first = np.arange(len(fids), dtype=np.int64)
+    keep[geometry], first_geometry = duplicates(digests)
+    first[geometry] = np.flatnonzero(geometry)[first_geometry]
+
+    return fids, keep, duplicate_report(fids, keep, first)
+
+
+def subset_layer(layer: QgsVectorLayer, fids) -> QgsVectorLayer:
+    """
+    Copy a subset of the features of a layer in a memory layer.
+
+    Parameters:
+        layer (QgsVectorLayer): The source layer.
+        fids (numpy.ndarray): The ids of the features to copy.
+
+    Returns:
+        QgsVectorLayer: The memory layer with the features.
+    """
+    return layer.materialize(QgsFeatureRequest().setFilterFids([int(fid) for fid in fids]))
+
+
+def write_attributes(layer: QgsVectorLayer, fids, columns: dict) -> None:
+    """
+    Add (or overwrite) attribute columns on a layer in one provider call.
+
+    Parameters:
+        layer (QgsVectorLayer): The layer to update.
+        fids (numpy.ndarray): (N,) feature ids of the rows to update.
+        columns (dict): Field name to (QVariant type, (N,) array of values) mapping.
+
+    Returns:
+        None
+    """
+    provider = layer.dataProvider()
+
+    new_fields = [QgsField(name, field_type) for name, (field_type, _) in columns.items()
+                  if layer.fields().indexFromName(name) == -1]
+    if new_fields:
+        provider.addAttributes(new_fields)
+        layer.updateFields()
+
+    indexes = [layer.fields().indexFromName(name) for name in columns]
+    values = [np.asarray(column).tolist() for _, column in columns.values()]
+
+    changes = {int(fid): dict(zip(indexes, row)) for fid, *row in zip(fids.tolist(), *values)}
+    provider.changeAttributeValues(changes)
+
+
+def identify_network_nodes(layer: QgsVectorLayer, quantization: float = 100000000, fids=None) -> QgsVectorLayer:
+    """
+    Native replacement of fct:identifynetworknodes. Copy the layer in memory and add the NODEA and NODEB
+    fields, the from and to node ids of each line.
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network line layer.
+        quantization (float, optional): Quantization factor used to match the endpoints. Default is 100000000.
+        fids (numpy.ndarray, optional): Ids of the features to copy (ie. without the duplicate geometries), all if None.
+
+    Returns:
+        QgsVectorLayer: The memory layer with the NODEA and NODEB fields.
+
+    Example:
+        IdentifyNetworkNodes = identify_network_nodes(troncon_layer, quantization=100000000)
+    """
+    request = QgsFeatureRequest()
+    if fids is not None:
+        request.setFilterFids([int(fid) for fid in fids])
+    network = layer.materialize(request)
+
+    fids, start, end = read_endpoints(network)
+
+    extent = layer.extent()
+    nodea, nodeb = identify_nodes(start, end,
+                                  extent=(extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()),
+                                  quantization=quantization)
+
+    write_attributes(network, fids, {'NODEA': (QVariant.LongLong, nodea),
+                                     'NODEB': (QVariant.LongLong, nodeb)})
+
+    return network
+
+
+def snap_network_nodes(network: QgsVectorLayer, tolerance: float) -> QgsVectorLayer:
+    """
+    Merge the NODEA and NODEB nodes of a network closer than the tolerance, to absorb the small gaps between
+    line endpoints left by the digitising (instead of adding connections in troncon_hydrographique_corr_connection).
+    The NODEA and NODEB fields are updated in place, the geometries are not modified.
+
+    Parameters:
+        network (QgsVectorLayer): The network layer with the NODEA and NODEB fields, from identify_network_nodes.
+        tolerance (float): The snapping distance, in the layer units.
+
+    Returns:
+        QgsVectorLayer: The memory line layer of the snapped node pairs, with the NODE (snapped node id)
+            and DISTANCE fields.
+
+    Example:
+        snapped = snap_network_nodes(IdentifyNetworkNodes, tolerance=1.0)
+    """
+    _, start, end = read_endpoints(network)
+    node_fids, nodes = read_attributes(network, ['NODEA', 'NODEB'])
+    # same layer, same iteration order
+    nodea, nodeb = nodes['NODEA'], nodes['NODEB']
+
+    nodea, nodeb, snapped = snap_nodes(nodea, nodeb, start, end, tolerance)
+    print(f"Snapped node pairs : {len(snapped['distance'])}")
+
+    write_attributes(network, node_fids, {'NODEA': (QVariant.LongLong, nodea),
+                                          'NODEB': (QVariant.LongLong, nodeb)})
+
+    fields = QgsFields()
+    for name, field_type in (('NODE', QVariant.LongLong), ('DISTANCE', QVariant.Double)):
+        fields.append(QgsField(name, field_type))
+    pairs = QgsMemoryProviderUtils.createMemoryLayer('SnappedNodes', fields, QgsWkbTypes.LineString, network.crs())
+
+    features = []
+    for points, node, distance in zip(snapped['points'], snapped['node'].tolist(), snapped['distance'].tolist()):
+        feature = QgsFeature(fields)
+        geometry = QgsGeometry()
+        geometry.fromWkb(line_wkb(points))
+        feature.setGeometry(geometry)
+        feature.setAttributes([node, distance])
+        features.append(feature)
+    pairs.dataProvider().addFeatures(features)
+
+    return pairs
+
+
+def topology_errors(network: QgsVectorLayer, outlet_fids, from_node_field: str = 'NODEA',
+                    to_node_field: str = 'NODEB') -> QgsVectorLayer:
+    """
+    Check the topology of a network (cycles, dead ends, sources not reaching an outlet, head to head
+    or tail to tail reaches and orphan components, see validation.validate_network) and copy the reaches
+    with errors in an error layer.
+
+    Parameters:
+        network (QgsVectorLayer): The network layer with the node fields, from identify_network_nodes.
+        outlet_fids (numpy.ndarray): The ids of the outlet features of the network.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+
+    Returns:
+        QgsVectorLayer: The memory line layer of the reaches with errors, with the TRONCON_FID (network feature id),
+            CLEABS (if the network has a cleabs field), FLAGS (validation error flags), ERRORS (error labels)
+            and COMPONENT (connected component) fields.
+
+    Example:
+        errors = topology_errors(IdentifyNetworkNodes, fids[outlet])
+    """
+    fids, nodes = read_attributes(network, [from_node_field, to_node_field])
+    errors = validate_network(nodes[from_node_field], nodes[to_node_field], np.flatnonzero(np.isin(fids, outlet_fids)))
+    print(f"Topology errors : {error_counts(errors['flags'])}")
+
+    flagged = np.flatnonzero(errors['flags'])
+    has_cleabs = network.fields().indexFromName('cleabs') != -1
+    rows = dict(zip(fids[flagged].tolist(),
+                    zip(errors['flags'][flagged].tolist(), error_labels(errors['flags'][flagged]),
+                        errors['component'][flagged].tolist())))
+
+    fields = QgsFields()
+    for name, field_type in (('TRONCON_FID', QVariant.LongLong), ('CLEABS', QVariant.String), ('FLAGS', QVariant.Int),
+                             ('ERRORS', QVariant.String), ('COMPONENT', QVariant.LongLong)):
+        if name != 'CLEABS' or has_cleabs:
+            fields.append(QgsField(name, field_type))
+    layer = QgsMemoryProviderUtils.createMemoryLayer('TopologyErrors', fields, QgsWkbTypes.LineString, network.crs())
+
+    # one pass on the reaches with errors
+    request = QgsFeatureRequest().setFilterFids(list(rows))
+    request.setSubsetOfAttributes(['cleabs'] if has_cleabs else [], network.fields())
+    features = []
+    for source in network.getFeatures(request):
+        feature = QgsFeature(fields)
+        feature.setGeometry(source.geometry())
+        cleabs = [_python_value(source['cleabs'])] if has_cleabs else []
+        feature.setAttributes([source.id()] + cleabs + list(rows[source.id()]))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+
+    return layer
+
+
+def flow_direction_candidates(network: QgsVectorLayer, exutoire: QgsVectorLayer, outlet_fids, subset_fids=None,
+                              from_node_field: str = 'NODEA', to_node_field: str = 'NODEB',
+                              sens_field: str = 'sens_de_l_ecoulement'):
+    """
+    Infer the flow direction of the network reaches from the outlets (see directions.infer_directions),
+    compare it with their digitised direction and their sens_de_l_ecoulement, and find the reaches to reverse.
+    The outlet node of an outlet reach is its end nearest to the exutoire lines.
+
+    Parameters:
+        network (QgsVectorLayer): The network layer with the node fields, from identify_network_nodes.
+        exutoire (QgsVectorLayer): The exutoire line layer (without buffer).
+        outlet_fids (numpy.ndarray): The ids of the outlet features of the network.
+        subset_fids (numpy.ndarray, optional): The ids of the features walked from the outlets (ie. without the canals),
+            the outlets are always walked. Default is None, all the features.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+        sens_field (str, optional): The flow direction attribute, ignored if the layer does not have it.
+            Default is 'sens_de_l_ecoulement'.
+
+    Returns:
+        tuple: (fids, status) the ids of the features to reverse and their candidate status (directions.STATUS_LABELS).
+
+    Example:
+        fids, status = flow_direction_candidates(IdentifyNetworkNodes, exutoire_layer, outlet_fids)
+    """
+    fids, start, end = read_endpoints(network)
+    # same layer, same iteration order
+    _, nodes = read_attributes(network, [from_node_field, to_node_field])
+    nodea, nodeb = nodes[from_node_field], nodes[to_node_field]
+    if network.fields().indexFromName(sens_field) != -1:
+        _, sens = read_attributes(network, [sens_field], dtype=object)
+        sens = sens[sens_field]
+    else:
+        sens = np.full(len(fids), None, dtype=object)
+
+    outlet = np.isin(fids, outlet_fids)
+    _, exutoire_lines = read_wkb(exutoire)
+    start_distance, end_distance = endpoint_distances(start[outlet], end[outlet], exutoire_lines)
+    outlet_nodes = np.where(end_distance <= start_distance, nodeb[outlet], nodea[outlet])
+
+    subset = None if subset_fids is None else np.isin(fids, subset_fids) | outlet
+    status = reversal_candidates(infer_directions(nodea, nodeb, outlet_nodes, subset=subset), attribute_directions(sens))
+    counts = {label: int(np.count_nonzero(status == value)) for value, label in STATUS_LABELS.items()}
+    print(f"Reversal candidates : {counts}")
+
+    candidates = np.flatnonzero(status)
+    return fids[candidates], status[candidates]
+
+
+def connection_gaps(network: QgsVectorLayer, exutoire: QgsVectorLayer, connected_fids, max_distance: float = 1000,
+                    from_node_field: str = 'NODEA', to_node_field: str = 'NODEB') -> QgsVectorLayer:
+    """
+    Find the components of the network which are not connected to an outlet and the gap from their downstream
+    endpoint to the nearest connected node or exutoire line (see gaps.find_gaps), to prepare the connections
+    of troncon_hydrographique_corr_connection.
+
+    Parameters:
+        network (QgsVectorLayer): The network layer with the node fields, from identify_network_nodes.
+        exutoire (QgsVectorLayer): The exutoire line layer (without buffer).
+        connected_fids (numpy.ndarray): The ids of the features connected to an outlet.
+        max_distance (float, optional): The search distance of the nearest node or exutoire line. Default is 1000.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+
+    Returns:
+        QgsVectorLayer: The memory line layer of the gaps, one by disconnected component in rank order
+            (shortest gap first), drawn from the component endpoint to its target (no geometry if none within
+            max_distance), with the RANK, COMPONENT, TRONCONS, LENGTH (of the component), NODE (endpoint node id),
+            TARGET ('reseau' or 'exutoire'), TARGET_NODE, DISTANCE, NETWORK_DISTANCE and EXUTOIRE_DISTANCE fields.
+
+    Example:
+        gaps = connection_gaps(IdentifyNetworkNodes, exutoire_layer, fids[connected])
+    """
+    fids, start, end = read_endpoints(network)
+    # same layer, same iteration order
+    _, nodes = read_attributes(network, [from_node_field, to_node_field])
+    _, lengths = read_lengths(network)
+    _, exutoire_lines = read_wkb(exutoire)
+
+    gaps = find_gaps(nodes[from_node_field], nodes[to_node_field], start, end, lengths,
+                     np.isin(fids, connected_fids), exutoire=exutoire_lines, max_distance=max_distance)
+    print(f"Disconnected components : {len(gaps['component'])}, "
+          f"with a gap within {max_distance} : {int(np.isfinite(gaps['distance']).sum())}")
+
+    fields = QgsFields()
+    for name, field_type in (('RANK', QVariant.Int), ('COMPONENT', QVariant.LongLong), ('TRONCONS', QVariant.Int),
+                             ('LENGTH', QVariant.Double), ('NODE', QVariant.LongLong), ('TARGET', QVariant.String),
+                             ('TARGET_NODE', QVariant.LongLong), ('DISTANCE', QVariant.Double),
+                             ('NETWORK_DISTANCE', QVariant.Double), ('EXUTOIRE_DISTANCE', QVariant.Double)):
+        fields.append(QgsField(name, field_type))
+    layer = QgsMemoryProviderUtils.createMemoryLayer('ConnectionGaps', fields, QgsWkbTypes.LineString, network.crs())
+
+    def finite(values):
+        return [value if np.isfinite(value) else None for value in values.tolist()]
+
+    columns = zip(gaps['component'].tolist(), gaps['edges'].tolist(), gaps['length'].tolist(), gaps['node'].tolist(),
+                  gaps['target'].tolist(), gaps['network_node'].tolist(), finite(gaps['distance']),
+                  finite(gaps['network_distance']), finite(gaps['exutoire_distance']),
+                  gaps['point'], gaps['target_point'])
+
+    features = []
+    for rank, (component, edges, length, node, target, network_node, distance, network_distance, exutoire_distance,
+               point, target_point) in enumerate(columns, start=1):
+        feature = QgsFeature(fields)
+        if target is not None:
+            geometry = QgsGeometry()
+            geometry.fromWkb(line_wkb(np.array([point, target_point])))
+            feature.setGeometry(geometry)
+        feature.setAttributes([rank, component, edges, length, node, target,
+                               network_node if target == NETWORK else None,
+                               distance, network_distance, exutoire_distance])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+
+    return layer
+
+
+def _python_value(value):
+    """
+    Python value of a QGIS attribute, None for NULL and datetime for the Qt dates.
+    """
+    if isinstance(value, QVariant):
+        return None if value.isNull() else value.value()
+    if isinstance(value, QDateTime):
+        return value.toPyDateTime() if value.isValid() else None
+    if isinstance(value, QDate):
+        return value.toPyDate() if value.isValid() else None
+    if isinstance(value, QTime):
+        return value.toPyTime() if value.isValid() else None
+
+    return value
+
+
+def export_columnar(layer: QgsVectorLayer, path: str, fields: list = None, int_fields: tuple = ('NODEA', 'NODEB')) -> None:
+    """
+    Export a line layer to a columnar Arrow IPC file (see columnar.write_table): GeoArrow linestring coordinates,
+    int64 columns for the node ids and Arrow columns for the attributes. The readers (ie. artifact.write_table_artifact)
+    memory map it and read only the columns they need.
+
+    Parameters:
+        layer (QgsVectorLayer): The line layer.
+        path (str): The output file path (.arrow).
+        fields (list, optional): The names of the fields to export, all if None.
+        int_fields (tuple, optional): The fields exported as int64 arrays, if in the layer. Default is ('NODEA', 'NODEB').
+
+    Example:
+        export_columnar(PrincipalStem, 'outputs/reference_hydrographique_troncon.arrow')
+    """
+    names = [field.name() for field in layer.fields()] if fields is None else list(fields)
+
+    _, coordinates, offsets = read_lines(layer)
+
+    rows = []
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(names, layer.fields())
+    for feature in layer.getFeatures(request):
+        rows.append([_python_value(feature[name]) for name in names])
+
+    columns = dict()
+    for i, name in enumerate(names):
+        values = [row[i] for row in rows]
+        columns[name] = np.array(values, dtype=np.int64) if name in int_fields else values
+
+    write_table(path, columns, coordinates=coordinates, offsets=offsets, crs=layer.crs().authid() or None)
+
+
+def export_graph_artifact(layer: QgsVectorLayer, path: str, from_node_field: str = 'NODEA', to_node_field: str = 'NODEB',
+                          strahler: np.ndarray = None) -> dict:
+    """
+    Export the memory mappable graph artifact of a network layer (see artifact.write_artifact): node ids,
+    CSR adjacency, length, Strahler order and outlet of each troncon, linked to the GeoPackage by the fid
+    and cleabs fields.
+
+    Parameters:
+        layer (QgsVectorLayer): The network layer with the from and to node fields.
+        path (str): The artifact folder.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+        strahler (numpy.ndarray, optional): The Strahler order of each feature in iteration order, computed if None.
+
+    Returns:
+        dict: The artifact metadata.
+
+    Example:
+        export_graph_artifact(PrincipalStem, 'outputs/reference_hydrographique_graph')
+    """
+    names = layer.fields().names()
+    _, lengths = read_lengths(layer)
+    _, nodes = read_attributes(layer, [from_node_field, to_node_field])
+
+    # the saved features keep their fid field as GeoPackage fid
+    fid = None
+    if 'fid' in names:
+        fid = read_attributes(layer, ['fid'])[1]['fid']
+    cleabs = None
+    if 'cleabs' in names:
+        cleabs = [_python_value(value) for value in read_attributes(layer, ['cleabs'], dtype=object)[1]['cleabs']]
+
+    return write_artifact(path, nodes[from_node_field], nodes[to_node_field], lengths, fid=fid, cleabs=cleabs,
+                          strahler=strahler, meta={'layer': layer.name(), 'crs': layer.crs().authid()})
+
+
+def aggregate_stream_segments(layer: QgsVectorLayer, copy_fields: list,
+                              from_node_field: str = 'NODEA', to_node_field: str = 'NODEB',
+                              segments: tuple = None) -> QgsVectorLayer:
+    """
+    Native replacement of fct:aggregatestreamsegments. Aggregate the reaches between network intersections
+    into segments, without map layer registration (runs headless).
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network with the from and to node fields.
+        copy_fields (list): The fields copied to the segments, from the most downstream reach of each segment.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+        segments (tuple, optional): (fids, segment, position) aggregation already computed for these features
+            of the layer (ie. by partition.partitioned_build), the other features are ignored. Default is None.
+
+    Returns:
+        QgsVectorLayer: Memory layer of the segments with the copied fields and GID, NODEA, NODEB, LENGTH fields.
+
+    Example:
+        AggregateSegment = aggregate_stream_segments(IdentifyNetworkNodes, field_names)
+    """
+    fids, coordinates, offsets = read_lines(layer)
+    _, nodes = read_attributes(layer, [from_node_field, to_node_field])
+    nodea, nodeb = nodes[from_node_field], nodes[to_node_field]
+
+    if segments is None:
+        segment, position = aggregate_segments(nodea, nodeb)
+    else:
+        segment_fids, segment, position = segments
+        # rows of the aggregated features
+        sorter = np.argsort(fids)
+        rows = sorter[np.searchsorted(fids, segment_fids, sorter=sorter)]
+        counts = offsets[rows + 1] - offsets[rows]
+        vertex_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=vertex_offsets[1:])
+        vertices = np.repeat(offsets[rows] - vertex_offsets[:-1], counts) + np.arange(vertex_offsets[-1], dtype=np.int64)
+        fids, coordinates, offsets = fids[rows], coordinates[vertices], vertex_offsets
+        nodea, nodeb = nodea[rows], nodeb[rows]
+
+    order, segment_coordinates, segment_offsets = merge_lines(coordinates, offsets, segment, position)
+
+    # first and last edge of each segment in the sorted order
+    segment_count = len(segment_offsets) - 1
+    sorted_segment = segment[order]
+    first = order[np.searchsorted(sorted_segment, np.arange(segment_count), side='left')]
+    last = order[np.searchsorted(sorted_segment, np.arange(segment_count), side='right') - 1]
+
+    fields = QgsFields()
+    for name in copy_fields:
+        fields.append(layer.fields().field(name))
+    for name, field_type in (('GID', QVariant.LongLong), ('NODEA', QVariant.LongLong),
+                             ('NODEB', QVariant.LongLong), ('LENGTH', QVariant.Double)):
+        fields.append(QgsField(name, field_type))
+
+    wkb_type = QgsWkbTypes.LineStringZ if segment_coordinates.shape[1] == 3 else QgsWkbTypes.LineString
+    segment_layer = QgsMemoryProviderUtils.createMemoryLayer('AggregateSegment', fields, wkb_type, layer.crs())
+
+    request = (QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+               .setSubsetOfAttributes(copy_fields, layer.fields())
+               .setFilterFids(fids[last].tolist()))
+    copied = {feature.id(): feature.attributes() for feature in layer.getFeatures(request)}
+    copy_indexes = [layer.fields().indexFromName(name) for name in copy_fields]
+
+    features = []
+    for gid in range(segment_count):
+        xy = segment_coordinates[segment_offsets[gid]:segment_offsets[gid + 1]]
+        geometry = QgsGeometry()
+        geometry.fromWkb(line_wkb(xy))
+        planar = xy[:, :2]
+        length = float(np.sqrt((np.diff(planar, axis=0) ** 2).sum(axis=1)).sum())
+
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        attributes = copied[int(fids[last[gid]])]
+        feature.setAttributes([attributes[i] for i in copy_indexes]
+                              + [gid, int(nodea[first[gid]]), int(nodeb[last[gid]]), length])
+        features.append(feature)
+
+    segment_layer.dataProvider().addFeatures(features)
+
+    return segment_layer
+
+
+def compute_network_orders(layer: QgsVectorLayer, from_node_field: str = 'NODEA', to_node_field: str = 'NODEB') -> None:
+    """
+    Native replacement of fct:measurenetworkfromoutlet, fct:hackorder and fct:strahlerorder.
+    Compute the orders in one topological pass and write the MEASURE, HACK, AXIS, LAXIS and STRAHLER
+    fields on the layer at once.
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network with the from and to node fields, updated in place.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+
+    Returns:
+        None
+    """
+    fids, lengths = read_lengths(layer)
+    _, nodes = read_attributes(layer, [from_node_field, to_node_field])
+
+    orders = network_orders(nodes[from_node_field], nodes[to_node_field], lengths)
+
+    write_attributes(layer, fids, {'MEASURE': (QVariant.Double, orders['MEASURE']),
+                                   'HACK': (QVariant.LongLong, orders['HACK']),
+                                   'AXIS': (QVariant.LongLong, orders['AXIS']),
+                                   'LAXIS': (QVariant.Double, orders['LAXIS']),
+                                   'STRAHLER': (QVariant.LongLong, orders['STRAHLER'])})
+
+
+def compute_upstream_accumulation(layer: QgsVectorLayer, from_node_field: str = 'NODEA', to_node_field: str = 'NODEB') -> None:
+    """
+    Write the CUMLENGTH (cumulative upstream channel length), UPCOUNT (upstream reach count) and UPLENGTH
+    (longest upstream flow path) fields on the layer, accumulated in one pass (see orders.upstream_accumulation).
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network with the from and to node fields, updated in place.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+
+    Returns:
+        None
+    """
+    fids, lengths = read_lengths(layer)
+    _, nodes = read_attributes(layer, [from_node_field, to_node_field])
+
+    accumulation = upstream_accumulation(nodes[from_node_field], nodes[to_node_field], lengths)
+
+    write_attributes(layer, fids, {'CUMLENGTH': (QVariant.Double, accumulation['CUMLENGTH']),
+                                   'UPCOUNT': (QVariant.LongLong, accumulation['UPCOUNT']),
+                                   'UPLENGTH': (QVariant.Double, accumulation['UPLENGTH'])})
+
+
+def compute_nested_intervals(layer: QgsVectorLayer, from_node_field: str = 'NODEA', to_node_field: str = 'NODEB') -> None:
+    """
+    Write the DFS_ENTRY and DFS_EXIT nested interval fields on the layer (see intervals.nested_intervals).
+    The features upstream of a feature, itself included, are selected in SQL by
+    "DFS_ENTRY" BETWEEN its DFS_ENTRY AND its DFS_EXIT.
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network with the from and to node fields, updated in place.
+        from_node_field (str, optional): The from node field. Default is 'NODEA'.
+        to_node_field (str, optional): The to node field. Default is 'NODEB'.
+
+    Returns:
+        None
+    """
+    fids, nodes = read_attributes(layer, [from_node_field, to_node_field])
+
+    intervals = nested_intervals(nodes[from_node_field], nodes[to_node_field])
+
+    write_attributes(layer, fids, {'DFS_ENTRY': (QVariant.LongLong, intervals['DFS_ENTRY']),
+                                   'DFS_EXIT': (QVariant.LongLong, intervals['DFS_EXIT'])})
+
+
+def compute_length_in_surface(layer: QgsVectorLayer, surface_tiles: QgsVectorLayer, field_name: str,
+                              workers: int = None):
+    """
+    Compute the percentage of the length of each line inside the hydrographic surface
+    and write it in one provider call.
+
+    Parameters:
+        layer (QgsVectorLayer): The hydrographic network, updated in place.
+        surface_tiles (QgsVectorLayer): The hydrographic surface split in non overlapping tiles.
+        field_name (str): The percentage field name.
+        workers (int, optional): Number of worker processes. Default is None, the number of cores.
+
+    Returns:
+        tuple: (fids, percent) the feature ids and the percentage of each line, -1 if not intersecting the surface.
+    """
+    fids, lines_wkb = read_wkb(layer)
+    _, tiles_wkb = read_wkb(surface_tiles)
+
+    percent = length_in_surface(lines_wkb, tiles_wkb, workers=workers)
+
+    write_attributes(layer, fids, {field_name: (QVariant.Double, percent)})
+
+    return fids, percent
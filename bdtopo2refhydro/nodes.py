@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+
+def quantize(points, extent, quantization: float = 100000000):
+    """
+    Quantize point coordinates on the grid used to identify network nodes.
+
+    The grid step on each axis is the extent width (or height) divided by the quantization factor,
+    as done by the Fluvial Corridor Toolbox IdentifyNetworkNodes algorithm.
+
+    Parameters:
+        points (numpy.ndarray): (N, 2) array of x, y coordinates.
+        extent (tuple): (xmin, ymin, xmax, ymax) extent of the network layer.
+        quantization (float, optional): Quantization factor. Default is 100000000.
+
+    Returns:
+        numpy.ndarray: (N, 2) int64 array of quantized coordinates.
+    """
+    xmin, ymin, xmax, ymax = extent
+    kx = (xmax - xmin) / quantization if xmax != xmin else 1.0
+    ky = (ymax - ymin) / quantization if ymax != ymin else 1.0
+
+    quantized = np.empty((len(points), 2), dtype=np.int64)
+    quantized[:, 0] = np.rint((points[:, 0] - xmin) / kx)
+    quantized[:, 1] = np.rint((points[:, 1] - ymin) / ky)
+
+    return quantized
+
+
+def number_points(keys):
+    """
+    Number identical keys in order of first appearance.
+
+    Parameters:
+        keys (numpy.ndarray): (N,) or (N, 2) integer array of point keys.
+
+    Returns:
+        numpy.ndarray: (N,) int64 array of ids, 0 for the first distinct key, 1 for the second...
+    """
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if keys.ndim == 1:
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+
+    # np.unique numbers the keys in sorted order, renumber them in order of first appearance
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first), dtype=np.int64)
+
+    return rank[inverse.reshape(-1)]
+
+
+def identify_nodes(start, end, extent=None, quantization: float = 100000000):
+    """
+    Identify the network nodes from the line endpoints.
+
+    Endpoints falling in the same quantization cell share the same node. The node numbering contract is
+    the one of the Fluvial Corridor Toolbox IdentifyNetworkNodes algorithm : nodes are numbered from 0
+    in order of first appearance, reading the lines in order and the first vertex (NODEA) before the last one (NODEB).
+
+    Parameters:
+        start (numpy.ndarray): (N, 2) array of the first vertex coordinates of each line.
+        end (numpy.ndarray): (N, 2) array of the last vertex coordinates of each line.
+        extent (tuple, optional): (xmin, ymin, xmax, ymax) extent of the network layer.
+            Default is the extent of the endpoints.
+        quantization (float, optional): Quantization factor. Default is 100000000.
+
+    Returns:
+        tuple: (nodea, nodeb) int64 arrays of the from and to node ids of each line.
+
+    Example:
+        nodea, nodeb = identify_nodes(start, end, extent=(xmin, ymin, xmax, ymax))
+    """
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+    end = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+    n = len(start)
+
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # interleave endpoints to get the a0, b0, a1, b1... appearance order
+    points = np.empty((2 * n, 2), dtype=np.float64)
+    points[0::2] = start
+    points[1::2] = end
+
+    if extent is None:
+        extent = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+
+    quantized = quantize(points, extent, quantization)
+
+    # pack both coordinates in one int64 key when it fits, faster to sort than rows
+    span_x, span_y = (int(v) + 1 for v in quantized.max(axis=0))
+    if quantized.min() >= 0 and span_x * span_y < np.iinfo(np.int64).max:
+        keys = quantized[:, 0] * span_y + quantized[:, 1]
+    else:
+        keys = quantized
+
+    nodes = number_points(keys)
+
+    return nodes[0::2], nodes[1::2]
+
+
+def near_pairs(points, tolerance: float):
+    """
+    Find all the pairs of points closer than the tolerance with a spatial hash, in O(N) for a bounded point density.
+
+    The points are hashed in square cells of tolerance side, so the neighbours of a point are in its cell
+    or in the 8 cells around it. Each pair of cells is searched once (the cell itself and 4 of its neighbours).
+
+    Parameters:
+        points (numpy.ndarray): (N, 2) array of x, y coordinates.
+        tolerance (float): The distance tolerance, in the units of the coordinates.
+
+    Returns:
+        tuple: (pairs, distance) the (K, 2) int64 indices of the point pairs, lowest index first,
+            and their (K,) distance.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+
+    if n == 0 or tolerance <= 0:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    cells = np.floor((points - points.min(axis=0)) / tolerance).astype(np.int64)
+    # one empty row between columns, so the cell below the first row is never a cell of the previous column
+    rows = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * rows + cells[:, 1]
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs = []
+    distances = []
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        # searched in key order, much faster than random needles
+        neighbour_keys = sorted_keys + dx * rows + dy
+        low = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - low
+        total = int(counts.sum())
+        if total == 0:
+            continue
+
+        i = np.repeat(order, counts)
+        j = order[np.repeat(low - (np.cumsum(counts) - counts), counts) + np.arange(total, dtype=np.int64)]
+
+        candidates = i < j if (dx, dy) == (0, 0) else i != j
+        i, j = i[candidates], j[candidates]
+        distance = np.hypot(*(points[i] - points[j]).T)
+        near = distance <= tolerance
+
+        pairs.append(np.column_stack([np.minimum(i, j), np.maximum(i, j)])[near])
+        distances.append(distance[near])
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    return np.concatenate(pairs), np.concatenate(distances)
+
+
+def snap_nodes(nodea, nodeb, start, end, tolerance: float):
+    """
+    Merge the network nodes closer than the tolerance, to absorb the small gaps between line endpoints
+    (the geometries are not modified).
+
+    The nodes are clustered by single linkage: two nodes are merged if a chain of nodes closer than
+    the tolerance links them. The two nodes of a same edge are never snapped together, directly or through
+    a chain: a cluster holding both nodes of an edge loses its longest pair and is clustered again.
+    The merged node numbering keeps the identify_nodes contract, nodes numbered in order of first appearance.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge, from identify_nodes.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge, from identify_nodes.
+        start (numpy.ndarray): (E, 2) array of the first vertex coordinates of each line.
+        end (numpy.ndarray): (E, 2) array of the last vertex coordinates of each line.
+        tolerance (float): The snapping distance, in the units of the coordinates.
+
+    Returns:
+        tuple: (nodea, nodeb, snapped) the snapped node ids of each edge and the report of the snapped pairs,
+            a dict of arrays with 'nodes' the (K, 2) node ids before snapping, 'points' the (K, 2, 2) coordinates
+            of the two nodes, 'distance' the (K,) distance between them and 'node' the (K,) snapped node id.
+
+    Example:
+        nodea, nodeb = identify_nodes(start, end)
+        nodea, nodeb, snapped = snap_nodes(nodea, nodeb, start, end, tolerance=1.0)
+    """
+    from .partition import weak_components
+
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    size = int(max(nodea.max(), nodeb.max())) + 1 if len(nodea) else 0
+
+    # one position by node, the endpoints of a node only differ below the quantization step
+    position = np.empty((size, 2), dtype=np.float64)
+    position[nodeb] = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+    position[nodea] = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+
+    pairs, distance = near_pairs(position, tolerance)
+
+    # never collapse an edge shorter than the tolerance
+    linked = np.minimum(nodea, nodeb) * size + np.maximum(nodea, nodeb)
+    kept = ~np.isin(pairs[:, 0] * size + pairs[:, 1], linked)
+    pairs, distance = pairs[kept], distance[kept]
+
+    # the root of each cluster is its lowest node id, ie. its first appearing node
+    loop = nodea == nodeb
+    while len(pairs):
+        label = weak_components(pairs[:, 0], pairs[:, 1])
+        root = np.arange(size, dtype=np.int64)
+        root[pairs[:, 0]] = label
+        root[pairs[:, 1]] = label
+
+        # clusters chaining the two nodes of an edge, split by removing their longest pair
+        collapsed = np.unique(root[nodea[(root[nodea] == root[nodeb]) & ~loop]])
+        if collapsed.size == 0:
+            break
+        candidates = np.flatnonzero(np.isin(label, collapsed))
+        order = candidates[np.lexsort((-distance[candidates], label[candidates]))]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = label[order][1:] != label[order][:-1]
+        kept = np.ones(len(pairs), dtype=bool)
+        kept[order[first]] = False
+        pairs, distance = pairs[kept], distance[kept]
+    else:
+        root = np.arange(size, dtype=np.int64)
+
+    nodes = np.empty(2 * len(nodea), dtype=np.int64)
+    nodes[0::2] = root[nodea]
+    nodes[1::2] = root[nodeb]
+    nodes = number_points(nodes)
+    snapped_nodea, snapped_nodeb = nodes[0::2], nodes[1::2]
+
+    # new id of each node, through the first endpoint of each node
+    new_id = np.empty(size, dtype=np.int64)
+    new_id[nodeb] = snapped_nodeb
+    new_id[nodea] = snapped_nodea
+
+    snapped = {'nodes': pairs, 'points': position[pairs], 'distance': distance, 'node': new_id[pairs[:, 0]]}
+
+    return snapped_nodea, snapped_nodeb, snapped
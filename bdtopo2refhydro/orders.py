@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import csr, gather, node_count, topological_levels
+
+
+def _first_by_group(groups, *keys):
+    """
+    Index of the first item of each group when sorting by keys (last key is the primary one after groups).
+
+    Returns:
+        numpy.ndarray: Positions in the input arrays of the first item of each group.
+    """
+    order = np.lexsort(tuple(reversed(keys)) + (groups, ))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = groups[order][1:] != groups[order][:-1]
+
+    return order[first]
+
+
+def network_orders(nodea, nodeb, length):
+    """
+    Compute in one topological sort the measure from outlet, Hack and Strahler orders of the network,
+    native replacement of fct:measurenetworkfromoutlet, fct:hackorder and fct:strahlerorder.
+
+    - MEASURE : distance along the network from the downstream node (NODEB) of the edge to the outlet.
+    - STRAHLER : 1 for the sources, increased by one downstream of the confluence of two edges of the same order.
+    - HACK : 1 for the main stem, the longest flow path from the outlet, increased by one for each tributary.
+    - AXIS : id of the Hack axis of the edge, the index of its most downstream edge.
+    - LAXIS : length of the Hack axis, from its most downstream edge to its source.
+
+    The upstream pass (sources to outlets) gives the Strahler order and the longest upstream flow path,
+    the downstream pass (outlets to sources) gives the measure and the Hack order.
+    Edges in a cycle are not ordered and get NaN measure and 0 orders.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        length (numpy.ndarray): (E,) length of each edge.
+
+    Returns:
+        dict: Field name (MEASURE, HACK, AXIS, LAXIS, STRAHLER, UPLENGTH) to (E,) array mapping,
+            UPLENGTH being the longest flow path upstream of the edge, edge included.
+
+    Example:
+        orders = network_orders(nodea, nodeb, length)
+        strahler = orders['STRAHLER']
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    length = np.asarray(length, dtype=np.float64)
+    size = node_count(nodea, nodeb)
+    edge_count = len(nodea)
+
+    levels = topological_levels(nodea, nodeb)
+    in_ptr, in_edges = csr(nodeb, size)
+
+    strahler = np.zeros(edge_count, dtype=np.int64)
+    uplength = np.zeros(edge_count, dtype=np.float64)
+
+    # upstream pass, all the edges flowing into a node are known when its outgoing edges are reached
+    for level in levels:
+        nodes, inverse = np.unique(nodea[level], return_inverse=True)
+        counts = in_ptr[nodes + 1] - in_ptr[nodes]
+        upstream = gather(in_ptr, in_edges, nodes)
+
+        node_strahler = np.zeros(len(nodes), dtype=np.int64)
+        node_uplength = np.zeros(len(nodes), dtype=np.float64)
+        has_upstream = counts > 0
+        if upstream.size:
+            starts = (np.cumsum(counts) - counts)[has_upstream]
+            maximum = np.maximum.reduceat(strahler[upstream], starts)
+            same_order = np.add.reduceat(strahler[upstream] == np.repeat(maximum, counts[has_upstream]), starts)
+            node_strahler[has_upstream] = maximum + (same_order > 1)
+            node_uplength[has_upstream] = np.maximum.reduceat(uplength[upstream], starts)
+
+        strahler[level] = np.maximum(node_strahler[inverse], 1)
+        uplength[level] = length[level] + node_uplength[inverse]
+
+    # main upstream edge of each node, the longest flow path (lowest edge index on ties)
+    ordered = np.concatenate(levels) if levels else np.empty(0, dtype=np.int64)
+    main = np.zeros(edge_count, dtype=bool)
+    if ordered.size:
+        main[ordered[_first_by_group(nodeb[ordered], -uplength[ordered], ordered)]] = True
+
+    measure = np.full(edge_count, np.nan, dtype=np.float64)
+    hack = np.zeros(edge_count, dtype=np.int64)
+    axis = np.full(edge_count, -1, dtype=np.int64)
+    laxis = np.full(edge_count, np.nan, dtype=np.float64)
+
+    # downstream values of each node, outlets are the nodes without outgoing edge
+    node_measure = np.zeros(size, dtype=np.float64)
+    node_hack = np.ones(size, dtype=np.int64)
+    node_axis = np.full(size, -1, dtype=np.int64)
+    node_laxis = np.full(size, np.nan, dtype=np.float64)
+
+    # downstream pass, all the edges leaving a node are in the same level
+    for level in reversed(levels):
+        measure[level] = node_measure[nodeb[level]]
+        hack[level] = node_hack[nodeb[level]] + ~main[level]
+
+        continues_axis = main[level] & (node_axis[nodeb[level]] != -1)
+        axis[level] = np.where(continues_axis, node_axis[nodeb[level]], level)
+        laxis[level] = np.where(continues_axis, node_laxis[nodeb[level]], uplength[level])
+
+        # on diffluences, the from node takes the values of the downstream edge with the lowest Hack order
+        first = _first_by_group(nodea[level], hack[level], measure[level] + length[level], level)
+        chosen, nodes = level[first], nodea[level][first]
+        node_measure[nodes] = measure[chosen] + length[chosen]
+        node_hack[nodes] = hack[chosen]
+        node_axis[nodes] = axis[chosen]
+        node_laxis[nodes] = laxis[chosen]
+
+    return {'MEASURE': measure,
+            'HACK': hack,
+            'AXIS': axis,
+            'LAXIS': laxis,
+            'STRAHLER': strahler,
+            'UPLENGTH': uplength}
+
+
+def upstream_accumulation(nodea, nodeb, length):
+    """
+    Accumulate the network from the sources to the outlets in one pass of the topological levels.
+
+    - CUMLENGTH : total length of the channels upstream of the edge, edge included.
+    - UPCOUNT : number of edges upstream of the edge, edge included.
+    - UPLENGTH : longest flow path upstream of the edge, edge included (same as network_orders).
+
+    On a network without multiple channels (the reference network) the totals are exact, downstream of
+    a diffluence the upstream edges are counted once by channel. Edges in a cycle are not accumulated
+    and get NaN lengths and 0 count.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        length (numpy.ndarray): (E,) length of each edge.
+
+    Returns:
+        dict: Field name (CUMLENGTH, UPCOUNT, UPLENGTH) to (E,) array mapping.
+
+    Example:
+        accumulation = upstream_accumulation(nodea, nodeb, length)
+        cumulative_length = accumulation['CUMLENGTH']
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    length = np.asarray(length, dtype=np.float64)
+    size = node_count(nodea, nodeb)
+    edge_count = len(nodea)
+
+    cumlength = np.full(edge_count, np.nan, dtype=np.float64)
+    upcount = np.zeros(edge_count, dtype=np.int64)
+    uplength = np.full(edge_count, np.nan, dtype=np.float64)
+
+    # totals of the edges flowing into each node
+    node_cumlength = np.zeros(size, dtype=np.float64)
+    node_upcount = np.zeros(size, dtype=np.int64)
+    node_uplength = np.zeros(size, dtype=np.float64)
+
+    # all the edges flowing into a node are accumulated when its outgoing edges are reached
+    for level in topological_levels(nodea, nodeb):
+        cumlength[level] = length[level] + node_cumlength[nodea[level]]
+        upcount[level] = 1 + node_upcount[nodea[level]]
+        uplength[level] = length[level] + node_uplength[nodea[level]]
+
+        np.add.at(node_cumlength, nodeb[level], cumlength[level])
+        np.add.at(node_upcount, nodeb[level], upcount[level])
+        np.maximum.at(node_uplength, nodeb[level], uplength[level])
+
+    return {'CUMLENGTH': cumlength,
+            'UPCOUNT': upcount,
+            'UPLENGTH': uplength}
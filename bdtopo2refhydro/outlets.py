@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+
+def _require_shapely() -> None:
+    if shapely is None:
+        raise ImportError("shapely >= 2.0 is needed for the outlet matching (pip install shapely)")
+
+
+def exutoire_tree(exutoire_wkb):
+    """
+    STR-tree of the raw exutoire lines (limite_terre_mer, plan_d_eau_line and frontiere), without buffer.
+
+    Parameters:
+        exutoire_wkb (list): The WKB of the exutoire lines.
+
+    Returns:
+        shapely.STRtree: The tree, reusable for several distances.
+    """
+    _require_shapely()
+    geometries = shapely.from_wkb(np.asarray(exutoire_wkb, dtype=object))
+    return shapely.STRtree(geometries[~shapely.is_missing(geometries)])
+
+
+def lines_near_exutoire(lines_wkb, exutoire, distance: float = 50):
+    """
+    Find the network lines within distance of the exutoire lines, by a distance query on the STR-tree
+    of the raw exutoire lines. Same selection as intersecting the exutoire buffer polygons,
+    without building, fixing and intersecting the buffers.
+
+    Parameters:
+        lines_wkb (list): The WKB of the network lines.
+        exutoire (shapely.STRtree or list): The exutoire lines tree (exutoire_tree) or their WKB.
+        distance (float, optional): The outlet distance, the former buffer distance. Default is 50.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the lines within distance of an exutoire line.
+
+    Example:
+        outlets = lines_near_exutoire(lines_wkb, exutoire_wkb, distance=buffer_distance)
+    """
+    _require_shapely()
+    tree = exutoire if isinstance(exutoire, shapely.STRtree) else exutoire_tree(exutoire)
+    lines = shapely.from_wkb(np.asarray(lines_wkb, dtype=object))
+
+    line_index, _ = tree.query(lines, predicate='dwithin', distance=distance)
+    return np.unique(line_index).astype(np.int64)
+
+
+def endpoints_near_exutoire(start, end, exutoire, distance: float = 50):
+    """
+    Find the network lines with an endpoint within distance of the exutoire lines.
+
+    Parameters:
+        start (numpy.ndarray): (N, 2) array of the first vertex coordinates of each line.
+        end (numpy.ndarray): (N, 2) array of the last vertex coordinates of each line.
+        exutoire (shapely.STRtree or list): The exutoire lines tree (exutoire_tree) or their WKB.
+        distance (float, optional): The outlet distance. Default is 50.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the lines with an endpoint within distance of an exutoire line.
+    """
+    _require_shapely()
+    tree = exutoire if isinstance(exutoire, shapely.STRtree) else exutoire_tree(exutoire)
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+    end = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+
+    points = shapely.points(np.concatenate([start, end]))
+    point_index, _ = tree.query(points, predicate='dwithin', distance=distance)
+    return np.unique(point_index % len(start)).astype(np.int64)
+
+
+def endpoint_distances(start, end, exutoire):
+    """
+    Distance of the first and last vertex of each network line to the nearest exutoire line
+    (nearest neighbour query on the STR-tree), to tell which end of an outlet line flows out.
+
+    Parameters:
+        start (numpy.ndarray): (N, 2) array of the first vertex coordinates of each line.
+        end (numpy.ndarray): (N, 2) array of the last vertex coordinates of each line.
+        exutoire (shapely.STRtree or list): The exutoire lines tree (exutoire_tree) or their WKB.
+
+    Returns:
+        tuple: (start_distance, end_distance) (N,) float64 arrays, inf if there is no exutoire line.
+    """
+    _require_shapely()
+    tree = exutoire if isinstance(exutoire, shapely.STRtree) else exutoire_tree(exutoire)
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+    end = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+
+    points = shapely.points(np.concatenate([start, end]))
+    distance = np.full(len(points), np.inf, dtype=np.float64)
+    if len(points) and len(tree.geometries):
+        (point_index, _), nearest = tree.query_nearest(points, return_distance=True, all_matches=False)
+        distance[point_index] = nearest
+
+    return distance[:len(start)], distance[len(start):]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .workers import worker_executable
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+# surface tiles tree of the worker processes, built once by _init_worker
+_tiles = None
+_tree = None
+
+
+def _require_shapely() -> None:
+    if shapely is None:
+        raise ImportError("shapely >= 2.0 is needed for the overlay stage (pip install shapely)")
+
+
+def _init_worker(tiles_wkb) -> None:
+    """
+    Build the STR-tree of the surface tiles, with prepared geometries, once per process.
+    """
+    global _tiles, _tree
+    _tiles = shapely.from_wkb(np.asarray(tiles_wkb, dtype=object))
+    shapely.prepare(_tiles)
+    _tree = shapely.STRtree(_tiles)
+
+
+def _length_in_tiles(lines_wkb):
+    """
+    Length of each line inside the tiles of the worker tree.
+    """
+    lines = shapely.from_wkb(np.asarray(lines_wkb, dtype=object))
+
+    # bounding box candidates, then the exact predicate on the prepared tiles
+    line_index, tile_index = _tree.query(lines)
+    hit = shapely.intersects(_tiles[tile_index], lines[line_index])
+    line_index, tile_index = line_index[hit], tile_index[hit]
+
+    lengths = shapely.length(shapely.intersection(lines[line_index], _tiles[tile_index]))
+    inside = np.bincount(line_index, weights=lengths, minlength=len(lines))
+    touched = np.bincount(line_index, minlength=len(lines)) > 0
+
+    return inside, touched, shapely.length(lines)
+
+
+def length_in_surface(lines_wkb, tiles_wkb, workers: int = None, chunk_size: int = 20000):
+    """
+    Compute the percentage of the length of each line inside the hydrographic surface.
+
+    The surface is given as small tiles (ie. native:subdivide of the dissolved surface) indexed in an STR-tree,
+    each line is only intersected with the tiles whose prepared geometry it intersects.
+    The lines are processed by chunks in parallel worker processes.
+
+    Parameters:
+        lines_wkb (list): The WKB of the lines.
+        tiles_wkb (list): The WKB of the surface tiles, the tiles must not overlap.
+        workers (int, optional): Number of worker processes, 1 to compute in the current process.
+            Default is None, the number of cores.
+        chunk_size (int, optional): Number of lines by chunk. Default is 20000.
+
+    Returns:
+        numpy.ndarray: (N,) percentage of each line length inside the surface, -1 for the lines not intersecting it.
+
+    Example:
+        pc_length_in_surface = length_in_surface(lines_wkb, tiles_wkb)
+    """
+    _require_shapely()
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [lines_wkb[i:i + chunk_size] for i in range(0, len(lines_wkb), chunk_size)]
+
+    if workers == 1 or len(chunks) <= 1 or not worker_executable():
+        _init_worker(tiles_wkb)
+        results = [_length_in_tiles(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 initializer=_init_worker, initargs=(tiles_wkb, )) as executor:
+            results = list(executor.map(_length_in_tiles, chunks))
+
+    if not results:
+        return np.empty(0, dtype=np.float64)
+
+    inside, touched, total = (np.concatenate(values) for values in zip(*results))
+
+    percent = np.full(len(inside), -1.0)
+    valid = touched & (total > 0)
+    percent[valid] = inside[valid] / total[valid] * 100
+
+    return percent
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .graph import connected_edges, node_count, UPDOWNSTREAM
+from .principal_stem import principal_stem
+from .segments import aggregate_segments
+from .workers import worker_executable
+
+
+def weak_components(nodea, nodeb):
+    """
+    Label the weakly connected components of the network (edge directions ignored),
+    by union of the edge nodes and path compression on the whole node array at once.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        numpy.ndarray: (E,) component label of each edge, the lowest node id of the component.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    parent = np.arange(node_count(nodea, nodeb), dtype=np.int64)
+
+    while True:
+        roota, rootb = parent[nodea], parent[nodeb]
+        low, high = np.minimum(roota, rootb), np.maximum(roota, rootb)
+        joined = low != high
+        if not joined.any():
+            break
+
+        # hook the higher root on the lowest root it is linked to, then compress the paths
+        np.minimum.at(parent, high[joined], low[joined])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    return parent[nodea]
+
+
+def drainage_partitions(nodea, nodeb, outlets):
+    """
+    Split the network in independent drainage components, the weakly connected components
+    holding at least one outlet edge. Edges of components without outlet are not in any partition.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        outlets (numpy.ndarray): Indices of the outlet edges.
+
+    Returns:
+        list: The sorted edge indices of each component, ordered by their lowest edge index.
+    """
+    label = weak_components(nodea, nodeb)
+    drained = np.isin(label, label[np.asarray(outlets, dtype=np.int64)])
+
+    edges = np.flatnonzero(drained)
+    order = np.argsort(label[edges], kind='stable')
+    edges = edges[order]
+    bounds = np.flatnonzero(np.diff(label[edges])) + 1
+    partitions = np.split(edges, bounds)
+
+    partitions.sort(key=lambda partition: int(partition[0]))
+    return [partition for partition in partitions if len(partition)]
+
+
+def build_partition(nodea, nodeb, length, outlets):
+    """
+    Build the reference network of one partition: connected reaches, principal stem and segments.
+    Same stages as create_connected_reference_hydro on the whole network.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        length (numpy.ndarray): (E,) length of each edge.
+        outlets (numpy.ndarray): Indices of the outlet edges.
+
+    Returns:
+        tuple: (stem, segment, position) the sorted indices of the principal stem edges,
+            the segment id and position in the segment of each of them.
+    """
+    connected = connected_edges(nodea, nodeb, outlets, direction=UPDOWNSTREAM)
+    stem = connected[principal_stem(nodea[connected], nodeb[connected], length[connected])]
+    segment, position = aggregate_segments(nodea[stem], nodeb[stem])
+
+    return stem, segment, position
+
+
+def _build_task(partitions):
+    """
+    Worker task: build a group of partitions, with their node ids renumbered from 0.
+    """
+    results = []
+    for nodea, nodeb, length, outlets in partitions:
+        _, nodes = np.unique(np.concatenate([nodea, nodeb]), return_inverse=True)
+        results.append(build_partition(nodes[:len(nodea)], nodes[len(nodea):], length, outlets))
+
+    return results
+
+
+def partitioned_build(nodea, nodeb, length, outlets, workers: int = None, task_size: int = 50000):
+    """
+    Build the connected reference network (connected reaches, principal stem and segments)
+    by independent drainage components in parallel worker processes.
+
+    The components are grouped in tasks of about task_size edges, the largest first.
+    The results are merged in the global edge order, so the output does not depend on the workers:
+    segments are numbered in the order of their most upstream edge, as done by aggregate_segments
+    on the whole network.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        length (numpy.ndarray): (E,) length of each edge.
+        outlets (numpy.ndarray): Indices of the outlet edges.
+        workers (int, optional): Number of worker processes, 1 to build in the current process.
+            Default is None, the number of cores.
+        task_size (int, optional): Minimum number of edges by task. Default is 50000.
+
+    Returns:
+        tuple: (stem, segment, position) the sorted indices of the principal stem edges,
+            the segment id and position in the segment of each of them.
+
+    Example:
+        stem, segment, position = partitioned_build(nodea, nodeb, length, outlets, workers=8)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    length = np.asarray(length, dtype=np.float64)
+    outlets = np.asarray(outlets, dtype=np.int64)
+
+    partitions = drainage_partitions(nodea, nodeb, outlets)
+    is_outlet = np.zeros(len(nodea), dtype=bool)
+    is_outlet[outlets] = True
+
+    # group the partitions by tasks, largest partitions first
+    tasks, task, task_edges = [], [], 0
+    for index in sorted(range(len(partitions)), key=lambda i: -len(partitions[i])):
+        task.append(index)
+        task_edges += len(partitions[index])
+        if task_edges >= task_size:
+            tasks.append(task)
+            task, task_edges = [], 0
+    if task:
+        tasks.append(task)
+
+    def task_arrays(task):
+        return [(nodea[partitions[i]], nodeb[partitions[i]], length[partitions[i]],
+                 np.flatnonzero(is_outlet[partitions[i]])) for i in task]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1 or not worker_executable():
+        results = [_build_task(task_arrays(task)) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_build_task, (task_arrays(task) for task in tasks)))
+
+    # back to global edge indices, each segment identified by its most upstream edge
+    stems, heads, positions = [], [], []
+    for task, task_results in zip(tasks, results):
+        for index, (stem, segment, position) in zip(task, task_results):
+            edges = partitions[index][stem]
+            head = np.empty(int(segment.max()) + 1 if len(segment) else 0, dtype=np.int64)
+            head[segment[position == 0]] = edges[position == 0]
+            stems.append(edges)
+            heads.append(head[segment])
+            positions.append(position)
+
+    if not stems:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    stem, head, position = np.concatenate(stems), np.concatenate(heads), np.concatenate(positions)
+    order = np.argsort(stem)
+    _, segment = np.unique(head[order], return_inverse=True)
+
+    return stem[order], segment.astype(np.int64), position[order]
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+
+from .artifact import META_NAME
+from .cache import StageCache
+from .columnar import has_pyarrow
+from .profiling import RunProfiler
+
+# input and output files and layers of the workflow, the names of the original repository
+LAYERS = {
+    'corr_reseau_hydrographique_gpkg': 'corr_reseau_hydrographique.gpkg',
+    'troncon_hydrographique_corr_connection_and_dir_ecoulement': 'troncon_hydrographique_corr_connection_and_dir_ecoulement',
+    'troncon_hydrographique_corr_connection': 'troncon_hydrographique_corr_connection',
+    'troncon_hydrographique_corr_dir_ecoulement': 'troncon_hydrographique_corr_dir_ecoulement',
+    'troncon_hydrographique_corr_geom': 'troncon_hydrographique_corr_geom',
+    'troncon_hydrographique_corr_suppr_canal_multichenal': 'troncon_hydrographique_corr_suppr_canal_multichenal',
+    'creation_exutoire_gpkg': 'creation_exutoire.gpkg',
+    'plan_d_eau_layername': 'plan_d_eau_selected',
+    'frontiere_layername': 'frontiere',
+    'limite_terre_mer_layername': 'limite_terre_mer',
+    'troncon_hydrographique_cours_d_eau_corr_gpkg': 'troncon_hydrographique_cours_d_eau_corr.gpkg',
+    'troncon_hydrographique_cours_d_eau': 'troncon_hydrographique_cours_d_eau',
+    'troncon_hydrographique_cours_d_eau_corr': 'troncon_hydrographique_cours_d_eau_corr',
+    'troncon_hydrographique_cours_d_eau_corr_suppr_canal': 'troncon_hydrographique_cours_d_eau_corr_suppr_canal',
+    'erreurs_topologie_layername': 'erreurs_topologie',
+    'troncon_hydrographique_corr_dir_ecoulement_candidats': 'troncon_hydrographique_corr_dir_ecoulement_candidats',
+    'exutoire_gpkg': 'exutoire.gpkg',
+    'plan_d_eau_line_layername': 'plan_d_eau_line',
+    'exutoire_layername': 'exutoire',
+    'reference_hydrographique_gpkg': 'reference_hydrographique.gpkg',
+    'reference_hydrographique_troncon_layername': 'reference_hydrographique_troncon',
+    'reference_hydrographique_segment_layername': 'reference_hydrographique_segment',
+    'noeuds_rapproches_layername': 'noeuds_rapproches',
+    'lacunes_connexion_layername': 'lacunes_connexion',
+}
+
+# headless application, kept alive for the process lifetime
+_application = None
+
+
+def init_qgis(prefix_path: str = None):
+    """
+    Initialise QGIS and the processing providers once per process, headless if no QGIS application is running
+    (in the QGIS python console, the running application is used).
+
+    Parameters:
+        prefix_path (str, optional): The QGIS install prefix, QGIS_PREFIX_PATH environment variable if None.
+
+    Returns:
+        QgsApplication: The QGIS application.
+    """
+    global _application
+    from qgis.core import QgsApplication
+
+    if QgsApplication.instance() is None:
+        if prefix_path is not None:
+            QgsApplication.setPrefixPath(prefix_path, True)
+        _application = QgsApplication([], False)
+        _application.initQgis()
+
+    # processing is a QGIS core plugin
+    for plugins in (os.path.join(QgsApplication.pkgDataPath(), 'python', 'plugins'),
+                    os.path.join(QgsApplication.qgisSettingsDirPath(), 'python', 'plugins')):
+        if os.path.isdir(plugins) and plugins not in sys.path:
+            sys.path.append(plugins)
+
+    from processing.core.Processing import Processing
+    Processing.initialize()
+
+    return QgsApplication.instance()
+
+
+def build(workdir: str, inputs_folder: str = 'inputs/', outputs_folder: str = 'outputs/',
+          buffer_distance: float = 50, crs: str = 'EPSG:2154', quantization: float = 100000000,
+          snap_tolerance: float = None, columnar: bool = None, artifact: str = 'reference_hydrographique_graph',
+          use_cache: bool = True, partitioned: bool = False, workers: int = None, layers: dict = None,
+          report: str = 'run_report', cprofile: bool = False) -> dict:
+    """
+    Create the reference hydrographic network from IGN BD TOPO, headless and in one process:
+    fix_corrections, create_exutoire, fix_suppr_canal_auto, propose_direction_corrections
+    and create_connected_reference_hydro.
+
+    QGIS and processing are initialised once, the layers are passed in memory from a stage to the next one
+    (each stage still saves its outputs to the outputs folder). With use_cache, the stages whose inputs
+    and parameters did not change since their last run are skipped and their saved outputs reused.
+
+    Parameters:
+        workdir (str): The main working directory path.
+        inputs_folder (str, optional): The input data folder in workdir. Default is 'inputs/'.
+        outputs_folder (str, optional): The outputs folder in workdir. Default is 'outputs/'.
+        buffer_distance (float, optional): The outlet distance to the exutoire lines (former buffer distance).
+            Default is 50.
+        crs (str, optional): The Coordinate Reference System (CRS) of the exutoire layers. Default is 'EPSG:2154'.
+        quantization (float, optional): Quantization factor used to match the endpoints. Default is 100000000.
+        snap_tolerance (float, optional): Distance below which the network nodes are merged (small digitising gaps),
+            the snapped pairs are saved in the noeuds_rapproches layer. None to not snap. Default is None.
+        columnar (bool, optional): If True, the reference troncon and segment layers, with their NODEA and NODEB,
+            are also written as memory mappable Arrow IPC files (outputs/<layername>.arrow, needs pyarrow),
+            the graph artifact is then read from the troncon file. Default is None, if pyarrow is installed.
+        artifact (str, optional): Name of the graph artifact folder written in the outputs folder (node ids,
+            CSR adjacency, length, Strahler order and outlet of each troncon as .npy arrays,
+            see artifact.GraphArtifact).
+            None to not write it. Default is 'reference_hydrographique_graph'.
+        use_cache (bool, optional): If True, skip the unchanged stages. Default is True.
+        partitioned (bool, optional): If True, build the reference network by drainage component
+            in parallel worker processes. Default is False.
+        workers (int, optional): Number of worker processes of the partitioned build.
+            Default is None, the number of cores.
+        layers (dict, optional): Files and layers names replacing the LAYERS ones. Default is None.
+        report (str, optional): Name of the run report saved in the outputs folder (report.json and report.csv):
+            wall time, CPU time, peak RSS increase and feature counts of each stage and processing.run call.
+            None to not save it. Default is 'run_report'.
+        cprofile (bool, optional): If True, dump the cProfile stats of each stage in outputs/profiles. Default is False.
+
+    Returns:
+        dict: The 'troncon' and 'segment' reference hydrographique layers.
+
+    Raises:
+        IOError: If an error occurs while executing any of the stages.
+
+    Example:
+        from bdtopo2refhydro.pipeline import build
+        build('/path/to/workdir/', partitioned=True)
+    """
+    init_qgis()
+    from . import stages
+
+    names = dict(LAYERS, **(layers or dict()))
+    inputs = os.path.join(workdir, inputs_folder)
+    outputs = os.path.join(workdir, outputs_folder)
+    os.makedirs(outputs, exist_ok=True)
+
+    corr_path = os.path.join(inputs, names['corr_reseau_hydrographique_gpkg'])
+    creation_exutoire_path = os.path.join(inputs, names['creation_exutoire_gpkg'])
+    cours_d_eau_corr_path = os.path.join(outputs, names['troncon_hydrographique_cours_d_eau_corr_gpkg'])
+    exutoire_path = os.path.join(outputs, names['exutoire_gpkg'])
+    reference_path = os.path.join(outputs, names['reference_hydrographique_gpkg'])
+
+    corrections = [(corr_path, names[key]) for key in ('troncon_hydrographique_corr_connection_and_dir_ecoulement',
+                                                       'troncon_hydrographique_corr_connection',
+                                                       'troncon_hydrographique_corr_dir_ecoulement',
+                                                       'troncon_hydrographique_corr_geom',
+                                                       'troncon_hydrographique_corr_suppr_canal_multichenal')]
+    exutoire_inputs = [(creation_exutoire_path, names[key]) for key in ('plan_d_eau_layername',
+                                                                        'frontiere_layername',
+                                                                        'limite_terre_mer_layername')]
+    cours_d_eau = (cours_d_eau_corr_path, names['troncon_hydrographique_cours_d_eau'])
+    cours_d_eau_corr = (cours_d_eau_corr_path, names['troncon_hydrographique_cours_d_eau_corr'])
+    cours_d_eau_corr_suppr_canal = (cours_d_eau_corr_path, names['troncon_hydrographique_cours_d_eau_corr_suppr_canal'])
+    erreurs_topologie = (cours_d_eau_corr_path, names['erreurs_topologie_layername'])
+    dir_ecoulement_candidats = (cours_d_eau_corr_path, names['troncon_hydrographique_corr_dir_ecoulement_candidats'])
+    exutoire_layers = [(exutoire_path, names['plan_d_eau_line_layername']),
+                       (exutoire_path, names['exutoire_layername'])]
+    exutoire_lines = (exutoire_path, names['exutoire_layername'])
+    reference_layers = [(reference_path, names['reference_hydrographique_troncon_layername']),
+                        (reference_path, names['reference_hydrographique_segment_layername'])]
+    if columnar is None:
+        columnar = has_pyarrow()
+    columnar_paths = None
+    if columnar:
+        columnar_paths = tuple(os.path.join(outputs, f"{layername}.arrow") for _, layername in reference_layers)
+    artifact_path = os.path.join(outputs, artifact) if artifact else None
+    reference_layers.append((reference_path, names['lacunes_connexion_layername']))
+    if snap_tolerance:
+        reference_layers.append((reference_path, names['noeuds_rapproches_layername']))
+
+    cache = StageCache(outputs)
+    profiler = RunProfiler(os.path.join(outputs, 'profiles') if cprofile else None)
+
+    def run_stage(stage, function, stage_inputs, stage_outputs, params=None):
+        """
+        Run a stage, unless it is fresh in the cache. Returns the stage result, None if skipped.
+        """
+        print(stage)
+        with profiler.stage(stage, stage_inputs, stage_outputs) as record:
+            if use_cache and cache.is_fresh(stage, stage_inputs, stage_outputs, params):
+                print(f"{stage} skipped, inputs unchanged")
+                record['skipped'] = True
+                return None
+
+            input_digests = cache.digests(stage_inputs)
+            try:
+                result = function()
+            except Exception as e:
+                cache.invalidate(stage)
+                raise IOError(f"Error executing {stage}: {e}") from e
+            cache.record(stage, input_digests, stage_outputs, params)
+            return result
+
+    try:
+        with profiler.instrument_processing():
+            # the corrections are always applied to the uncorrected troncons, copied aside before the first run
+            if not stages.layer_exists(*cours_d_eau):
+                if 'fix_corrections' in cache.manifest:
+                    raise IOError(f"{cours_d_eau_corr[1]} was corrected by a previous run, copy the uncorrected "
+                                  f"troncons to the {cours_d_eau[1]} layer of {cours_d_eau_corr_path}")
+                stages.copy_layer(cours_d_eau_corr_path, cours_d_eau_corr[1], cours_d_eau[1])
+
+            # fix_corrections : fix_connection_and_direction, fix_connection, fix_direction, fix_modified_geom,
+            # fix_suppr_canal_multichenal, from the uncorrected troncons to cours_d_eau_corr
+            run_stage('fix_corrections',
+                      lambda: stages.fix_corrections(corr_path, stages.load_layer(*cours_d_eau),
+                                                     *(layername for _, layername in corrections),
+                                                     output_gpkg_path=cours_d_eau_corr_path,
+                                                     output_layername=cours_d_eau_corr[1]),
+                      corrections + [cours_d_eau], [cours_d_eau_corr])
+
+            # create_exutoire to selected connected reaches to upstream
+            exutoire = run_stage('create_exutoire',
+                                 lambda: stages.create_exutoire(
+                                     *(stages.load_layer(*layer) for layer in exutoire_inputs),
+                                     exutoire_path,
+                                     names['plan_d_eau_line_layername'],
+                                     names['exutoire_layername'],
+                                     crs=crs),
+                                 exutoire_inputs, exutoire_layers, {'crs': crs})
+            exutoire_layer = exutoire['exutoire'] if exutoire else stages.load_layer(*exutoire_lines)
+
+            # fix_suppr_canal
+            suppr_canal_layer = run_stage('fix_suppr_canal_auto',
+                                          lambda: stages.fix_suppr_canal_auto(
+                                              stages.load_layer(*cours_d_eau_corr),
+                                              exutoire_layer,
+                                              *cours_d_eau_corr_suppr_canal,
+                                              buffer_distance=buffer_distance,
+                                              quantization=quantization,
+                                              snap_tolerance=snap_tolerance,
+                                              errors_layername=erreurs_topologie[1]),
+                                          [cours_d_eau_corr, exutoire_lines],
+                                          [cours_d_eau_corr_suppr_canal, erreurs_topologie],
+                                          {'buffer_distance': buffer_distance, 'quantization': quantization,
+                                           'snap_tolerance': snap_tolerance})
+            if suppr_canal_layer is None:
+                suppr_canal_layer = stages.load_layer(*cours_d_eau_corr_suppr_canal)
+
+            # propose_direction_corrections, the troncons to reverse for the next correction batch
+            run_stage('propose_direction_corrections',
+                      lambda: stages.propose_direction_corrections(stages.load_layer(*cours_d_eau_corr),
+                                                                   exutoire_layer,
+                                                                   *dir_ecoulement_candidats,
+                                                                   buffer_distance=buffer_distance,
+                                                                   quantization=quantization,
+                                                                   snap_tolerance=snap_tolerance),
+                      [cours_d_eau_corr, exutoire_lines], [dir_ecoulement_candidats],
+                      {'buffer_distance': buffer_distance, 'quantization': quantization,
+                       'snap_tolerance': snap_tolerance})
+
+            # create_connected_reference_hydro to create the final reference fixed hydrographic network
+            # with connected reaches
+            if (columnar and not all(os.path.exists(path) for path in columnar_paths)) or \
+                    (artifact_path and not os.path.exists(os.path.join(artifact_path, META_NAME))):
+                # the Arrow files and the graph artifact are not tracked by the cache
+                cache.invalidate('create_connected_reference_hydro')
+            reference = run_stage('create_connected_reference_hydro',
+                                  lambda: stages.create_connected_reference_hydro(
+                                      suppr_canal_layer, exutoire_layer,
+                                      reference_path,
+                                      names['reference_hydrographique_troncon_layername'],
+                                      names['reference_hydrographique_segment_layername'],
+                                      buffer_distance=buffer_distance,
+                                      quantization=quantization,
+                                      partitioned=partitioned, workers=workers,
+                                      snap_tolerance=snap_tolerance,
+                                      snapped_layername=names['noeuds_rapproches_layername'],
+                                      columnar_paths=columnar_paths,
+                                      artifact_path=artifact_path,
+                                      gaps_layername=names['lacunes_connexion_layername']),
+                                  [cours_d_eau_corr_suppr_canal, exutoire_lines], reference_layers,
+                                  {'buffer_distance': buffer_distance, 'quantization': quantization,
+                                   'snap_tolerance': snap_tolerance, 'columnar': columnar, 'artifact': artifact})
+            if reference is None:
+                reference = tuple(stages.load_layer(*layer) for layer in reference_layers[:2])
+    finally:
+        # saved even if a stage failed
+        if report is not None:
+            profiler.save(os.path.join(outputs, report))
+
+    print("Reference hydrographique successfully created")
+    return {'troncon': reference[0], 'segment': reference[1]}
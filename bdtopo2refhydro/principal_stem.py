@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import csr, dijkstra, node_count
+
+
+def principal_stem(nodea, nodeb, cost):
+    """
+    Native replacement of fct:principalstem. Remove the multiple channels of the network by keeping,
+    from each source, only the shortest route to the outlet.
+
+    The shortest routes are computed at once with a Dijkstra search walking upstream from all the outlets
+    (nodes without downstream edge). Every node then has one downstream edge on its shortest route,
+    the kept edges are the ones met walking downstream from the sources (nodes without upstream edge).
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        cost (numpy.ndarray): (E,) cost of each edge, ie. the troncon length.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the principal stem edges.
+
+    Example:
+        stem = principal_stem(nodea, nodeb, length)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    out_degree = np.bincount(nodea, minlength=size)
+    in_degree = np.bincount(nodeb, minlength=size)
+    used = (out_degree + in_degree) > 0
+
+    outlets = np.flatnonzero(used & (out_degree == 0))
+    sources = np.flatnonzero(used & (in_degree == 0))
+
+    # walking upstream, an edge is walked from its NODEB to its NODEA
+    indptr, edges = csr(nodeb, size)
+    _, downstream_edge = dijkstra(indptr, edges, nodea, cost, outlets)
+
+    kept = np.zeros(len(nodea), dtype=bool)
+    kept_list = kept.tolist()
+    downstream_list = downstream_edge.tolist()
+    nodeb_list = nodeb.tolist()
+
+    for source in sources.tolist():
+        edge = downstream_list[source]
+        # stop at the outlet or when joining a route already kept
+        while edge != -1 and not kept_list[edge]:
+            kept_list[edge] = True
+            edge = downstream_list[nodeb_list[edge]]
+
+    kept[:] = kept_list
+
+    return np.flatnonzero(kept)
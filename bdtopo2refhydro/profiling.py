@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import cProfile
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+
+def peak_rss() -> float:
+    """
+    Peak resident set size of the current process since it started (not reset between stages), in MB.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macos
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return float('nan')
+    return counters.PeakWorkingSetSize / 1024 ** 2
+
+
+def cpu_time() -> float:
+    """
+    CPU time (user and system) of the current process and of its terminated worker processes, in seconds.
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def layer_feature_count(gpkg_path: str, layername: str):
+    """
+    Number of features of a GeoPackage layer read with sqlite3, None if the file or the layer does not exist.
+    """
+    if not os.path.exists(gpkg_path):
+        return None
+
+    connection = sqlite3.connect(Path(gpkg_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        table = layername.replace('"', '""')
+        return connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        connection.close()
+
+
+def _feature_count(value):
+    """
+    Number of features of a processing parameter or result value if it is a vector layer, else None.
+    """
+    count = getattr(value, 'featureCount', None)
+    if callable(count):
+        return count()
+    return None
+
+
+class RunProfiler:
+    """
+    Record wall time, CPU time, memory and input/output feature counts of each stage of a run
+    and of each processing.run call, and save them as a JSON and CSV run report.
+
+    The peak RSS of a process is never reset, so each record has the process peak at its end (process_peak_rss_mb)
+    and how much the stage raised it (peak_rss_increase_mb, 0 if the stage stayed below an earlier peak).
+
+    Parameters:
+        cprofile_dir (str, optional): If given, each stage is also profiled with cProfile and
+            the stats are dumped to cprofile_dir/<stage>.prof (open them with pstats or snakeviz). Default is None.
+
+    Example:
+        profiler = RunProfiler()
+        with profiler.instrument_processing():
+            with profiler.stage('create_exutoire', inputs=[(gpkg_path, layername)]) as record:
+                ...
+        profiler.save('outputs/run_report')
+    """
+
+    def __init__(self, cprofile_dir: str = None):
+        self.cprofile_dir = cprofile_dir
+        self.stages = []
+        self.calls = []
+        self._current = None
+
+    @contextmanager
+    def stage(self, name: str, inputs=(), outputs=()):
+        """
+        Measure a stage. The (gpkg_path, layername) inputs are counted before the stage and the outputs after it.
+        The yielded record dict can be completed by the stage (ie. record['skipped'] = True).
+        """
+        record = {'stage': name,
+                  'input_features': sum(filter(None, (layer_feature_count(*layer) for layer in inputs)))}
+        profile = cProfile.Profile() if self.cprofile_dir else None
+
+        previous, self._current = self._current, name
+        wall, cpu, rss = time.perf_counter(), cpu_time(), peak_rss()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.cprofile_dir, f"{name}.prof"))
+            record['wall_time'] = time.perf_counter() - wall
+            record['cpu_time'] = cpu_time() - cpu
+            record['process_peak_rss_mb'] = peak_rss()
+            record['peak_rss_increase_mb'] = record['process_peak_rss_mb'] - rss
+            record['output_features'] = sum(filter(None, (layer_feature_count(*layer) for layer in outputs)))
+            self._current = previous
+            self.stages.append(record)
+            print(f"{name} : {record['wall_time']:.1f} s wall, {record['cpu_time']:.1f} s cpu, "
+                  f"+{record['peak_rss_increase_mb']:.0f} MB peak RSS ({record['process_peak_rss_mb']:.0f} MB process peak)")
+
+    @contextmanager
+    def instrument_processing(self):
+        """
+        Wrap processing.run to record each algorithm call, restored on exit.
+        """
+        import processing
+
+        run = processing.run
+
+        def profiled_run(algorithm, parameters, *args, **kwargs):
+            call = {'stage': self._current,
+                    'algorithm': algorithm if isinstance(algorithm, str) else algorithm.id(),
+                    'input_features': _feature_count(parameters.get('INPUT'))}
+            wall, cpu, rss = time.perf_counter(), cpu_time(), peak_rss()
+            try:
+                result = run(algorithm, parameters, *args, **kwargs)
+            finally:
+                call['wall_time'] = time.perf_counter() - wall
+                call['cpu_time'] = cpu_time() - cpu
+                call['process_peak_rss_mb'] = peak_rss()
+                call['peak_rss_increase_mb'] = call['process_peak_rss_mb'] - rss
+                self.calls.append(call)
+            call['output_features'] = _feature_count(result.get('OUTPUT'))
+            return result
+
+        processing.run = profiled_run
+        try:
+            yield self
+        finally:
+            processing.run = run
+
+    def report(self) -> dict:
+        """
+        The run report: platform, stages and processing calls records.
+        """
+        return {'python': sys.version.split()[0], 'platform': sys.platform, 'cpu_count': os.cpu_count(),
+                'stages': self.stages, 'processing_calls': self.calls}
+
+    def save(self, path: str) -> None:
+        """
+        Save the run report to path.json and path.csv (one row by stage and by processing call).
+        """
+        with open(f"{path}.json", 'w', encoding='utf-8') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+        columns = ['kind', 'stage', 'algorithm', 'wall_time', 'cpu_time', 'process_peak_rss_mb', 'peak_rss_increase_mb',
+                   'input_features', 'output_features', 'skipped']
+        with open(f"{path}.csv", 'w', encoding='utf-8', newline='') as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for record in self.stages:
+                writer.writerow(dict(record, kind='stage'))
+            for record in self.calls:
+                writer.writerow(dict(record, kind='processing'))
+
+        print(f"Run report saved : {path}.json, {path}.csv")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import node_count
+
+
+def _chain_heads(previous):
+    """
+    Pointer jumping on the previous edge array.
+
+    Returns:
+        tuple: (head, position) the first edge of the chain of each edge and its position in the chain.
+            Edges in a closed chain (cycle) do not converge and keep previous[head] != -1.
+    """
+    head = np.where(previous == -1, np.arange(len(previous), dtype=np.int64), previous)
+    position = (previous != -1).astype(np.int64)
+
+    for _ in range(max(1, int(np.ceil(np.log2(max(len(previous), 2)))) + 1)):
+        next_head = head[head]
+        if np.array_equal(next_head, head):
+            break
+        position = position + position[head]
+        head = next_head
+
+    return head, position
+
+
+def aggregate_segments(nodea, nodeb, category=None):
+    """
+    Native replacement of fct:aggregatestreamsegments. Contract the chains of edges between confluences
+    or diffluences (nodes with exactly one upstream and one downstream edge are removed) in one pass.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        category (numpy.ndarray, optional): (E,) category of each edge, chains are also split
+            where the category changes. Default is None.
+
+    Returns:
+        tuple: (segment, position) (E,) arrays, the segment id of each edge (segments are numbered
+            in the order of their most upstream edge) and the edge position in its segment from upstream.
+
+    Example:
+        segment, position = aggregate_segments(nodea, nodeb)
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    edges = np.arange(len(nodea), dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    in_degree = np.bincount(nodeb, minlength=size)
+    out_degree = np.bincount(nodea, minlength=size)
+
+    # for nodes with exactly one upstream edge, the upstream edge id
+    upstream_edge = np.full(size, -1, dtype=np.int64)
+    upstream_edge[nodeb] = edges
+
+    # an edge continues the chain of its upstream edge through a pass-through node
+    previous = np.where((in_degree[nodea] == 1) & (out_degree[nodea] == 1), upstream_edge[nodea], -1)
+    if category is not None:
+        category = np.asarray(category)
+        chained = previous != -1
+        chained[chained] = category[previous[chained]] == category[chained]
+        previous = np.where(chained, previous, -1)
+
+    head, position = _chain_heads(previous)
+
+    # closed chains (isolated loops) have no head, open them at their lowest edge id
+    in_cycle = previous[head] != -1
+    if in_cycle.any():
+        next_edge = np.full(len(nodea), -1, dtype=np.int64)
+        next_edge[previous[previous != -1]] = edges[previous != -1]
+        visited = np.zeros(len(nodea), dtype=bool)
+        for edge in np.flatnonzero(in_cycle).tolist():
+            if visited[edge]:
+                continue
+            cycle = [edge]
+            visited[edge] = True
+            while not visited[next_edge[cycle[-1]]]:
+                cycle.append(next_edge[cycle[-1]])
+                visited[cycle[-1]] = True
+            previous[min(cycle)] = -1
+        head, position = _chain_heads(previous)
+
+    heads = np.flatnonzero(previous == -1)
+    segment_of_head = np.empty(len(nodea), dtype=np.int64)
+    segment_of_head[heads] = np.arange(len(heads), dtype=np.int64)
+
+    return segment_of_head[head], position
+
+
+def merge_lines(coordinates, offsets, segment, position):
+    """
+    Concatenate the line coordinates of each segment, dropping the vertex shared by consecutive edges.
+
+    Parameters:
+        coordinates (numpy.ndarray): (M, D) vertex coordinates of all the edges.
+        offsets (numpy.ndarray): (E + 1,) the vertices of edge e are coordinates[offsets[e]:offsets[e + 1]].
+        segment (numpy.ndarray): (E,) segment id of each edge, from aggregate_segments.
+        position (numpy.ndarray): (E,) edge position in its segment, from aggregate_segments.
+
+    Returns:
+        tuple: (order, segment_coordinates, segment_offsets) the edges sorted by segment and position,
+            the vertex coordinates and the offsets of each segment.
+    """
+    order = np.lexsort((position, segment))
+
+    starts = offsets[order]
+    counts = offsets[order + 1] - starts
+    # the first vertex of a downstream edge is the last one of its upstream edge
+    skip = (position[order] > 0).astype(np.int64)
+    starts = starts + skip
+    counts = counts - skip
+
+    total = int(counts.sum())
+    rows = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total, dtype=np.int64)
+
+    segment_count = int(segment.max()) + 1 if len(segment) else 0
+    segment_offsets = np.zeros(segment_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(segment[order], weights=counts, minlength=segment_count).astype(np.int64),
+              out=segment_offsets[1:])
+
+    return order, coordinates[rows], segment_offsets
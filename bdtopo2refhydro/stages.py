@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+
+import numpy as np
+import processing
+from qgis.core import QgsVectorLayer, QgsCoordinateReferenceSystem, QgsFeatureRequest, edit
+
+from .artifact import write_table_artifact
+from .corrections import apply_corrections
+from .graph import connected_edges, fix_network_connectivity, UPDOWNSTREAM
+from .layers import (aggregate_stream_segments, compute_nested_intervals, compute_upstream_accumulation,
+                     connection_gaps, duplicate_features, export_columnar, export_graph_artifact, flow_direction_candidates,
+                     identify_network_nodes, outlet_features, read_attributes, read_lengths, snap_network_nodes,
+                     subset_layer, topology_errors)
+from .partition import partitioned_build
+from .principal_stem import principal_stem
+from .writer import saving_gpkg
+
+# fields computed on the reference troncons and segments
+NETWORK_FIELDS = ['DFS_ENTRY', 'DFS_EXIT', 'CUMLENGTH', 'UPCOUNT', 'UPLENGTH']
+
+# natures of the troncons removed by fix_suppr_canal_auto
+CANAL_NATURES = ('Canal', 'Conduit forcé', 'Conduit buse', 'Ecoulement canalisé')
+
+
+def load_layer(gpkg_path: str, layername: str) -> QgsVectorLayer:
+    """
+    Load a GeoPackage layer.
+
+    Parameters:
+        gpkg_path (str): The path of the GeoPackage.
+        layername (str): The name of the layer in the GeoPackage.
+
+    Returns:
+        QgsVectorLayer: The layer.
+
+    Raises:
+        IOError: If the layer fails to load correctly.
+    """
+    layer = QgsVectorLayer(f"{gpkg_path}|layername={layername}", layername, 'ogr')
+    if not layer.isValid():
+        raise IOError(f"{layer} n'a pas été chargée correctement")
+
+    return layer
+
+
+def layer_exists(gpkg_path: str, layername: str) -> bool:
+    """
+    Check if a GeoPackage layer exists and loads.
+    """
+    if not os.path.exists(gpkg_path):
+        return False
+
+    return QgsVectorLayer(f"{gpkg_path}|layername={layername}", layername, 'ogr').isValid()
+
+
+def copy_layer(gpkg_path: str, layername: str, copy_layername: str) -> None:
+    """
+    Copy a GeoPackage layer to another layer of the same GeoPackage, replaced if it exists.
+    """
+    saving_gpkg(load_layer(gpkg_path, layername), copy_layername, gpkg_path, save_selected=False)
+
+
+def not_canal(natures) -> np.ndarray:
+    """
+    Mask of the troncons which are not canals or ilike, NULL natures are dropped (as with the former NOT LIKE expression).
+    """
+    return np.array([isinstance(nature, str) and nature not in CANAL_NATURES for nature in natures], dtype=bool)
+
+
+def delete_fields(layer: QgsVectorLayer, names: list) -> None:
+    """
+    Delete the fields of a layer, the missing ones are ignored.
+    """
+    indexes = [layer.fields().indexFromName(name) for name in names]
+    with edit(layer):
+        layer.dataProvider().deleteAttributes([index for index in indexes if index != -1])
+        layer.updateFields()
+
+
+def fix_corrections(corr_gpkg_path: str, cible: QgsVectorLayer, connection_and_direction: str, connection: str,
+                    direction: str, geometry: str, suppression: str, output_gpkg_path: str = None,
+                    output_layername: str = None) -> dict:
+    """
+    Fix connection, direction, modified geometries and remove canals and multichenals on the cible layer
+    from all the correction layers, in one edit transaction.
+
+    The corrections are not idempotent (a reversal applied twice flips back), so they must be applied to the
+    uncorrected troncons. With an output layer, the cible is left unchanged: the corrections are applied
+    to a memory copy, saved to the output layer, and the stage can be run again from the same cible.
+
+    Parameters:
+        corr_gpkg_path (str): The path of the corrections GeoPackage.
+        cible (QgsVectorLayer): The target layer, edited in place if no output layer is given.
+        connection_and_direction (str): The name of the connection and direction correction layer.
+        connection (str): The name of the connection correction layer.
+        direction (str): The name of the direction correction layer.
+        geometry (str): The name of the modified geometry correction layer.
+        suppression (str): The name of the canal and multichenal suppression correction layer.
+        output_gpkg_path (str, optional): The GeoPackage of the corrected layer.
+            Default is None, cible edited in place.
+        output_layername (str, optional): The name of the corrected layer, replaced. Default is None.
+
+    Returns:
+        dict: Number of 'added', 'reversed', 'modified' and 'deleted' troncons.
+    """
+    if output_gpkg_path is not None:
+        cible = cible.materialize(QgsFeatureRequest())
+
+    counts = apply_corrections(corr_gpkg_path, cible,
+                               connection_and_direction=connection_and_direction,
+                               connection=connection,
+                               direction=direction,
+                               geometry=geometry,
+                               suppression=suppression)
+    print(f"{counts['added']} lines added, {counts['reversed']} lines direction inversed, "
+          f"{counts['modified']} lines modified, {counts['deleted']} lines deleted")
+
+    print('features fixed : connection, direction, modified geom, suppr canal and multichenal')
+
+    if output_gpkg_path is not None:
+        saving_gpkg(cible, output_layername, output_gpkg_path, save_selected=False)
+
+    return counts
+
+
+def create_exutoire(plan_d_eau: QgsVectorLayer, frontiere: QgsVectorLayer, limite_terre_mer: QgsVectorLayer,
+                    exutoire_gpkg_path: str, plan_d_eau_line_layername: str, exutoire_layername: str,
+                    exutoire_buffer_layername: str = None, buffer_distance: float = 50, crs: str = 'EPSG:2154') -> dict:
+    """
+    Create the plan_d_eau_line, the exutoire reference layer and optionally the exutoire reference with buffer
+    and save them to a GeoPackage. The outlets are matched on the exutoire lines by distance (outlets module),
+    the buffer layer is only needed for display or by the former scripts.
+
+    Parameters:
+        plan_d_eau (QgsVectorLayer): The 'plan_d_eau' polygon layer.
+        frontiere (QgsVectorLayer): The 'frontiere' line layer.
+        limite_terre_mer (QgsVectorLayer): The 'limite_terre_mer' line layer.
+        exutoire_gpkg_path (str): The output GeoPackage path.
+        plan_d_eau_line_layername (str): The name of the converted 'plan_d_eau' line layer.
+        exutoire_layername (str): The name of the 'exutoire' layer.
+        exutoire_buffer_layername (str, optional): The name of the 'exutoire' with buffer layer,
+            None to not create it. Default is None.
+        buffer_distance (float, optional): The distance for buffering the 'exutoire' layer. Default is 50.
+        crs (str, optional): The Coordinate Reference System (CRS) of the output layers. Default is 'EPSG:2154'.
+
+    Returns:
+        dict: The 'plan_d_eau_line', 'exutoire' and 'exutoire_buffer' (None if not created) layers.
+    """
+    # fix geometries plan_d_eau
+    plan_d_eau_fix = processing.run('native:fixgeometries',
+                                    {'INPUT' : plan_d_eau,
+                                     'OUTPUT' : 'TEMPORARY_OUTPUT'})['OUTPUT']
+
+    # plan_d_eau to line
+    plan_d_eau_line = processing.run('native:polygonstolines',
+                                     {'INPUT' : plan_d_eau_fix,
+                                      'OUTPUT' : 'TEMPORARY_OUTPUT'})['OUTPUT']
+
+    # save plan_d_eau_line
+    saving_gpkg(plan_d_eau_line, plan_d_eau_line_layername, exutoire_gpkg_path, save_selected=False)
+
+    # merge all three layers
+    exutoire_no_fix = processing.run('native:mergevectorlayers',
+                                     {'CRS' : QgsCoordinateReferenceSystem(crs),
+                                      'LAYERS' : [limite_terre_mer.source(),
+                                                  f"{exutoire_gpkg_path}|layername={plan_d_eau_line_layername}",
+                                                  frontiere.source()],
+                                      'OUTPUT' : 'TEMPORARY_OUTPUT'})['OUTPUT']
+
+    # reset fid field
+    with edit(exutoire_no_fix):
+        for f in exutoire_no_fix.getFeatures():
+            f['fid'] = f.id()
+            exutoire_no_fix.updateFeature(f)
+
+    # fix geometries exutoire_no_fix
+    exutoire = processing.run('native:fixgeometries',
+                              {'INPUT' : exutoire_no_fix,
+                               'OUTPUT' : 'TEMPORARY_OUTPUT'})['OUTPUT']
+
+    # save exutoire
+    saving_gpkg(exutoire, exutoire_layername, exutoire_gpkg_path, save_selected=False)
+
+    if exutoire_buffer_layername is None:
+        print('exutoire created')
+        return {'plan_d_eau_line': plan_d_eau_line, 'exutoire': exutoire, 'exutoire_buffer': None}
+
+    # buffer on exutoire
+    exutoire_buffer = processing.run('native:buffer',
+                                     {'DISSOLVE' : False,
+                                      'DISTANCE' : buffer_distance,
+                                      'END_CAP_STYLE' : 0,
+                                      'INPUT' : exutoire,
+                                      'JOIN_STYLE' : 0,
+                                      'MITER_LIMIT' : 2,
+                                      'OUTPUT' : 'TEMPORARY_OUTPUT',
+                                      'SEGMENTS' : 5})['OUTPUT']
+
+    # fix geometries exutoire_buffer
+    exutoire_buffer_fix = processing.run('native:fixgeometries',
+                                         {'INPUT' : exutoire_buffer,
+                                          'OUTPUT' : 'TEMPORARY_OUTPUT'})['OUTPUT']
+
+    # save exutoire_buffer
+    saving_gpkg(exutoire_buffer_fix, exutoire_buffer_layername, exutoire_gpkg_path, save_selected=False)
+
+    print('exutoire created')
+    return {'plan_d_eau_line': plan_d_eau_line, 'exutoire': exutoire, 'exutoire_buffer': exutoire_buffer_fix}
+
+
+def fix_suppr_canal_auto(troncon_corr_layer: QgsVectorLayer, exutoire_layer: QgsVectorLayer,
+                         output_gpkg_path: str, output_layername: str, buffer_distance: float = 50,
+                         quantization: float = 100000000, snap_tolerance: float = None,
+                         errors_layername: str = 'erreurs_topologie') -> QgsVectorLayer:
+    """
+    Remove the canals of the corrected network, keeping the canals needed to connect the network to its outlets,
+    and save the result to a GeoPackage. The topology of the corrected network is checked first, the reaches with
+    errors (cycles, dead ends, sources not reaching an outlet, direction conflicts and orphans) are saved
+    in an error layer.
+
+    Parameters:
+        troncon_corr_layer (QgsVectorLayer): The corrected troncon layer.
+        exutoire_layer (QgsVectorLayer): The exutoire line layer.
+        output_gpkg_path (str): The output GeoPackage path.
+        output_layername (str): The output layer name.
+        buffer_distance (float, optional): The outlet distance to the exutoire lines. Default is 50.
+        quantization (float, optional): Quantization factor used to match the endpoints. Default is 100000000.
+        snap_tolerance (float, optional): Distance below which the network nodes are merged, None to not snap. Default is None.
+        errors_layername (str, optional): The topology error layer name, saved in the output GeoPackage.
+            None to not check the topology. Default is 'erreurs_topologie'.
+
+    Returns:
+        QgsVectorLayer: The network without canals.
+    """
+    # Identify Network Nodes
+    print('IdentifyNetworkNodes processing')
+    IdentifyNetworkNodes = identify_network_nodes(troncon_corr_layer, quantization=quantization)
+    if snap_tolerance:
+        snap_network_nodes(IdentifyNetworkNodes, snap_tolerance)
+
+    # network arrays
+    fids, nodes = read_attributes(IdentifyNetworkNodes, ['NODEA', 'NODEB'])
+    _, natures = read_attributes(IdentifyNetworkNodes, ['nature'], dtype=object)
+
+    # outlet, the reaches within buffer_distance of the exutoire lines
+    print('extract outlet')
+    outlet = np.isin(fids, outlet_features(IdentifyNetworkNodes, exutoire_layer, buffer_distance))
+
+    if errors_layername is not None:
+        # topology of the corrected network, to check the next correction batch
+        print('Check network topology')
+        errors = topology_errors(IdentifyNetworkNodes, fids[outlet])
+        saving_gpkg(errors, errors_layername, output_gpkg_path, save_selected=False)
+
+    # network without canals or ilike
+    print('extract network without canals')
+    nocanal = not_canal(natures['nature'])
+
+    print('Fix network connection')
+    fixed = fix_network_connectivity(nodes['NODEA'], nodes['NODEB'], nocanal | outlet)
+    print(f"Connecting canal reaches restored : {int((fixed & ~(nocanal | outlet)).sum())}")
+
+    networkConnectFixed = subset_layer(IdentifyNetworkNodes, fids[fixed])
+
+    # remove working fields
+    delete_fields(networkConnectFixed, ['fid', 'NODEA', 'NODEB'])
+
+    saving_gpkg(networkConnectFixed, output_layername, output_gpkg_path, save_selected=False)
+
+    print('features fixed : suppr canal features')
+    return networkConnectFixed
+
+
+def propose_direction_corrections(troncon_corr_layer: QgsVectorLayer, exutoire_layer: QgsVectorLayer,
+                                  output_gpkg_path: str, output_layername: str, buffer_distance: float = 50,
+                                  quantization: float = 100000000, snap_tolerance: float = None) -> QgsVectorLayer:
+    """
+    Propose the troncons to reverse: the corrected network is oriented from its outlets and compared with
+    the digitised direction and sens_de_l_ecoulement of each troncon. The candidates are saved to a GeoPackage
+    with the fields of the corrected troncons, the schema of troncon_hydrographique_corr_dir_ecoulement,
+    to be checked before being copied in the corrections.
+
+    Parameters:
+        troncon_corr_layer (QgsVectorLayer): The corrected troncon layer.
+        exutoire_layer (QgsVectorLayer): The exutoire line layer.
+        output_gpkg_path (str): The output GeoPackage path.
+        output_layername (str): The candidate reversals layer name.
+        buffer_distance (float, optional): The outlet distance to the exutoire lines. Default is 50.
+        quantization (float, optional): Quantization factor used to match the endpoints. Default is 100000000.
+        snap_tolerance (float, optional): Distance below which the network nodes are merged, None to not snap. Default is None.
+
+    Returns:
+        QgsVectorLayer: The candidate reversals.
+    """
+    # Identify Network Nodes
+    print('IdentifyNetworkNodes processing')
+    IdentifyNetworkNodes = identify_network_nodes(troncon_corr_layer, quantization=quantization)
+    if snap_tolerance:
+        snap_network_nodes(IdentifyNetworkNodes, snap_tolerance)
+
+    fids, natures = read_attributes(IdentifyNetworkNodes, ['nature'], dtype=object)
+    outlet_fids = outlet_features(IdentifyNetworkNodes, exutoire_layer, buffer_distance)
+
+    # the canals are not walked, they would link the neighbouring basins
+    print('Infer flow directions from the outlets')
+    candidate_fids, _ = flow_direction_candidates(IdentifyNetworkNodes, exutoire_layer, outlet_fids,
+                                                  subset_fids=fids[not_canal(natures['nature'])])
+
+    candidates = subset_layer(IdentifyNetworkNodes, candidate_fids)
+
+    # remove working fields
+    delete_fields(candidates, ['fid', 'NODEA', 'NODEB'])
+
+    saving_gpkg(candidates, output_layername, output_gpkg_path, save_selected=False)
+
+    print(f"direction candidates : {len(candidate_fids)} troncons to check")
+    return candidates
+
+
+def create_connected_reference_hydro(cours_d_eau_corr_layer: QgsVectorLayer, exutoire_layer: QgsVectorLayer,
+                                     reference_hydrographique_gpkg_path: str, troncon_layername: str,
+                                     segment_layername: str, buffer_distance: float = 50, quantization: float = 100000000,
+                                     partitioned: bool = False, workers: int = None, snap_tolerance: float = None,
+                                     snapped_layername: str = 'noeuds_rapproches', columnar_paths: tuple = None,
+                                     artifact_path: str = None, gaps_layername: str = 'lacunes_connexion',
+                                     gap_distance: float = 1000) -> tuple:
+    """
+    Create the connected reference hydrographic network, selected by moving upstream from the outlets,
+    by troncon and by segment (troncon aggregation to each network intersection), and save them to a GeoPackage.
+
+    Parameters:
+        cours_d_eau_corr_layer (QgsVectorLayer): The corrected network without canals.
+        exutoire_layer (QgsVectorLayer): The exutoire line layer.
+        reference_hydrographique_gpkg_path (str): The output GeoPackage path.
+        troncon_layername (str): The reference hydrographique by troncon layer name.
+        segment_layername (str): The reference hydrographique by segment layer name.
+        buffer_distance (float, optional): The outlet distance to the exutoire lines. Default is 50.
+        quantization (float, optional): Quantization factor used to match the endpoints. Default is 100000000.
+        partitioned (bool, optional): If True, the network is split in independent drainage components (by outlet)
+            built in parallel worker processes, same result as the whole network build. Default is False.
+        workers (int, optional): Number of worker processes of the partitioned build. Default is None, the number of cores.
+        snap_tolerance (float, optional): Distance below which the network nodes are merged, None to not snap. Default is None.
+        snapped_layername (str, optional): The layer name of the snapped node pairs, saved if snap_tolerance is set.
+            Default is 'noeuds_rapproches'.
+        columnar_paths (tuple, optional): (troncon, segment) Arrow IPC file paths, the layers with their NODEA and NODEB
+            are also written there (see columnar), the graph artifact is then built from the troncon file.
+            None to not write them. Default is None.
+        artifact_path (str, optional): The folder of the memory mappable graph artifact of the troncons
+            (see artifact), None to not write it. Default is None.
+        gaps_layername (str, optional): The layer name of the gaps of the troncons not connected to an outlet
+            (dropped from the reference network), None to not search them. Default is 'lacunes_connexion'.
+        gap_distance (float, optional): The search distance of the gaps. Default is 1000.
+
+    Returns:
+        tuple: (troncon, segment) the reference hydrographique layers.
+    """
+    # duplicate geometry (if manual error in corr_reseau_hydrographique), removed when copying the network
+    print('Remove duplicate geometry')
+    corr_fids, keep, duplicate = duplicate_features(cours_d_eau_corr_layer)
+    print(f"Duplicate geometry found : {duplicate['duplicates']}")
+
+    # Identify Network Nodes
+    print('IdentifyNetworkNodes processing')
+    IdentifyNetworkNodes = identify_network_nodes(cours_d_eau_corr_layer, quantization=quantization, fids=corr_fids[keep])
+    if snap_tolerance:
+        # small gaps between endpoints absorbed, the snapped pairs are saved for checking
+        snapped = snap_network_nodes(IdentifyNetworkNodes, snap_tolerance)
+        saving_gpkg(snapped, snapped_layername, reference_hydrographique_gpkg_path, save_selected=False)
+
+    # network arrays
+    fids, nodes = read_attributes(IdentifyNetworkNodes, ['NODEA', 'NODEB'])
+
+    # outlets (exutoire) reaches, within buffer_distance of the exutoire lines
+    outlets = np.flatnonzero(np.isin(fids, outlet_features(IdentifyNetworkNodes, exutoire_layer, buffer_distance)))
+    print(f"Outlet reaches found : {len(outlets)}")
+
+    if partitioned:
+        # Connected reaches, principal stem and segments built by independent drainage components in worker processes
+        _, lengths = read_lengths(IdentifyNetworkNodes)
+        stem, segment, position = partitioned_build(nodes['NODEA'], nodes['NODEB'], lengths, outlets, workers=workers)
+        print(f"Principal stem reaches : {len(stem)}")
+
+        PrincipalStem = subset_layer(IdentifyNetworkNodes, fids[stem])
+        aggregation = (fids[stem], segment, position)
+    else:
+        # Select Connected Reaches.
+        # Selection by moving upstream (and downstream for some features) to have connected reaches which flow downstream
+        connected = connected_edges(nodes['NODEA'], nodes['NODEB'], outlets, direction=UPDOWNSTREAM)
+        print(f"Connected reaches found : {len(connected)}")
+
+        connected_network = subset_layer(IdentifyNetworkNodes, fids[connected])
+
+        # Remove multiple channels (take the shortest route to the source)
+        connected_fids, lengths = read_lengths(connected_network)
+        _, connected_nodes = read_attributes(connected_network, ['NODEA', 'NODEB'])
+        stem = principal_stem(connected_nodes['NODEA'], connected_nodes['NODEB'], lengths)
+        print(f"Principal stem reaches : {len(stem)}")
+
+        PrincipalStem = subset_layer(connected_network, connected_fids[stem])
+        aggregation = None
+
+    if gaps_layername is not None:
+        # the disconnected troncons are dropped, their nearest connection is saved for the corrections
+        print('Find connection gaps')
+        if partitioned:
+            connected = connected_edges(nodes['NODEA'], nodes['NODEB'], outlets, direction=UPDOWNSTREAM)
+        gaps = connection_gaps(IdentifyNetworkNodes, exutoire_layer, fids[connected], max_distance=gap_distance)
+        saving_gpkg(gaps, gaps_layername, reference_hydrographique_gpkg_path, save_selected=False)
+
+    # upstream queries as integer range comparisons, and upstream totals
+    print('Compute nested intervals and upstream accumulation')
+    compute_nested_intervals(PrincipalStem)
+    compute_upstream_accumulation(PrincipalStem)
+
+    if columnar_paths is not None:
+        export_columnar(PrincipalStem, columnar_paths[0])
+    if artifact_path is not None:
+        print('Export graph artifact')
+        if columnar_paths is not None:
+            # memory mapped, only the node ids, fid and cleabs columns and the coordinates are read
+            write_table_artifact(artifact_path, columnar_paths[0],
+                                 meta={'layer': PrincipalStem.name(), 'crs': PrincipalStem.crs().authid()})
+        else:
+            export_graph_artifact(PrincipalStem, artifact_path)
+
+    # remove NODEA and NODEB fields
+    delete_fields(PrincipalStem, ['NODEA', 'NODEB'])
+
+    saving_gpkg(PrincipalStem, troncon_layername, reference_hydrographique_gpkg_path, save_selected=False)
+
+    if aggregation is None:
+        # Identify Network Nodes
+        print('New IdentifyNetworkNodes processing')
+        NewIdentifyNetworkNodes = identify_network_nodes(PrincipalStem, quantization=quantization)
+        if snap_tolerance:
+            snap_network_nodes(NewIdentifyNetworkNodes, snap_tolerance)
+    else:
+        # segments already computed by partition, on the network nodes
+        NewIdentifyNetworkNodes = IdentifyNetworkNodes
+
+    # Aggregate reaches to intersection
+    # copy all fields but NODEA and NODEB, and the troncon network fields (the segment ones are computed below)
+    field_names = [field.name() for field in NewIdentifyNetworkNodes.fields()
+                   if field.name() not in ['NODEA', 'NODEB'] + NETWORK_FIELDS]
+    print('Aggregate reaches to intersection')
+    AggregateSegment = aggregate_stream_segments(NewIdentifyNetworkNodes, field_names,
+                                                 from_node_field='NODEA', to_node_field='NODEB',
+                                                 segments=aggregation)
+
+    compute_nested_intervals(AggregateSegment)
+    compute_upstream_accumulation(AggregateSegment)
+
+    if columnar_paths is not None:
+        export_columnar(AggregateSegment, columnar_paths[1])
+
+    # remove working fields
+    delete_fields(AggregateSegment, ['GID', 'LENGTH', 'NODEA', 'NODEB'])
+
+    saving_gpkg(AggregateSegment, segment_layername, reference_hydrographique_gpkg_path, save_selected=False)
+
+    print('End : hydrological reference network created')
+    return PrincipalStem, AggregateSegment
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from .graph import connected_edges, csr, node_count, topological_levels, UPSTREAM
+from .partition import weak_components
+
+# error flags of the topology validation, a reach may have several of them
+CYCLE = 1
+SINK = 2
+SOURCE = 4
+CONFLICT = 8
+ORPHAN = 16
+
+# labels of the error flags in the error layer
+ERROR_LABELS = {CYCLE: 'cycle', SINK: 'puits', SOURCE: 'source', CONFLICT: 'conflit', ORPHAN: 'orphelin'}
+
+
+def cycle_components(nodea, nodeb):
+    """
+    Label the edges in a cycle with their strongly connected component (iterative Tarjan algorithm).
+
+    The edges which are not upstream and downstream of a cycle are first removed by two topological sorts
+    (forward then backward), so Tarjan only walks the few edges left around the cycles.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+
+    Returns:
+        numpy.ndarray: (E,) component label of each edge in a cycle (the lowest node id of the component),
+            -1 for the other edges.
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    labels = np.full(len(nodea), -1, dtype=np.int64)
+
+    # edges in or downstream of a cycle, then among them, the edges upstream of a cycle
+    sorted_edges = np.zeros(len(nodea), dtype=bool)
+    for level in topological_levels(nodea, nodeb):
+        sorted_edges[level] = True
+    residual = np.flatnonzero(~sorted_edges)
+
+    sorted_edges = np.zeros(len(residual), dtype=bool)
+    for level in topological_levels(nodeb[residual], nodea[residual]):
+        sorted_edges[level] = True
+    residual = residual[~sorted_edges]
+
+    if residual.size == 0:
+        return labels
+
+    # Tarjan on the residual edges, nodes renumbered from 0, plain lists in the loop
+    nodes, local = np.unique(np.concatenate([nodea[residual], nodeb[residual]]), return_inverse=True)
+    heads = local[len(residual):]
+    indptr, edges = csr(local[:len(residual)], len(nodes))
+    indptr_list = indptr.tolist()
+    successors = heads[edges].tolist()
+
+    size = len(nodes)
+    index = [-1] * size
+    lowlink = [0] * size
+    on_stack = [False] * size
+    component = [-1] * size
+    stack = []
+    counter = 0
+
+    for root in range(size):
+        if index[root] != -1:
+            continue
+
+        # depth-first walk, each frame is a node and the position of its next successor
+        frames = [(root, indptr_list[root])]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while frames:
+            node, position = frames[-1]
+            if position < indptr_list[node + 1]:
+                frames[-1] = (node, position + 1)
+                successor = successors[position]
+                if index[successor] == -1:
+                    index[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    frames.append((successor, indptr_list[successor]))
+                elif on_stack[successor] and index[successor] < lowlink[node]:
+                    lowlink[node] = index[successor]
+                continue
+
+            frames.pop()
+            if frames and lowlink[node] < lowlink[frames[-1][0]]:
+                lowlink[frames[-1][0]] = lowlink[node]
+
+            if lowlink[node] == index[node]:
+                # node is the root of a component, pop it
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = node
+                    if member == node:
+                        break
+
+    # lowest node id of each component as label
+    component = np.asarray(component, dtype=np.int64)
+    lowest = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(lowest, component, nodes)
+    component = lowest[component]
+
+    tails, heads = component[local[:len(residual)]], component[heads]
+    in_cycle = tails == heads
+    labels[residual[in_cycle]] = tails[in_cycle]
+
+    return labels
+
+
+def validate_network(nodea, nodeb, outlets):
+    """
+    Check the topology of the network, in a few linear passes on the node and edge arrays, and flag the edges:
+
+    - CYCLE: the edge is in a cycle (strongly connected component).
+    - SINK: the edge ends at a node without any edge leaving it, and no outlet edge ending there (dead end).
+    - SOURCE: the edge starts at a node without any edge flowing into it, from which no outlet can be reached.
+    - CONFLICT: the edge ends at a sink node with other edges (head to head, not at an outlet)
+      or starts at a source node with other edges (tail to tail), the usual mark of a reversed reach.
+    - ORPHAN: the edge is in a connected component (edge directions ignored) without any outlet edge,
+      its SINK, SOURCE and CONFLICT errors are not reported.
+
+    Parameters:
+        nodea (numpy.ndarray): (E,) from node id (NODEA) of each edge.
+        nodeb (numpy.ndarray): (E,) to node id (NODEB) of each edge.
+        outlets (numpy.ndarray): Indices of the outlet edges.
+
+    Returns:
+        dict: 'flags' (E,) uint8 combination of the error flags of each edge and
+            'component' (E,) connected component label of each edge (the lowest node id of the component).
+
+    Example:
+        errors = validate_network(nodea, nodeb, outlets)
+        print(error_counts(errors['flags']))
+    """
+    nodea = np.asarray(nodea, dtype=np.int64)
+    nodeb = np.asarray(nodeb, dtype=np.int64)
+    outlets = np.asarray(outlets, dtype=np.int64)
+    size = node_count(nodea, nodeb)
+
+    flags = np.zeros(len(nodea), dtype=np.uint8)
+    if size == 0:
+        return {'flags': flags, 'component': np.empty(0, dtype=np.int64)}
+
+    # orphans, the components without outlet
+    component = weak_components(nodea, nodeb)
+    drained = np.zeros(size, dtype=bool)
+    drained[component[outlets]] = True
+    orphan = ~drained[component]
+    flags[orphan] |= ORPHAN
+
+    flags[cycle_components(nodea, nodeb) >= 0] |= CYCLE
+
+    in_degree = np.bincount(nodeb, minlength=size)
+    out_degree = np.bincount(nodea, minlength=size)
+
+    # dead ends, the sinks which are not the end of an outlet edge
+    outlet_node = np.zeros(size, dtype=bool)
+    outlet_node[nodeb[outlets]] = True
+    sink = (out_degree == 0) & ~outlet_node
+
+    # sources from which no outlet can be reached, walking downstream
+    reaching = np.zeros(size, dtype=bool)
+    if outlets.size:
+        reaching[nodea[connected_edges(nodea, nodeb, outlets, direction=UPSTREAM)]] = True
+    source = (in_degree == 0) & ~reaching
+
+    head_to_head = sink & (in_degree > 1)
+    tail_to_tail = (in_degree == 0) & (out_degree > 1)
+
+    checked = ~orphan
+    flags[checked & sink[nodeb]] |= SINK
+    flags[checked & source[nodea]] |= SOURCE
+    flags[checked & (head_to_head[nodeb] | tail_to_tail[nodea])] |= CONFLICT
+
+    return {'flags': flags, 'component': component}
+
+
+def error_labels(flags) -> list:
+    """
+    Labels of the error flags of each edge, ie. 'puits,conflit'.
+    """
+    names = {value: ','.join(label for flag, label in ERROR_LABELS.items() if value & flag)
+             for value in np.unique(flags).tolist()}
+
+    return [names[value] for value in np.asarray(flags).tolist()]
+
+
+def error_counts(flags) -> dict:
+    """
+    Number of edges with each error flag, by error label.
+    """
+    flags = np.asarray(flags)
+
+    return {label: int(np.count_nonzero(flags & flag)) for flag, label in ERROR_LABELS.items()}
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import multiprocessing
+
+
+def worker_executable() -> bool:
+    """
+    Point the worker processes to the python interpreter.
+
+    In QGIS desktop sys.executable is QGIS itself, the worker processes are started with the python interpreter
+    of sys.exec_prefix instead (python.exe on Windows, bin/python3 elsewhere).
+
+    Returns:
+        bool: False if the interpreter can not be found, the caller then computes in the current process.
+
+    Example:
+        if workers == 1 or not worker_executable():
+            results = [task(args) for args in tasks]
+    """
+    if not os.path.basename(sys.executable).lower().startswith('qgis'):
+        return True
+
+    if os.name == 'nt':
+        python = os.path.join(sys.exec_prefix, 'python.exe')
+    else:
+        python = os.path.join(sys.exec_prefix, 'bin', 'python3')
+
+    if not os.path.isfile(python):
+        return False
+
+    multiprocessing.set_executable(python)
+    return True
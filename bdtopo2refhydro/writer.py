@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import os
+
+from osgeo import ogr
+from qgis.core import QgsVectorLayer, QgsVectorFileWriter, QgsFeatureRequest, QgsCoordinateTransformContext
+from qgis.PyQt.QtCore import QVariant, QDate, QDateTime, QTime, Qt
+
+# SQLite settings for bulk load. The default rollback journal and synchronous mode are kept: the GeoPackages
+# are shared with other layers (ie. the hand corrected troncons), an interrupted write must not corrupt them.
+# The large transactions already keep the number of journal syncs low.
+BULK_PRAGMAS = ['PRAGMA cache_size = -524288',  # 512 MB
+                'PRAGMA temp_store = MEMORY']
+
+
+def _ogr_value(value):
+    """
+    Convert a QGIS attribute value to a value accepted by OGR SetField, None for NULL.
+    """
+    if isinstance(value, QVariant):
+        return None if value.isNull() else value.value()
+    if isinstance(value, (QDate, QDateTime, QTime)):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _create_layer(layer: QgsVectorLayer, name: str, out_path: str) -> None:
+    """
+    Create (or overwrite) the empty GeoPackage layer with the layer schema, without spatial index.
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = name
+    options.fileEncoding = layer.dataProvider().encoding()
+    options.layerOptions = ['SPATIAL_INDEX=NO']
+    options.actionOnExistingFile = (QgsVectorFileWriter.CreateOrOverwriteLayer if os.path.exists(out_path)
+                                    else QgsVectorFileWriter.CreateOrOverwriteFile)
+
+    writer = QgsVectorFileWriter.create(out_path, layer.fields(), layer.wkbType(), layer.crs(),
+                                        QgsCoordinateTransformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(f"Failed to create {name} in {out_path}: {writer.errorMessage()}")
+    # close the file
+    del writer
+
+
+def _execute(datasource, sql: str):
+    """
+    Execute an SQL statement on the OGR datasource, return the first value of the result if any.
+    """
+    result = datasource.ExecuteSQL(sql)
+    if result is None:
+        return None
+    feature = result.GetNextFeature()
+    value = feature.GetField(0) if feature is not None and feature.GetFieldCount() else None
+    datasource.ReleaseResultSet(result)
+    return value
+
+
+def saving_gpkg(layer: QgsVectorLayer, name: str, out_path: str, save_selected: bool = False,
+                fids=None, mode: str = 'overwrite', batch_size: int = 100000) -> int:
+    """
+    Save a QGIS vector layer to a GeoPackage (GPKG) file with bulk transactions.
+
+    The features are streamed from the layer (only the selected or given ones if asked, without intermediate copy)
+    and inserted by batches of batch_size features per transaction, with a larger SQLite page cache.
+    The R-tree spatial index is built once after the inserts.
+
+    Parameters:
+        layer (QgsVectorLayer): The QGIS vector layer to be saved.
+        name (str): The name of the layer to be saved within the GeoPackage.
+        out_path (str): The output path where the GeoPackage file will be saved.
+        save_selected (bool, optional): If True, only the selected features will be saved to the GeoPackage.
+            Default is False.
+        fids (list, optional): If given, only these feature ids will be saved. Default is None.
+        mode (str, optional): 'overwrite' to replace the layer (the file is created if needed),
+            'append' to add the features to the existing layer (created if needed), with new fids.
+            Default is 'overwrite'.
+        batch_size (int, optional): Number of features inserted per transaction. Default is 100000.
+
+    Returns:
+        int: The number of features written.
+
+    Raises:
+        IOError: If there is an error during the save process.
+        ValueError: If the mode is unknown.
+
+    Example:
+        # Save the 'my_layer' vector layer to 'output.gpkg' with layer name 'my_saved_layer'
+        saving_gpkg(my_layer, 'my_saved_layer', 'output.gpkg')
+
+        # Append only the selected features of 'my_layer' to the 'my_saved_layer' layer of 'output.gpkg'
+        saving_gpkg(my_layer, 'my_saved_layer', 'output.gpkg', save_selected=True, mode='append')
+    """
+    if mode not in ('overwrite', 'append'):
+        raise ValueError(f"Unknown mode {mode}, 'overwrite' or 'append' expected")
+
+    request = QgsFeatureRequest()
+    if save_selected:
+        request.setFilterFids(layer.selectedFeatureIds())
+    elif fids is not None:
+        request.setFilterFids([int(fid) for fid in fids])
+
+    exists = False
+    if os.path.exists(out_path):
+        datasource = ogr.Open(out_path)
+        exists = datasource is not None and datasource.GetLayerByName(name) is not None
+        datasource = None
+
+    if mode == 'overwrite' or not exists:
+        _create_layer(layer, name, out_path)
+
+    datasource = ogr.Open(out_path, update=1)
+    if datasource is None or datasource.GetLayerByName(name) is None:
+        raise IOError(f"Error: unable to open {name} in {out_path}")
+    for pragma in BULK_PRAGMAS:
+        _execute(datasource, pragma)
+
+    ogr_layer = datasource.GetLayerByName(name)
+    geometry_column = ogr_layer.GetGeometryColumn()
+    fid_column = ogr_layer.GetFIDColumn().lower()
+
+    # an existing index is maintained by triggers on each insert, rebuild it once at the end instead
+    if _execute(datasource, f"SELECT HasSpatialIndex('{name}', '{geometry_column}')"):
+        _execute(datasource, f"SELECT DisableSpatialIndex('{name}', '{geometry_column}')")
+
+    definition = ogr_layer.GetLayerDefn()
+    appending = exists and mode == 'append'
+    field_map = []
+    for index, field in enumerate(layer.fields()):
+        if field.name().lower() == fid_column:
+            # the source fid is kept on overwrite, on append OGR gives new fids (no collision with the existing ones)
+            if not appending:
+                field_map.append((index, 'fid'))
+        else:
+            ogr_index = definition.GetFieldIndex(field.name())
+            if ogr_index != -1:
+                field_map.append((index, ogr_index))
+
+    count = 0
+    try:
+        datasource.StartTransaction()
+        for feature in layer.getFeatures(request):
+            ogr_feature = ogr.Feature(definition)
+            attributes = feature.attributes()
+            for index, ogr_index in field_map:
+                value = _ogr_value(attributes[index])
+                if ogr_index == 'fid':
+                    if value is not None:
+                        ogr_feature.SetFID(int(value))
+                elif value is None:
+                    ogr_feature.SetFieldNull(ogr_index)
+                else:
+                    ogr_feature.SetField(ogr_index, value)
+            if feature.hasGeometry():
+                ogr_feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(bytes(feature.geometry().asWkb())))
+            if ogr_layer.CreateFeature(ogr_feature) != ogr.OGRERR_NONE:
+                datasource.RollbackTransaction()
+                raise IOError(f"Error: unable to write feature {feature.id()} in {name}")
+
+            count += 1
+            if count % batch_size == 0:
+                datasource.CommitTransaction()
+                datasource.StartTransaction()
+        datasource.CommitTransaction()
+
+        # deferred R-tree build
+        _execute(datasource, f"SELECT CreateSpatialIndex('{name}', '{geometry_column}')")
+    finally:
+        datasource = None
+
+    print(f"{name}: {count} features {'appended' if appending else 'saved'} successfully.")
+    return count
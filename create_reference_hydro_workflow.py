@@ -18,144 +18,75 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 -------------------------------------------------------------------------------
 """
 
-def create_reference_hydro(workdir, script_folder, inputs_folder, outputs_folder) :
+import sys
+import warnings
+
+
+def create_reference_hydro(workdir, script_folder=None, inputs_folder='inputs/', outputs_folder='outputs/',
+                           use_cache: bool = True, partitioned: bool = False, workers: int = None) :
     """
     Creates a reference hydrographic network from IGN BD TOPO.
 
     Parameters:
         workdir (str): The main working directory path.
-        script_folder (str): The path to the folder containing the scripts to run.
-        inputs_folder (str): The path to the folder containing the input data.
-        outputs_folder (str): The path to the folder where the outputs will be saved.
+        script_folder (str, optional): Deprecated and ignored, the stages are run from the bdtopo2refhydro package
+            (the scripts of pyqgis_scripts/ remain usable one by one). Default is None.
+        inputs_folder (str, optional): The path to the folder containing the input data. Default is 'inputs/'.
+        outputs_folder (str, optional): The path to the folder where the outputs will be saved. Default is 'outputs/'.
+        use_cache (bool, optional): If True, the stages whose input layers and parameters did not change since
+            their last run are skipped and their outputs reused (manifest outputs_folder/stage_cache.json).
+            If False, all the stages are run. Default is True.
+        partitioned (bool, optional): If True, create_connected_reference_hydro builds the independent drainage
+            components (by outlet) in parallel worker processes. Default is False.
+        workers (int, optional): Number of worker processes of the partitioned build. Default is None, the number of cores.
 
     Returns:
         None
 
     Raises:
-        IOError: If an error occurs while executing any of the scripts.
+        IOError: If an error occurs while executing any of the stages.
 
     Description:
-        This function executes a series of scripts in the specified script_folder
-        to create a hydrographic network. The function runs the following scripts
-        in order:
-        - 'fix_connection_and_direction.py'
-        - 'fix_connection.py'
-        - 'fix_direction.py'
-        - 'fix_modified_geom.py'
-        - 'fix_suppr_canal_multichenal.py'
-        - 'fix_suppr_canal.py'
-        - 'create_exutoire.py'
-        - 'create_connected_reference_hydro.py'
-
-        If any script execution raises an exception, the function will raise an IOError.
+        This function runs bdtopo2refhydro.pipeline.build, the stages in order:
+        - fix_corrections (connection and direction, connection, direction, modified geom,
+          suppr canal and multichenal corrections in one edit transaction)
+        - create_exutoire
+        - fix_suppr_canal_auto
+        - propose_direction_corrections (troncons to reverse, to check before adding them to
+          troncon_hydrographique_corr_dir_ecoulement)
+        - create_connected_reference_hydro
+
+        If any stage raises an exception, the function will raise an IOError.
+
+        Each stage is keyed on a content hash of its input layers and of its parameters (buffer_distance,
+        quantization, crs), so after an edit of one correction layer only the impacted stages are run again.
+
+        The same build runs headless outside QGIS desktop with:
+        python -m bdtopo2refhydro build --workdir /path/to/workdir/
 
         Note: The function assumes that the data file name are not changed and follow the original repository ones.
 
     Usage:
-        >>> create_reference_hydro('/path/to/workdir/', 'scripts/', 'input_data/', 'output_data/')
+        >>> create_reference_hydro('/path/to/workdir/', inputs_folder='input_data/', outputs_folder='output_data/')
     """
-    # def all global variables to set all the the paths in the script.py file below
-    global wd, inputs, outputs, crs
-
-    global troncon_hydrographique_cours_d_eau_corr_gpkg
-    global troncon_hydrographique_cours_d_eau_corr
-    
-    global corr_reseau_hydrographique_gpkg
-    global troncon_hydrographique_corr_connection_and_dir_ecoulement
-    global troncon_hydrographique_corr_connection
-    global troncon_hydrographique_corr_dir_ecoulement
-    global troncon_hydrographique_corr_geom
-    global troncon_hydrographique_corr_suppr_canal_multichenal
-    global troncon_hydrographique_cours_d_eau_corr_suppr_canal
-
-    global creation_exutoire_gpkg, plan_d_eau_layername, frontiere_layername, limite_terre_mer_layername, plan_d_eau_line_layername
-
-    global exutoire_gpkg, exutoire_layername, exutoire_buffer_layername, buffer_distance
-    global reference_hydrographique_gpkg, reference_hydrographique_troncon_layername, reference_hydrographique_segment_layername
-
-    # set folder and crs
-    wd = workdir # function params
-    inputs = inputs_folder # function params
-    outputs = outputs_folder # function params
-    crs = 'EPSG:2154'
-
-    # input files and layers
-    corr_reseau_hydrographique_gpkg = 'corr_reseau_hydrographique.gpkg'
-    troncon_hydrographique_corr_connection_and_dir_ecoulement = 'troncon_hydrographique_corr_connection_and_dir_ecoulement'
-    troncon_hydrographique_corr_connection = 'troncon_hydrographique_corr_connection'
-    troncon_hydrographique_corr_dir_ecoulement = 'troncon_hydrographique_corr_dir_ecoulement'
-    troncon_hydrographique_corr_geom = 'troncon_hydrographique_corr_geom'
-    troncon_hydrographique_cours_d_eau_corr_suppr_canal = 'troncon_hydrographique_cours_d_eau_corr_suppr_canal'
-    troncon_hydrographique_corr_suppr_canal_multichenal = 'troncon_hydrographique_corr_suppr_canal_multichenal'
-
-    creation_exutoire_gpkg = 'creation_exutoire.gpkg'
-    plan_d_eau_layername = 'plan_d_eau_selected'
-    frontiere_layername = 'frontiere'
-    limite_terre_mer_layername = 'limite_terre_mer'
-    
-    # output files
-    troncon_hydrographique_cours_d_eau_corr_gpkg = 'troncon_hydrographique_cours_d_eau_corr.gpkg' # file created by user to save correction, set the name used.
-    troncon_hydrographique_cours_d_eau_corr = 'troncon_hydrographique_cours_d_eau_corr' # layer created by user to save correction, set the name used.
-
-    exutoire_gpkg = 'exutoire.gpkg' # no need to change exutoire
-    plan_d_eau_line_layername = 'plan_d_eau_line'
-    exutoire_layername = 'exutoire'
-    exutoire_buffer_layername = 'exutoire_buffer50'
-    buffer_distance = 50
-
-    reference_hydrographique_gpkg = 'reference_hydrographique.gpkg' # change this name to create new output file
-    reference_hydrographique_troncon_layername = 'reference_hydrographique_troncon'
-    reference_hydrographique_segment_layername = 'reference_hydrographique_segment'
-
-
-    def run_script(script_name):
-        try:
-            script_path = workdir + script_folder + script_name
-            exec(open(script_path.encode('utf-8')).read())
-        except Exception as e:
-            error_message = f"Error executing {script_name}: {str(e)}"
-            raise IOError(error_message)
-
-    try:
-        # fix_connection_and_direction
-        print('fix_connection_and_direction')
-        run_script('fix_connection_and_direction.py')
-
-        # fix_connection
-        print('fix_connection')
-        run_script('fix_connection.py')
-
-        # fix_direction
-        print('fix_direction')
-        run_script('fix_direction.py')
-
-        # fix_modified_geom
-        print('fix_modified_geom')
-        run_script('fix_modified_geom.py')
-
-        # fix_suppr_canal_multichenal
-        print('fix_suppr_canal_multichenal')
-        run_script('fix_suppr_canal_multichenal.py')
-
-        # create_exutoire to selected connected reaches to upstream
-        print('create_exutoire')
-        run_script('create_exutoire.py')
-
-        # fix_suppr_canal
-        print('fix_suppr_canal_auto')
-        run_script('fix_suppr_canal_auto.py')
-
-        # create_connected_reference_hydro to create the final reference fixed hydrographic network with connected reaches
-        print('create_connected_reference_hydro')
-        run_script('create_connected_reference_hydro.py')
-
-    except Exception as e:
-        raise IOError(e)
-
-    print("Reference hydrographique successfully created")
+    if script_folder is not None:
+        warnings.warn("create_reference_hydro: script_folder is deprecated and ignored, "
+                      "the stages are run from the bdtopo2refhydro package", DeprecationWarning, stacklevel=2)
+
+    # bdtopo2refhydro package with the pipeline and the native network engines
+    if workdir not in sys.path:
+        sys.path.insert(0, workdir)
+
+    from bdtopo2refhydro.pipeline import build
+
+    build(workdir, inputs_folder=inputs_folder, outputs_folder=outputs_folder,
+          buffer_distance=50, crs='EPSG:2154', quantization=100000000,
+          use_cache=use_cache, partitioned=partitioned, workers=workers)
     return
 
-create_reference_hydro('C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/',
-                       'pyqgis_scripts/',
-                       'inputs/',
-                       'outputs/')
\ No newline at end of file
+
+if __name__ == '__main__':
+    create_reference_hydro('C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/',
+                           inputs_folder='inputs/',
+                           outputs_folder='outputs/')
+
@@ -19,13 +19,25 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from qgis.core import *
-from qgis.core import QgsVectorLayer, QgsVectorFileWriter
+from qgis.core import QgsVectorLayer
 import processing
+import sys
+import numpy as np
 
 # uncomment if not runned by workflow
 wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
 outputs = 'outputs/'
 
+# bdtopo2refhydro package in the working directory
+if wd not in sys.path:
+    sys.path.insert(0, wd)
+
+from bdtopo2refhydro.layers import (aggregate_stream_segments, compute_length_in_surface, compute_nested_intervals,
+                                    compute_network_orders, compute_upstream_accumulation, identify_network_nodes,
+                                    outlet_features, read_attributes, read_lengths, subset_layer)
+from bdtopo2refhydro.graph import fix_network_connectivity
+from bdtopo2refhydro.writer import saving_gpkg
+
 def create_5m_width_hydro_network(surface_hydrographique_gpkg,
                                 surface_hydrographique_layername,
                                 reference_hydrographique_gpkg,
@@ -33,12 +45,14 @@ def create_5m_width_hydro_network(surface_hydrographique_gpkg,
                                 reference_hydrographique_5m_gpkg,
                                 reference_hydrographique_5m_layername,
                                 exutoire_gpkg, 
-                                exutoire_buffer_layername,
+                                exutoire_layername,
                                 zone_gpkg,
                                 zone_layername,
                                 small_segment_filter = 500,
                                 percent_stream_in_surface = 30,
-                                exutoire_stream_min_length = 10000):
+                                exutoire_stream_min_length = 10000,
+                                buffer_distance = 50,
+                                workers = None):
     """
     Create a hydrological reference network with a 5-meter width based on hydrographic surface and hydrographic network reference.
 
@@ -50,12 +64,14 @@ def create_5m_width_hydro_network(surface_hydrographique_gpkg,
         reference_hydrographique_5m_gpkg (str): The name of the GeoPackage file for hydrographical data with a 5-meter width processing.
         reference_hydrographique_5m_layername (str): The name of the layer for the 5-meter width hydrological reference network.
         exutoire_gpkg (str) : The name of the GeoPackage file for exutoire data.
-        exutoire_buffer_layername (str) : The name of the exutoire_buffer50 layer in exutoire file.
+        exutoire_layername (str) : The name of the exutoire line layer in exutoire file.
         zone_gpkg (str) : The name of the GeoPackage file for watershed zone data.
         zone_layername (str) : The name of the watershed zone layer.
         small_segment_filter (int) : Minimum length for a Strahler rank 1 isolate little stream which gather an above rank 3 stream, below this lenght the streams are removed.
         percent_stream_in_surface (int) : The reference hydrographic segment need to have a least this percentage inside hydrographic surface to be kept in reference hydrographic 5m.
         exutoire_stream_min_length (int) : Mininum length for strahler rank 1 outlet steam (remove small isolate outlet streams). 
+        buffer_distance (float) : Outlet distance to the exutoire lines, the streams within this distance are outlets.
+        workers (int) : Number of worker processes for the length in surface computation, None for the number of cores.
 
     Raises:
         IOError: Raised if there is an error during the save process.
@@ -74,14 +90,15 @@ def create_5m_width_hydro_network(surface_hydrographique_gpkg,
     # inputs
     surface_hydro = f"{surface_hydrographique_gpkg_path}|layername={surface_hydrographique_layername}"
     ref_hydro = f"{reference_hydrographique_gpkg_path}|layername={reference_hydrographique_layername}"
-    exutoire = f"{exutoire_gpkg_path}|layername={exutoire_buffer_layername}"
+    exutoire = f"{exutoire_gpkg_path}|layername={exutoire_layername}"
     if zone_gpkg and zone_layername : 
         zone = f"{zone_gpkg_path}|layername={zone_layername}"
 
     # load layers
     surface_hydro_layer = QgsVectorLayer(surface_hydro, surface_hydrographique_layername, 'ogr')
     ref_hydro_layer = QgsVectorLayer(ref_hydro, surface_hydrographique_layername, 'ogr')
-    exutoire_layer = QgsVectorLayer(exutoire, exutoire_buffer_layername, 'ogr')
+    exutoire_layer = QgsVectorLayer(exutoire, exutoire_layername, 'ogr')
+    zone_layer = None
     if zone_gpkg and zone_layername : 
         zone_layer = QgsVectorLayer(zone, zone_layername, 'ogr')
 
@@ -93,66 +110,12 @@ def create_5m_width_hydro_network(surface_hydrographique_gpkg,
         if not zone_layer.isValid():
             raise IOError(f"{zone_layer} n'a pas été chargée correctement")
             
-    def saving_gpkg(layer: QgsVectorLayer, name: str, out_path: str, save_selected: bool = False) -> None:
-        """
-        Save a QGIS vector layer to a GeoPackage (GPKG) file.
-
-        Parameters:
-            layer (QgsVectorLayer): The QGIS vector layer to be saved.
-            name (str): The name of the layer to be saved within the GeoPackage.
-            out_path (str): The output path where the GeoPackage file will be saved.
-            save_selected (bool, optional): If True, only the selected features will be saved to the GeoPackage.
-                Default is False.
-
-        Raises:
-            IOError: If there is an error during the save process.
-
-        Notes:
-            - The function saves the provided vector layer to a GeoPackage file at the specified output path.
-            - If the GeoPackage file already exists, the function will update the layer with the new data.
-            - If the GeoPackage file does not exist, it will be created, and the layer will be saved in it.
-            - The 'save_selected' option is useful when you want to save only a subset of the features from the layer.
-
-        Example:
-            # Save the 'my_layer' vector layer to 'output.gpkg' with layer name 'my_saved_layer'
-            saving_gpkg(my_layer, 'my_saved_layer', 'output.gpkg')
-
-            # Save only the selected features of 'my_layer' to 'output.gpkg' with layer name 'my_saved_layer'
-            saving_gpkg(my_layer, 'my_saved_layer', 'output.gpkg', save_selected=True)
-        """
-
-        # options.onlySelected = True not working with gpkg
-        if save_selected:
-            saved_layer = processing.run("native:saveselectedfeatures", {'INPUT': layer, 'OUTPUT': 'TEMPORARY_OUTPUT'})['OUTPUT']
-        else:
-            saved_layer = layer
-
-        options = QgsVectorFileWriter.SaveVectorOptions()
-        options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer  # update mode
-        options.EditionCapability = QgsVectorFileWriter.CanAddNewLayer
-        options.layerName = name
-        options.fileEncoding = saved_layer.dataProvider().encoding()
-        options.driverName = "GPKG"
-
-        _writer = QgsVectorFileWriter.writeAsVectorFormat(saved_layer, out_path, options)
-
-        # if file and layer exist, overwrite the layer
-        if _writer[0] == QgsVectorFileWriter.NoError:
-            print("Layer updated successfully.")
-        # if file does not exist, switch to create mode
-        elif _writer[0] == QgsVectorFileWriter.ErrCreateDataSource:
-            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteFile  # create mode
-            _writer = QgsVectorFileWriter.writeAsVectorFormat(saved_layer, out_path, options)
-            if _writer[0] == QgsVectorFileWriter.NoError:
-                print("GeoPackage created successfully.")
-            else:
-                raise IOError(f"Failed to create GeoPackage: {_writer[1]}")
-        else:
-            raise IOError(f"Error: {_writer[1]}")
+
     
     ### Processing
 
-    if zone_layer : 
+    # no zone, the whole network is processed
+    if zone_layer is not None : 
 
         surface_hydro_layer = processing.run('qgis:extractbylocation', 
         {
@@ -179,258 +142,104 @@ def create_5m_width_hydro_network(surface_hydrographique_gpkg,
         })['OUTPUT']
 
     # Identified network nodes on reference hydro segment
-    print('IdentifyNetworkNodes processing, this could take some time')
-    IdentifyNetworkNodes = processing.run('fct:identifynetworknodes', 
-        {
-            'INPUT': ref_hydro_layer,
-            'QUANTIZATION': 100000000,
-            'NODES': 'TEMPORARY_OUTPUT',
-            'OUTPUT': 'TEMPORARY_OUTPUT'
-        })['OUTPUT']
+    print('IdentifyNetworkNodes processing')
+    IdentifyNetworkNodes = identify_network_nodes(ref_hydro_layer, quantization=100000000)
     
     # add indexes
     IdentifyNetworkNodes.dataProvider().createSpatialIndex()
     print('IdentifyNetworkNodes index created')
 
-    IdentifyNetworkNodes.selectAll()
-    IdentifyNetworkNodes_copy = processing.run("native:saveselectedfeatures", {'INPUT': IdentifyNetworkNodes, 
-                                                                            'OUTPUT': 'TEMPORARY_OUTPUT'})['OUTPUT']
-    IdentifyNetworkNodes.removeSelection()
-
-    # extract outlet by exutoire, we need final outlet to fix network connectivity
-    outlet = processing.run('native:extractbylocation',
-        {
-            'INPUT' : IdentifyNetworkNodes, 
-            'INTERSECT' : exutoire_layer,
-            'PREDICATE' : [0],
-            'OUTPUT' : 'TEMPORARY_OUTPUT'
-        })['OUTPUT']
+    # outlet within buffer_distance of the exutoire lines, we need final outlet to fix network connectivity
+    outlet_fids = outlet_features(IdentifyNetworkNodes, exutoire_layer, buffer_distance)
     
     # get only stream with % of their length inside the water surface => percent_stream_in_surface
     pc_length_in_surface_field = 'length_in_surface'
 
-    IdentifyNetworkNodes.dataProvider().addAttributes([QgsField(pc_length_in_surface_field, QVariant.Double)])
-    IdentifyNetworkNodes.updateFields()
-
-    IdentifyNetworkNodes.startEditing()
-
-    for linestring_feature in IdentifyNetworkNodes.getFeatures():
-            linestring_geometry = linestring_feature.geometry()
-            total_length = linestring_geometry.length()
-
-            # Initialize length_within_polygon as -1 to indicate no intersection and remove it
-            pc_length_in_surface = -1
-
-            # Iterate over polygon features
-            for polygon_feature in surface_hydro_merge.getFeatures():
-                polygon_geometry = polygon_feature.geometry()
-
-                # Check if linestring intersects with the polygon
-                if linestring_geometry.intersects(polygon_geometry):
-                    # Calculate the length of the intersection
-                    intersection_geometry = linestring_geometry.intersection(polygon_geometry)
-                    length_in_polygon = intersection_geometry.length()
-                    pc_length_in_surface = length_in_polygon/total_length*100
-
-                    # Update the length attribute in the linestring layer
-                    IdentifyNetworkNodes.dataProvider().changeAttributeValues({linestring_feature.id(): {IdentifyNetworkNodes.fields().indexFromName(pc_length_in_surface_field): pc_length_in_surface}})
-
-                    break  # Exit the inner loop after finding the first intersecting polygon
+    # split the dissolved surface in small tiles for the spatial index
+    surface_tiles = processing.run('native:subdivide',
+        {
+            'INPUT' : surface_hydro_merge,
+            'MAX_NODES' : 256,
+            'OUTPUT' : 'TEMPORARY_OUTPUT'
+        })['OUTPUT']
 
-            # remove if the length inside the water surface is below the setted %
-            if pc_length_in_surface < percent_stream_in_surface:
-                IdentifyNetworkNodes.dataProvider().deleteFeatures([linestring_feature.id()])
+    print('Compute length in surface')
+    surface_fids, pc_length_in_surface = compute_length_in_surface(IdentifyNetworkNodes, surface_tiles, pc_length_in_surface_field,
+                                                                   workers=workers)
 
-    # Commit changes
-    IdentifyNetworkNodes.commitChanges()
+    # keep if the length inside the water surface is at least the setted % (-1 if no intersection), and the outlets
+    fids, nodes = read_attributes(IdentifyNetworkNodes, ['NODEA', 'NODEB'])
+    subset = np.isin(fids, surface_fids[pc_length_in_surface >= percent_stream_in_surface]) | np.isin(fids, outlet_fids)
 
-    # merge outlet and IdentifyNetworkNodes
-    processing.run('etl_load:appendfeaturestolayer',
-        { 'ACTION_ON_DUPLICATE' : 1, 
-        'SOURCE_FIELD' : 'fid', 
-        'SOURCE_LAYER' : outlet,
-        'TARGET_FIELD' : 'fid', 
-        'TARGET_LAYER' : IdentifyNetworkNodes})
-    
-    # fix network connectivity
-    fixed_network = processing.run('fct:fixnetworkconnectivity', 
-        {
-            'INPUT' : IdentifyNetworkNodes_copy, 
-            'SUBSET' : IdentifyNetworkNodes, 
-            'FROM_NODE_FIELD' : 'NODEA', 
-            'TO_NODE_FIELD' : 'NODEB',
-            'OUTPUT' : 'TEMPORARY_OUTPUT', 
-        })['OUTPUT']
+    # fix network connectivity, the reaches linking the kept streams downstream are restored from the whole network
+    fixed = fix_network_connectivity(nodes['NODEA'], nodes['NODEB'], subset)
+    fixed_network = subset_layer(IdentifyNetworkNodes, fids[fixed])
   
-    # Measure network from outlet
-    print('Measure network from outlet')
-    networkMeasureFromOutlet = processing.run('fct:measurenetworkfromoutlet',
-        {
-            'FROM_NODE_FIELD' : 'NODEA',
-            'TO_NODE_FIELD' : 'NODEB',
-            'INPUT' : fixed_network, 
-            'OUTPUT' : 'TEMPORARY_OUTPUT', 
-        })['OUTPUT']
-
-    # Hack order
-    print('Compute Hack order')
-    networkHack = processing.run('fct:hackorder',
-        {
-            'FROM_NODE_FIELD' : 'NODEA',
-            'TO_NODE_FIELD' : 'NODEB',
-            'INPUT' : networkMeasureFromOutlet, 
-            'IS_DOWNSTREAM_MEAS' : True, 
-            'MEASURE_FIELD' : 'MEASURE', 
-            'OUTPUT' : 'TEMPORARY_OUTPUT', 
-        })['OUTPUT']
-    
-    # Strahler order
-    print('Compute Strahler order')
-    networkStrahler = processing.run('fct:strahlerorder',
-        {
-            'AXIS_FIELD' : 'HACK', 
-            'FROM_NODE_FIELD' : 'NODEA', 
-            'TO_NODE_FIELD' : 'NODEB',
-            'INPUT' : networkHack, 
-            'OUTPUT' : 'TEMPORARY_OUTPUT', 
-        })['OUTPUT']
+    # Measure network from outlet, Hack order and Strahler order in one pass
+    print('Compute measure from outlet, Hack and Strahler orders')
+    networkStrahler = fixed_network
+    compute_network_orders(networkStrahler, from_node_field='NODEA', to_node_field='NODEB')
     
     print("Remove sliver streams")
 
+    # network arrays, the node ids index boolean arrays so each filter is one pass over the reaches
+    fids, lengths = read_lengths(networkStrahler)
+    _, attributes = read_attributes(networkStrahler, ['NODEA', 'NODEB', 'STRAHLER'])
+    nodea, nodeb, strahler = attributes['NODEA'], attributes['NODEB'], attributes['STRAHLER']
+    node_count = int(max(nodea.max(), nodeb.max())) + 1 if len(fids) else 0
+
     # remove the small strahler rank 1 affluents in strahler rang 3 to avoid small stream in the middle of bigger streams valley bottoms 
-    nodea_field = 'NODEA'
-    nodeb_field = 'NODEB'
-    field_strahler = 'STRAHLER'
-
-    # get strahler 1 streams
-    filter_expression_strahler_1 = QgsExpression(f"{field_strahler} = 1")
-    filter_strahler_1 = QgsFeatureRequest(filter_expression_strahler_1)
-    strahler_1 = networkStrahler.getFeatures(filter_strahler_1)
-
-    # get strahler 3 streams
-    filter_expression_strahler_3 = QgsExpression(f"{field_strahler} > 2")
-    filter_strahler_3 = QgsFeatureRequest(filter_expression_strahler_3)
-    strahler_3 = networkStrahler.getFeatures(filter_strahler_3)
-
-    # create list of feature attributs
-    nodeb_list = [(feature[nodeb_field], feature.id(), feature.geometry().length()) for feature in strahler_1]
-    nodea_list = [(feature[nodea_field], feature.id(), feature.geometry().length()) for feature in strahler_3]
-
-    # compare the list to get only the connect nodes and strahler stream 1 below the threshold set
-    matching_pairs = [(nodeb, id_b, length_b, nodea, id_a, length_a) 
-                    for nodeb, id_b, length_b in nodeb_list 
-                    for nodea, id_a, length_a in nodea_list 
-                    if nodeb == nodea and length_b <= small_segment_filter]
-
-    # keep only the strahler stream 1 id, select and delete them
-    matching_ids = set(id_b for _, id_b, _, _, _, _ in matching_pairs)
-    networkStrahler.selectByIds(list(matching_ids))
-    networkStrahler.startEditing()
-    networkStrahler.deleteSelectedFeatures()
-    networkStrahler.commitChanges()
-
-    # unselected the features (not really necessary but in case....)
-    networkStrahler.selectByIds([])
+    # strahler 1 streams below the threshold flowing into the from node of a strahler > 2 stream
+    is_nodea_strahler_3 = np.zeros(node_count, dtype=bool)
+    is_nodea_strahler_3[nodea[strahler > 2]] = True
+    sliver = (strahler == 1) & (lengths <= small_segment_filter) & is_nodea_strahler_3[nodeb]
 
     # remove all the rank 1 outlet streams not linked upstream <= exutoire_stream_min_length (a lot of little streams outlet)
-    # get strahler 1 streams
-    filter_expression_strahler_1 = QgsExpression(f"{field_strahler} = 1")
-    filter_strahler_1 = QgsFeatureRequest(filter_expression_strahler_1)
-    strahler_1 = networkStrahler.getFeatures(filter_strahler_1)
-
-    strahler_features = networkStrahler.getFeatures()
-
-    # create list of feature attributes
-    list_s1 = [(feature[nodea_field], feature[nodeb_field], feature.id(), feature.geometry().length()) for feature in strahler_1]
-    list_total = [(feature[nodea_field], feature[nodeb_field], feature.id(), feature.geometry().length()) for feature in strahler_features]
-
-    # get nodea from strahler1 not in nodeb from strahler_features AND
-    # nodeb from strahler1 should not in nodea strahler_features (isolate feature) AND
+    # nodea from strahler1 not in nodeb of the remaining streams AND
+    # nodeb from strahler1 not in nodea of the remaining streams (isolate feature) AND
     # strahler1 feature length <= exutoire_stream_min_length
-    matching_pairs = [(nodea_s1, nodeb_s1, id_s1, length_s1) for nodea_s1, nodeb_s1, id_s1, length_s1 in list_s1
-                    if all(nodea_s1 != nodeb_to and nodeb_s1 != nodea_to and length_s1 <= exutoire_stream_min_length for nodea_to, nodeb_to, _, _ in list_total)]
+    remaining = ~sliver
+    is_nodea = np.zeros(node_count, dtype=bool)
+    is_nodea[nodea[remaining]] = True
+    is_nodeb = np.zeros(node_count, dtype=bool)
+    is_nodeb[nodeb[remaining]] = True
+    isolated = remaining & (strahler == 1) & (lengths <= exutoire_stream_min_length) & ~is_nodeb[nodea] & ~is_nodea[nodeb]
 
-    # keep only the strahler features and delete them
-    matching_ids = set(id_s1 for _, _, id_s1, _ in matching_pairs)
-    networkStrahler.selectByIds(list(matching_ids))
-
-    networkStrahler.startEditing()
-    networkStrahler.deleteSelectedFeatures()
-    networkStrahler.commitChanges()
-
-    QgsProject.instance().addMapLayer(networkStrahler)
+    print(f"Sliver streams removed : {int(sliver.sum())}, isolated outlet streams removed : {int(isolated.sum())}")
+    networkStrahler.dataProvider().deleteFeatures(fids[sliver | isolated].tolist())
 
     # reaggregate stream after sliver stream  removed
     print('Aggregate reaches to intersection')
-    AggregateSegment = processing.run('fct:aggregatestreamsegments',
-                                        {
-                                        'INPUT': networkStrahler,
-                                        'CATEGORY_FIELD' : '',
-                                        'COPY_FIELDS' : 'fid',
-                                        'FROM_NODE_FIELD' : 'NODEA',
-                                        'TO_NODE_FIELD' : 'NODEB',
-                                        'OUTPUT' : 'TEMPORARY_OUTPUT'
-                                        })['OUTPUT']
-    
-    join_aggregate = processing.run('native:joinattributestable',
-                                { 
-                                    'DISCARD_NONMATCHING' : False, 
-                                    'FIELD' : 'fid', 
-                                    'FIELDS_TO_COPY' : [], 
-                                    'FIELD_2' : 'fid', 
-                                    'INPUT' : AggregateSegment, 
-                                    'INPUT_2' : networkStrahler, 
-                                    'METHOD' : 1, 
-                                    'OUTPUT' : 'TEMPORARY_OUTPUT', 
-                                    'PREFIX' : 'join_' 
-                                    })['OUTPUT']
-    
-    QgsProject.instance().removeMapLayer(networkStrahler)
-    
-    # rename fields
-    with edit(join_aggregate):
-        for field in join_aggregate.fields():
-            # Check if the field name starts with "join_"
-            if field.name().startswith('join_'):
-                new_field_name = field.name()[5:]  # Remove the first 5 characters ("join_")
-                idx = join_aggregate.fields().indexFromName(field.name())
-                join_aggregate.renameAttribute(idx, new_field_name)
-
-    fields_to_remove = ["fid", "join_fid", 
-                        "NODEA", "join_NODEA", 
-                        "NODEB", "join_NODEB",
+    field_names = [field.name() for field in networkStrahler.fields() if field.name() not in ['NODEA', 'NODEB']]
+    AggregateSegment = aggregate_stream_segments(networkStrahler, field_names,
+                                                 from_node_field='NODEA', to_node_field='NODEB')
+
+    # upstream totals and nested intervals of the 5m network, replacing the reference network ones
+    print('Compute upstream accumulation and nested intervals')
+    compute_upstream_accumulation(AggregateSegment, from_node_field='NODEA', to_node_field='NODEB')
+    compute_nested_intervals(AggregateSegment, from_node_field='NODEA', to_node_field='NODEB')
+
+    fields_to_remove = ["fid",
+                        "NODEA", "NODEB",
                         "MEASURE", "length_in_surface",
-                        "LENGTH", "join_LENGTH",
-                        "GID", "CATEGORY",
-                        "AXIS", "LAXIS"]
+                        "GID", "AXIS", "LAXIS"]
 
     # remove fields
-    field_indexes = {field_name: join_aggregate.fields().indexFromName(field_name) for field_name in fields_to_remove}
+    field_indexes = {field_name: AggregateSegment.fields().indexFromName(field_name) for field_name in fields_to_remove}
 
-    with edit(join_aggregate):
+    with edit(AggregateSegment):
         # Delete the attributes (fields) using the field indexes
-        join_aggregate.dataProvider().deleteAttributes(list(field_indexes.values()))
+        AggregateSegment.dataProvider().deleteAttributes(list(field_indexes.values()))
         
         # Update the fields to apply the changes
-        join_aggregate.updateFields()
-
-    # add a new length field
-    with edit(join_aggregate):
-        new_field = QgsField("length", QVariant.Double)
-        join_aggregate.dataProvider().addAttributes([new_field])
-        join_aggregate.updateFields()
-
-        length_index = join_aggregate.fields().indexFromName("length")
-
-        for feature in join_aggregate.getFeatures():
-            length = feature.geometry().length()
-            
-            join_aggregate.dataProvider().changeAttributeValues({feature.id(): {length_index: length}})
+        AggregateSegment.updateFields()
 
-    join_aggregate.commitChanges()
+    # segment length computed by the aggregation
+    with edit(AggregateSegment):
+        AggregateSegment.renameAttribute(AggregateSegment.fields().indexFromName("LENGTH"), "length")
 
     # save output
-    saving_gpkg(join_aggregate, reference_hydrographique_5m_layername, reference_hydrographique_5m_gpkg_path, save_selected=False)
+    saving_gpkg(AggregateSegment, reference_hydrographique_5m_layername, reference_hydrographique_5m_gpkg_path, save_selected=False)
 
     print('End : hydrological reference network 5m from hydrographic surface created')
 
@@ -443,9 +252,11 @@ create_5m_width_hydro_network(surface_hydrographique_gpkg = 'surface_hydrographi
                               reference_hydrographique_5m_gpkg = 'reference_hydrographique_5m.gpkg',
                               reference_hydrographique_5m_layername = 'reference_hydrographique_segment_5m',
                               exutoire_gpkg = 'exutoire.gpkg', 
-                              exutoire_buffer_layername = 'exutoire_buffer50',
+                              exutoire_layername = 'exutoire',
                               zone_gpkg = 'zone.gpkg',
                               zone_layername = 'rmc',
                               small_segment_filter = 500,
                               percent_stream_in_surface = 30,
-                              exutoire_stream_min_length = 10000)
+                              exutoire_stream_min_length = 10000,
+                              buffer_distance = 50,
+                              workers = None)
@@ -18,7 +18,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 -------------------------------------------------------------------------------
 """
 
-from qgis.core import QgsVectorLayer, QgsFeatureRequest
+from qgis.core import QgsVectorLayer
+
+from bdtopo2refhydro.corrections import apply_corrections
 
 # uncomment if not runned by workflow
 # wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
@@ -51,59 +53,15 @@ def fix_connection_and_direction(source_gpkg, source_layername, cible_gpkg, cibl
     :return: None
     """
     # Paths to files
-    source_path = wd + inputs + f"{source_gpkg}|layername={source_layername}"
+    source_path = wd + inputs + source_gpkg
     cible_path = wd + outputs + f"{cible_gpkg}|layername={cible_layername}"
 
-    source = QgsVectorLayer(source_path, source_layername, 'ogr')
     cible = QgsVectorLayer(cible_path, cible_layername, 'ogr')
 
-    # check 
-    for layer in source, cible:
-        if not layer.isValid():
-            raise IOError(f"{layer} n'a pas été chargée correctement")
-
-    no_duplicate = processing.run('native:deleteduplicategeometries',
-                    {
-                        'INPUT' : source,
-                        'OUTPUT': 'TEMPORARY_OUTPUT'
-                    })['OUTPUT']
-
-    # Get ids from source
-    identifiants = []
-    for feature in no_duplicate.getFeatures():
-        identifiants.append("'" + feature['cleabs'] + "'")
-
-    # check if there are already in the cible
-    nomodif = []
-    for feature in cible.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(identifiants)))):
-        nomodif.append("'" + feature['cleabs'] + "'")
-    nouvelle_liste = [id for id in identifiants + nomodif if id not in identifiants or id not in nomodif]
-    if not nomodif:
-        print('Features id to check, already in the layer to fix ' + str(nomodif))
-    else :
-        print('no features from the layer to fix, no check needed')
-
-    # Add the features not present in the cible
-    with edit(cible):
-        # get features from the source 
-        for feature in no_duplicate.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(nouvelle_liste)))):
-            fet = QgsFeature(feature)
-            fet['fid'] = None
-            cible.addFeatures([fet])
-            print(fet['cleabs'] + ' line added')
-
-    # Reverse the flow direction for the features in the target layer
-    with edit(cible):
-        for feature in cible.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(identifiants)))):
-            # Get the geometry of the feature
-            geom = feature.geometry()
-            lines = geom.asPolyline()
-            # Reverse the flow direction
-            lines.reverse()
-            newgeom = QgsGeometry.fromPolylineXY(lines)
-            # Update the geometry of the feature
-            cible.changeGeometry(feature.id(), newgeom)
-            print(feature['cleabs'] + ' line direction inversed')
+    # cleabs indexed corrections, applied in one edit transaction
+    counts = apply_corrections(source_path, cible, connection_and_direction=source_layername)
+    print(f"{counts['added']} lines added, {counts['reversed']} existing lines direction inversed")
+
     print('features fixed : connection and direction')
     return
 
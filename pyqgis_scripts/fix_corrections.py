@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from bdtopo2refhydro import stages
+from bdtopo2refhydro.stages import load_layer
+
+# uncomment if not runned by workflow
+# wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
+# inputs = 'inputs/'
+# outputs = 'outputs/'
+# corr_reseau_hydrographique_gpkg = 'corr_reseau_hydrographique.gpkg'
+# troncon_hydrographique_corr_connection_and_dir_ecoulement = 'troncon_hydrographique_corr_connection_and_dir_ecoulement'
+# troncon_hydrographique_corr_connection = 'troncon_hydrographique_corr_connection'
+# troncon_hydrographique_corr_dir_ecoulement = 'troncon_hydrographique_corr_dir_ecoulement'
+# troncon_hydrographique_corr_geom = 'troncon_hydrographique_corr_geom'
+# troncon_hydrographique_corr_suppr_canal_multichenal = 'troncon_hydrographique_corr_suppr_canal_multichenal'
+# troncon_hydrographique_cours_d_eau_corr_gpkg = 'troncon_hydrographique_cours_d_eau_corr.gpkg'
+# troncon_hydrographique_cours_d_eau_corr = 'troncon_hydrographique_cours_d_eau_corr'
+
+
+def fix_corrections(source_gpkg, connection_and_direction_layername, connection_layername, direction_layername,
+                    geometry_layername, suppression_layername, cible_gpkg, cible_layername):
+    """
+    Fix connection, direction, modified geometries and remove canals and multichenals on cible layer
+    from all the correction layers, in one edit transaction.
+    Same result as running fix_connection_and_direction, fix_connection, fix_direction, fix_modified_geom
+    and fix_suppr_canal_multichenal in this order.
+
+    :param source_gpkg: The path of the GeoPackage containing the correction layers.
+    :type source_gpkg: str
+
+    :param connection_and_direction_layername: The name of the connection and direction correction layer.
+    :type connection_and_direction_layername: str
+
+    :param connection_layername: The name of the connection correction layer.
+    :type connection_layername: str
+
+    :param direction_layername: The name of the direction correction layer.
+    :type direction_layername: str
+
+    :param geometry_layername: The name of the modified geometry correction layer.
+    :type geometry_layername: str
+
+    :param suppression_layername: The name of the canal and multichenal suppression correction layer.
+    :type suppression_layername: str
+
+    :param cible_gpkg: The path of the GeoPackage containing the target layer.
+    :type cible_gpkg: str
+
+    :param cible_layername: The name of the target layer.
+    :type cible_layername: str
+
+    :raises IOError: If the source or target layer fails to load correctly.
+
+    :return: None
+    """
+
+    # Paths to files
+    source_path = wd + inputs + source_gpkg
+    cible = load_layer(wd + outputs + cible_gpkg, cible_layername)
+
+    # cleabs indexed corrections, applied in one edit transaction
+    stages.fix_corrections(source_path, cible, connection_and_direction_layername, connection_layername,
+                           direction_layername, geometry_layername, suppression_layername)
+    return
+
+fix_corrections(corr_reseau_hydrographique_gpkg,
+                troncon_hydrographique_corr_connection_and_dir_ecoulement,
+                troncon_hydrographique_corr_connection,
+                troncon_hydrographique_corr_dir_ecoulement,
+                troncon_hydrographique_corr_geom,
+                troncon_hydrographique_corr_suppr_canal_multichenal,
+                troncon_hydrographique_cours_d_eau_corr_gpkg, troncon_hydrographique_cours_d_eau_corr)
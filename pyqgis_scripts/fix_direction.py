@@ -18,7 +18,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 -------------------------------------------------------------------------------
 """
 
-from qgis.core import QgsVectorLayer, QgsFeatureRequest
+from qgis.core import QgsVectorLayer
+
+from bdtopo2refhydro.corrections import apply_corrections
 
 # uncomment if not runned by workflow
 # wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
@@ -52,41 +54,15 @@ def fix_direction(source_gpkg, source_layername, cible_gpkg, cible_layername):
     """
 
     # Paths to files
-    source_path = wd + inputs + f"{source_gpkg}|layername={source_layername}"
+    source_path = wd + inputs + source_gpkg
     cible_path = wd + outputs + f"{cible_gpkg}|layername={cible_layername}"
 
-    source = QgsVectorLayer(source_path, source_layername, 'ogr')
     cible = QgsVectorLayer(cible_path, cible_layername, 'ogr')
 
-    # check 
-    for layer in source, cible:
-        if not layer.isValid():
-            raise IOError(f"{layer} n'a pas été chargée correctement")
-
-    no_duplicate = processing.run('native:deleteduplicategeometries',
-                   {
-                       'INPUT' : source,
-                       'OUTPUT': 'TEMPORARY_OUTPUT'
-                   })['OUTPUT']
-
-    # Get the IDs of the features in the source layer
-    identifiants = []
-    for feature in no_duplicate.getFeatures():
-        identifiants.append("'" + feature['cleabs'] + "'")
-
-    # Reverse the flow direction for the features in the target layer
-    with edit(cible):
-        for feature in cible.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(identifiants)))):
-            # Get the geometry of the feature
-            geom = feature.geometry()
-            lines = geom.asPolyline()
-            # Reverse the flow direction
-            lines.reverse()
-            newgeom = QgsGeometry.fromPolylineXY(lines)
-            # Update the geometry of the feature
-            cible.changeGeometry(feature.id(), newgeom)
-            print(feature['cleabs'] + ' line direction inversed')
-    
+    # cleabs indexed corrections, applied in one edit transaction
+    counts = apply_corrections(source_path, cible, direction=source_layername)
+    print(f"{counts['reversed']} lines direction inversed")
+
     print('features fixed : direction')
     return
 
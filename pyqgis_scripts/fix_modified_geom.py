@@ -18,7 +18,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 -------------------------------------------------------------------------------
 """
 
-from qgis.core import QgsVectorLayer, QgsFeatureRequest
+from qgis.core import QgsVectorLayer
+
+from bdtopo2refhydro.corrections import apply_corrections
 
 # uncomment if not runned by workflow
 # wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
@@ -53,39 +55,15 @@ def fix_modified_geom(source_gpkg, source_layername, cible_gpkg, cible_layername
     """
 
     # Paths to files
-    source_path = wd + inputs + f"{source_gpkg}|layername={source_layername}"
+    source_path = wd + inputs + source_gpkg
     cible_path = wd + outputs + f"{cible_gpkg}|layername={cible_layername}"
 
-    source = QgsVectorLayer(source_path, source_layername, 'ogr')
     cible = QgsVectorLayer(cible_path, cible_layername, 'ogr')
 
-    # check 
-    for layer in source, cible:
-        if not layer.isValid():
-            raise IOError(f"{layer} n'a pas été chargée correctement")
-
-    no_duplicate = processing.run('native:deleteduplicategeometries',
-                   {
-                       'INPUT' : source,
-                       'OUTPUT': 'TEMPORARY_OUTPUT'
-                   })['OUTPUT']
-
-    # Get identifiers of features in source layer
-    identifiants = []
-    for feature in no_duplicate.getFeatures():
-        identifiants.append("'" + feature['cleabs'] + "'")
-
-    # Update geometry of target layer using source layer
-    with edit(cible):
-        for feature in cible.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(identifiants)))):
-            # Get and modify identifier of the current feature in the target layer
-            id = "'" + feature['cleabs'] +"'"
-            # Get geometry from source layer that matches the identifier of the current feature in the target layer
-            geom = next(no_duplicate.getFeatures(QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(id)))).geometry()
-            # Update the geometry of the feature
-            cible.changeGeometry(feature.id(), geom)
-            print(feature['cleabs'] + ' line modified')
-        
+    # cleabs indexed corrections, applied in one edit transaction
+    counts = apply_corrections(source_path, cible, geometry=source_layername)
+    print(f"{counts['modified']} lines modified")
+
     print('features fixed : modified geom')
     return
 
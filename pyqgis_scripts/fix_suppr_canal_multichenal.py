@@ -18,7 +18,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 -------------------------------------------------------------------------------
 """
 
-from qgis.core import QgsVectorLayer, QgsFeatureRequest
+from qgis.core import QgsVectorLayer
+
+from bdtopo2refhydro.corrections import apply_corrections
 
 # uncomment if not runned by workflow
 # wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
@@ -53,43 +55,14 @@ def fix_suppr_canal_multichenal(source_gpkg, source_layername, cible_gpkg, cible
     """
 
     # Paths to files
-    source_path = wd + inputs + f"{source_gpkg}|layername={source_layername}"
+    source_path = wd + inputs + source_gpkg
     cible_path = wd + outputs + f"{cible_gpkg}|layername={cible_layername}"
 
-    source = QgsVectorLayer(source_path, source_layername, 'ogr')
     cible = QgsVectorLayer(cible_path, cible_layername, 'ogr')
 
-    # check 
-    for layer in source, cible:
-        if not layer.isValid():
-            raise IOError(f"{layer} n'a pas été chargée correctement")
-
-    no_duplicate = processing.run('native:deleteduplicategeometries',
-                   {
-                       'INPUT' : source,
-                       'OUTPUT': 'TEMPORARY_OUTPUT'
-                   })['OUTPUT']
-
-    # Get the IDs of the features in the source layer
-    identifiants = []
-    for feature in no_duplicate.getFeatures():
-        identifiants.append("'" + feature['cleabs'] + "'")
-
-    cible.startEditing()
-
-    # filter by cleabs in source
-    request = QgsFeatureRequest().setFilterExpression('"cleabs" IN ({})'.format(','.join(identifiants)))
-
-    # get feature with request
-    selected_features = [f.id() for f in cible.getFeatures(request)]
-
-    # Delete the selected features one by one
-    if selected_features:
-        for feature_id in selected_features:
-            cible.deleteFeatures([feature_id])
-
-    # Commit the changes
-    cible.commitChanges()
+    # cleabs indexed corrections, applied in one edit transaction
+    counts = apply_corrections(source_path, cible, suppression=source_layername)
+    print(f"{counts['deleted']} lines deleted")
 
     print('features fixed : suppr canal and multichenal features')
     return
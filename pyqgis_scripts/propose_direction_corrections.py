@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from bdtopo2refhydro import stages
+from bdtopo2refhydro.stages import load_layer
+
+# uncomment if not runned by workflow
+# wd = 'C:/Users/lmanie01/Documents/Gitlab/bdtopo2refhydro/'
+# outputs = 'outputs/'
+
+# troncon_hydrographique_cours_d_eau_corr_gpkg = 'troncon_hydrographique_cours_d_eau_corr.gpkg'
+# troncon_hydrographique_cours_d_eau_corr = 'troncon_hydrographique_cours_d_eau_corr'
+
+# exutoire_gpkg = 'exutoire.gpkg'
+# exutoire_layername = 'exutoire'
+# buffer_distance = 50
+
+# troncon_hydrographique_corr_dir_ecoulement_candidats = 'troncon_hydrographique_corr_dir_ecoulement_candidats'
+
+def propose_direction_corrections(troncon_corr_gpkg, troncon_corr_layername,
+                                  exutoire_gpkg, exutoire_layername,
+                                  candidats_layername, buffer_distance: float = 50):
+    """
+    Propose the troncons to reverse, from the flow directions inferred from the outlets, the digitised direction
+    and sens_de_l_ecoulement. The candidates have the schema of troncon_hydrographique_corr_dir_ecoulement.
+
+    :param troncon_corr_gpkg: The GeoPackage containing the corrected troncon layer.
+    :type troncon_corr_gpkg: str
+
+    :param troncon_corr_layername: The name of the corrected troncon layer.
+    :type troncon_corr_layername: str
+
+    :param exutoire_gpkg: The GeoPackage containing the exutoire layer.
+    :type exutoire_gpkg: str
+
+    :param exutoire_layername: The name of the exutoire line layer.
+    :type exutoire_layername: str
+
+    :param candidats_layername: The name of the candidate reversals layer, saved in troncon_corr_gpkg.
+    :type candidats_layername: str
+
+    :param buffer_distance: The outlet distance to the exutoire lines.
+    :type buffer_distance: float
+
+    :raises IOError: If the input layers fail to load correctly.
+
+    :return: None
+    """
+
+    # Paths to files
+    troncon_corr_gpkg_path = wd + outputs + f"{troncon_corr_gpkg}"
+    exutoire_gpkg_path = wd + outputs + f"{exutoire_gpkg}"
+
+    # load layer
+    troncon_corr_layer = load_layer(troncon_corr_gpkg_path, troncon_corr_layername)
+    exutoire_layer = load_layer(exutoire_gpkg_path, exutoire_layername)
+
+    stages.propose_direction_corrections(troncon_corr_layer, exutoire_layer,
+                                         troncon_corr_gpkg_path, candidats_layername,
+                                         buffer_distance=buffer_distance, quantization=100000000)
+    return
+
+propose_direction_corrections(troncon_hydrographique_cours_d_eau_corr_gpkg,
+                              troncon_hydrographique_cours_d_eau_corr,
+                              exutoire_gpkg,
+                              exutoire_layername,
+                              troncon_hydrographique_corr_dir_ecoulement_candidats,
+                              buffer_distance)
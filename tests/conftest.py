@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.benchmark.generator import synthetic_network
+from bdtopo2refhydro.nodes import identify_nodes
+
+
+@pytest.fixture(scope='session')
+def network():
+    """
+    Small synthetic network with its node ids, braids, canals, reversed and orphan reaches included.
+    """
+    network = synthetic_network(3000, seed=0)
+    network['nodea'], network['nodeb'] = identify_nodes(network['start'], network['end'])
+
+    return network
+
+
+@pytest.fixture(scope='session')
+def reachable():
+    """
+    Brute force reference: the set of edges reached from an edge by a depth-first walk, edge included.
+    """
+    def walk(nodea, nodeb, edge, upstream=False):
+        tails, heads = (nodeb, nodea) if upstream else (nodea, nodeb)
+        leaving = defaultdict(list)
+        for e, node in enumerate(tails.tolist()):
+            leaving[node].append(e)
+
+        reached, stack = {edge}, [edge]
+        while stack:
+            for e in leaving[int(heads[stack.pop()])]:
+                if e not in reached:
+                    reached.add(e)
+                    stack.append(e)
+
+        return reached
+
+    return walk
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.artifact import (line_lengths, outlet_edges, write_artifact, write_table_artifact, GraphArtifact,
+                                      META_NAME)
+from bdtopo2refhydro.columnar import write_table
+from bdtopo2refhydro.graph import connected_edges, DOWNSTREAM, UPDOWNSTREAM, UPSTREAM
+from bdtopo2refhydro.orders import network_orders
+from bdtopo2refhydro.principal_stem import principal_stem
+
+
+@pytest.fixture(scope='module')
+def graph(network, tmp_path_factory):
+    nodea, nodeb, length = network['nodea'], network['nodeb'], network['length']
+    connected = connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM)
+    stem = connected[principal_stem(nodea[connected], nodeb[connected], length[connected])]
+    path = str(tmp_path_factory.mktemp('artifact') / 'graph')
+
+    # node ids shifted, the artifact renumbers them from 0
+    write_artifact(path, nodea[stem] + 1000, nodeb[stem] + 1000, length[stem], fid=stem + 1,
+                   cleabs=network['cleabs'][stem].tolist(), meta={'crs': 'EPSG:2154'})
+
+    return GraphArtifact(path), nodea[stem], nodeb[stem], length[stem]
+
+
+def test_outlet_edges():
+    # 0 -> 1 -> 2 and 3 -> 1, 4 -> 5 -> 4 cycle
+    nodea = np.array([0, 1, 3, 4, 5])
+    nodeb = np.array([1, 2, 1, 5, 4])
+
+    assert outlet_edges(nodea, nodeb).tolist() == [1, 1, 1, -1, -1]
+
+
+def test_artifact_arrays(graph):
+    artifact, nodea, nodeb, length = graph
+
+    assert len(artifact) == len(nodea)
+    assert artifact.meta['crs'] == 'EPSG:2154'
+    assert artifact.nodea.min() == 0 and artifact.meta['nodes'] == len(np.union1d(nodea, nodeb))
+    np.testing.assert_array_equal(artifact.length, length)
+    np.testing.assert_array_equal(artifact.strahler, network_orders(nodea, nodeb, length)['STRAHLER'])
+    # the renumbering is one to one, the topology is unchanged
+    renumbered = np.unique(np.column_stack([np.concatenate([nodea, nodeb]),
+                                            np.concatenate([artifact.nodea, artifact.nodeb])]), axis=0)
+    assert len(renumbered) == len(np.unique(renumbered[:, 0])) == len(np.unique(renumbered[:, 1]))
+
+
+def test_artifact_queries_match_the_traversal(graph):
+    artifact, nodea, nodeb, _ = graph
+
+    for edge in range(0, len(artifact), 50):
+        upstream = connected_edges(nodea, nodeb, [edge], direction=UPSTREAM)
+        assert artifact.upstream([edge]).tolist() == upstream.tolist()
+        assert artifact.downstream([edge]).tolist() == connected_edges(nodea, nodeb, [edge],
+                                                                        direction=DOWNSTREAM).tolist()
+        assert np.flatnonzero(artifact.is_upstream(np.arange(len(artifact)), edge)).tolist() == upstream.tolist()
+        assert edge in artifact.drainage(artifact.outlet[edge]).tolist()
+
+
+def test_artifact_edge_index(graph):
+    artifact = graph[0]
+
+    assert artifact.edge_index(artifact.fid[[5, 2]]).tolist() == [5, 2]
+    assert artifact.edge_index([0, -3]).tolist() == [-1, -1]
+
+
+def test_artifact_version_is_checked(tmp_path):
+    path = str(tmp_path / 'graph')
+    write_artifact(path, np.array([0]), np.array([1]), np.array([1.0]))
+    with open(os.path.join(path, META_NAME)) as f:
+        meta = json.load(f)
+    meta['version'] += 1
+    with open(os.path.join(path, META_NAME), 'w') as f:
+        json.dump(meta, f)
+
+    with pytest.raises(IOError):
+        GraphArtifact(path)
+    with pytest.raises(IOError):
+        GraphArtifact(str(tmp_path / 'missing'))
+
+
+def test_line_lengths():
+    coordinates = np.array([[0.0, 0.0, 1.0], [3.0, 4.0, 9.0], [3.0, 4.0, 0.0], [3.0, 5.0, 0.0], [6.0, 9.0, 0.0]])
+
+    np.testing.assert_allclose(line_lengths(coordinates, np.array([0, 2, 2, 5])), [5.0, 0.0, 6.0])
+    assert line_lengths(np.empty((0, 2)), np.array([0, 0])).tolist() == [0.0]
+
+
+def test_table_artifact(tmp_path):
+    pytest.importorskip('pyarrow')
+    coordinates = np.array([[0.0, 0.0], [3.0, 4.0], [3.0, 4.0], [3.0, 5.0], [6.0, 9.0]])
+    offsets = np.array([0, 2, 5])
+    table_path = str(tmp_path / 'troncon.arrow')
+
+    write_table(table_path, {'NODEA': np.array([0, 1]), 'NODEB': np.array([1, 2]), 'fid': [7, 3],
+                             'cleabs': ['TRONCON1', None], 'nature': ['a', 'b']},
+                coordinates=coordinates, offsets=offsets)
+    meta = write_table_artifact(str(tmp_path / 'graph'), table_path, meta={'crs': 'EPSG:2154'})
+
+    table_artifact = GraphArtifact(str(tmp_path / 'graph'))
+    assert meta['crs'] == 'EPSG:2154' and meta['table'] == 'troncon.arrow'
+    assert table_artifact.fid.tolist() == [7, 3]
+    assert table_artifact.cleabs.tolist() == [b'TRONCON1', b'']
+    np.testing.assert_allclose(table_artifact.length, [5.0, 6.0])
+    assert table_artifact.upstream([1]).tolist() == [0, 1]
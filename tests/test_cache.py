@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import sqlite3
+
+from bdtopo2refhydro.cache import StageCache
+
+
+def write_layer(path, name, rows):
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(f'DROP TABLE IF EXISTS "{name}"')
+        connection.execute(f'CREATE TABLE "{name}" (fid INTEGER PRIMARY KEY, cleabs TEXT)')
+        connection.executemany(f'INSERT INTO "{name}" VALUES (?, ?)', rows)
+    connection.close()
+
+
+def test_stage_is_fresh_until_an_input_or_output_changes(tmp_path):
+    gpkg = str(tmp_path / 'layers.gpkg')
+    write_layer(gpkg, 'troncon', [(1, 'A'), (2, 'B')])
+    write_layer(gpkg, 'troncon_corr', [(1, 'A')])
+    inputs, outputs = [(gpkg, 'troncon')], [(gpkg, 'troncon_corr')]
+    cache = StageCache(str(tmp_path))
+
+    assert not cache.is_fresh('fix_corrections', inputs, outputs)
+    cache.record('fix_corrections', cache.digests(inputs), outputs)
+    assert StageCache(str(tmp_path)).is_fresh('fix_corrections', inputs, outputs)
+    assert not cache.is_fresh('fix_corrections', inputs, outputs, {'quantization': 10})
+
+    write_layer(gpkg, 'troncon_corr', [(1, 'B')])
+    assert not cache.is_fresh('fix_corrections', inputs, outputs)
+    cache.record('fix_corrections', cache.digests(inputs), outputs)
+
+    write_layer(gpkg, 'troncon', [(1, 'A')])
+    assert not cache.is_fresh('fix_corrections', inputs, outputs)
+
+    cache.invalidate('fix_corrections')
+    assert 'fix_corrections' not in StageCache(str(tmp_path)).manifest
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro import columnar
+from bdtopo2refhydro.columnar import geo_metadata, read_columns, read_lines, read_wkb, write_table, GEOMETRY_COLUMN
+
+pa = pytest.importorskip('pyarrow')
+shapely = pytest.importorskip('shapely')
+
+
+def test_columnar_round_trip(network, tmp_path):
+    path = str(tmp_path / 'network.arrow')
+
+    write_table(path, {'NODEA': network['nodea'], 'NODEB': network['nodeb'], 'nature': network['nature'].tolist()},
+                coordinates=network['coordinates'], offsets=network['offsets'])
+
+    columns = read_columns(path, ['NODEA', 'NODEB', 'nature'])
+    np.testing.assert_array_equal(columns['NODEA'], network['nodea'])
+    np.testing.assert_array_equal(columns['NODEB'], network['nodeb'])
+    assert columns['nature'].tolist() == network['nature'].tolist()
+
+    coordinates, offsets = read_lines(path)
+    np.testing.assert_array_equal(coordinates, network['coordinates'])
+    np.testing.assert_array_equal(offsets, network['offsets'])
+
+    wkb = read_wkb(path)
+    lines = shapely.from_wkb(list(wkb[:10]))
+    for i, line in enumerate(lines):
+        np.testing.assert_array_equal(shapely.get_coordinates(line),
+                                      network['coordinates'][network['offsets'][i]:network['offsets'][i + 1]])
+
+
+def test_geo_metadata(tmp_path, monkeypatch):
+    path = str(tmp_path / 'lines.arrow')
+    # without pyproj the crs is unknown, written as null
+    monkeypatch.setattr(columnar, 'pyproj', None)
+
+    write_table(path, {'NODEA': np.arange(2)}, coordinates=np.zeros((4, 3)), offsets=np.array([0, 2, 4]),
+                crs='EPSG:2154')
+
+    geo = geo_metadata(path)
+    assert geo['version'] == '1.1.0'
+    assert geo['primary_column'] == GEOMETRY_COLUMN
+    assert geo['columns'][GEOMETRY_COLUMN]['encoding'] == 'linestring'
+    assert geo['columns'][GEOMETRY_COLUMN]['geometry_types'] == ['LineString Z']
+    assert 'crs' in geo['columns'][GEOMETRY_COLUMN] and geo['columns'][GEOMETRY_COLUMN]['crs'] is None
+
+    write_table(path, {'NODEA': np.arange(2)}, coordinates=np.zeros((4, 2)), offsets=np.array([0, 2, 4]),
+                crs={'type': 'ProjectedCRS'})
+    assert geo_metadata(path)['columns'][GEOMETRY_COLUMN]['crs'] == {'type': 'ProjectedCRS'}
+
+
+def test_read_lines_of_several_record_batches(tmp_path):
+    path = str(tmp_path / 'batches.arrow')
+    coordinates = np.arange(18, dtype=np.float64).reshape(9, 2)
+    offsets = np.array([0, 2, 5, 7, 9])
+    table = pa.table({GEOMETRY_COLUMN: columnar._line_array(coordinates, offsets)})
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=3)
+
+    lines, line_offsets = read_lines(path)
+
+    np.testing.assert_array_equal(lines, coordinates)
+    np.testing.assert_array_equal(line_offsets, offsets)
+
+
+def test_wkb_geometries(tmp_path):
+    path = str(tmp_path / 'wkb.arrow')
+    wkb = [shapely.to_wkb(shapely.linestrings([[0.0, 0.0], [1.0, 1.0]]))]
+
+    write_table(path, {'NODEA': [0]}, wkb=wkb)
+
+    assert geo_metadata(path)['columns'][GEOMETRY_COLUMN]['encoding'] == 'WKB'
+    assert read_wkb(path).tolist() == wkb
+    with pytest.raises(ValueError):
+        read_lines(path)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.dedup import duplicate_report, duplicates, line_digests
+
+
+def test_reversed_lines_are_duplicates():
+    coordinates = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 0.0],
+                            [2.0, 0.0], [1.0, 1.0], [0.0, 0.0],
+                            [0.0, 0.0], [1.0, 1.5], [2.0, 0.0]])
+    offsets = np.array([0, 3, 6, 9])
+
+    keep, first = duplicates(line_digests(coordinates, offsets))
+
+    assert keep.tolist() == [True, False, True]
+    assert first.tolist() == [0, 0, 2]
+
+
+def test_quantized_lines_are_duplicates():
+    coordinates = np.array([[0.0, 0.0], [10.0, 10.0], [1e-9, 0.0], [10.0, 10.0]])
+    offsets = np.array([0, 2, 4])
+
+    assert duplicates(line_digests(coordinates, offsets))[0].tolist() == [True, True]
+    assert duplicates(line_digests(coordinates, offsets, quantization=1000))[0].tolist() == [True, False]
+
+
+def test_z_is_ignored():
+    # as native:deleteduplicategeometries, the lines are compared in 2d
+    coordinates = np.array([[0.0, 0.0, 5.0], [1.0, 0.0, 6.0], [0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    offsets = np.array([0, 2, 4])
+
+    assert np.all(line_digests(coordinates, offsets) == line_digests(coordinates[:, :2], offsets))
+    assert duplicates(line_digests(coordinates, offsets))[0].tolist() == [True, False]
+
+
+def test_duplicates_of_the_synthetic_network(network):
+    coordinates, offsets = network['coordinates'], network['offsets']
+    count = len(offsets) - 1
+    # the first 100 lines copied again, reversed
+    copies = [coordinates[offsets[i]:offsets[i + 1]][::-1] for i in range(100)]
+    coordinates = np.concatenate([coordinates] + copies)
+    offsets = np.concatenate([offsets, offsets[-1] + np.cumsum([len(copy) for copy in copies])])
+
+    keep, first = duplicates(line_digests(coordinates, offsets, quantization=100000000))
+    report = duplicate_report(np.arange(1, len(keep) + 1), keep, first)
+
+    assert np.all(keep[:count])
+    assert report['duplicates'] == 100
+    assert report['pairs'][:2] == [[count + 1, 1], [count + 2, 2]]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from bdtopo2refhydro.directions import (attribute_directions, infer_directions, outlet_distances, reversal_candidates,
+                                        ATTRIBUTE, CONFIRMED, INFERRED)
+
+
+def test_outlet_distances_match_breadth_first_search(network):
+    nodea, nodeb = network['nodea'], network['nodeb']
+    outlet_nodes = nodeb[network['outlets']]
+
+    distance = outlet_distances(nodea, nodeb, outlet_nodes)
+
+    neighbours = defaultdict(set)
+    for a, b in zip(nodea.tolist(), nodeb.tolist()):
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+    expected = np.full(len(distance), -1)
+    frontier, level = set(outlet_nodes.tolist()), 0
+    while frontier:
+        expected[list(frontier)] = level
+        frontier = {n for m in frontier for n in neighbours[m] if expected[n] == -1}
+        level += 1
+
+    assert distance.tolist() == expected.tolist()
+
+
+def test_infer_directions():
+    # outlet node 0: 1 -> 0 and 3 -> 2 flow downstream, 1 -> 2 is digitised upstream, 4 -> 5 is not connected
+    nodea = np.array([1, 1, 3, 4])
+    nodeb = np.array([0, 2, 2, 5])
+
+    assert infer_directions(nodea, nodeb, np.array([0])).tolist() == [1, -1, 1, 0]
+    subset = np.array([True, True, False, True])
+    assert infer_directions(nodea, nodeb, np.array([0]), subset=subset).tolist() == [1, -1, 0, 0]
+
+
+def test_attribute_directions():
+    values = np.array(['Sens direct', 'Inverse', None, 'Double sens', ' sens inverse '], dtype=object)
+
+    assert attribute_directions(values).tolist() == [1, -1, 0, 0, -1]
+
+
+def test_reversal_candidates():
+    inferred = np.array([-1, -1, 0, 1, 0])
+    attribute = np.array([-1, 0, -1, -1, 0])
+
+    assert reversal_candidates(inferred, attribute).tolist() == [CONFIRMED, INFERRED, ATTRIBUTE, 0, 0]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.gaps import disconnected_components, downstream_endpoints, find_gaps, EXUTOIRE, NETWORK
+from bdtopo2refhydro.graph import connected_edges, UPDOWNSTREAM
+
+shapely = pytest.importorskip('shapely')
+
+
+def test_downstream_endpoints():
+    # 1 -> 2 -> 3 with a confluence 4 -> 2, the cycle 5 -> 6 -> 5 and the connected 0 -> 7
+    nodea = np.array([1, 2, 4, 5, 6, 0])
+    nodeb = np.array([2, 3, 2, 6, 5, 7])
+
+    labels = disconnected_components(nodea, nodeb, np.array([False] * 5 + [True]))
+    nodes, components = downstream_endpoints(nodea, nodeb, labels)
+
+    assert labels.tolist() == [1, 1, 1, 5, 5, -1]
+    assert nodes.tolist() == [3, 5, 6]
+    assert components.tolist() == [1, 5, 5]
+
+
+def test_find_gaps():
+    # connected 0 -> 1, a component ending near the exutoire, one near node 1 and one too far from both
+    nodea = np.array([0, 2, 4, 6])
+    nodeb = np.array([1, 3, 5, 7])
+    start = np.array([[0.0, 0.0], [0.0, 5.0], [20.0, 0.0], [5000.0, 5000.0]])
+    end = np.array([[10.0, 0.0], [3.0, 5.0], [12.0, 0.0], [5001.0, 5000.0]])
+    exutoire = [shapely.to_wkb(shapely.linestrings([[3.0, 7.0], [10.0, 7.0]]))]
+
+    gaps = find_gaps(nodea, nodeb, start, end, np.ones(4), np.array([True, False, False, False]), exutoire)
+
+    assert gaps['component'].tolist() == [2, 4, 6]
+    assert gaps['node'].tolist() == [3, 5, 7]
+    assert gaps['target'].tolist() == [EXUTOIRE, NETWORK, None]
+    np.testing.assert_allclose(gaps['distance'], [2.0, 2.0, np.inf])
+    np.testing.assert_allclose(gaps['target_point'][:2], [[3.0, 7.0], [10.0, 0.0]])
+    assert gaps['network_node'].tolist() == [0, 1, -1]
+
+
+def test_find_gaps_excludes_the_own_start_node():
+    # connected 0 -> 1, the branch 1 -> 2 -> 3 leaving node 1 and turning back near it, 5 -> 6 ending near node 1
+    nodea = np.array([0, 1, 2, 5])
+    nodeb = np.array([1, 2, 3, 6])
+    start = np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [20.0, -2.0]])
+    end = np.array([[10.0, 0.0], [10.0, 10.0], [11.0, 1.0], [10.0, -2.0]])
+
+    gaps = find_gaps(nodea, nodeb, start, end, np.ones(4), np.array([True, False, False, False]))
+
+    assert gaps['component'].tolist() == [5, 1]
+    assert gaps['node'].tolist() == [6, 3]
+    assert gaps['network_node'].tolist() == [1, 0]
+    np.testing.assert_allclose(gaps['distance'], [2.0, np.hypot(11.0, 1.0)])
+
+
+def test_find_gaps_nearest_network_node(network):
+    nodea, nodeb, start, end = network['nodea'], network['nodeb'], network['start'], network['end']
+    connected = np.zeros(len(nodea), dtype=bool)
+    connected[connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM)] = True
+
+    gaps = find_gaps(nodea, nodeb, start, end, network['length'], connected, network['exutoire'], max_distance=None)
+
+    assert len(gaps['component'])
+    assert len(gaps['component']) == len(np.unique(disconnected_components(nodea, nodeb, connected))) - 1
+    assert np.all(np.diff(gaps['distance']) >= 0)
+    # brute force, the connected nodes out of the component
+    labels = disconnected_components(nodea, nodeb, connected)
+    nodes = np.concatenate([nodea[connected], nodeb[connected]])
+    position = np.concatenate([start[connected], end[connected]])
+    for component, point, distance in zip(gaps['component'], gaps['point'], gaps['network_distance']):
+        own = np.isin(nodes, np.concatenate([nodea[labels == component], nodeb[labels == component]]))
+        assert distance == pytest.approx(np.hypot(*(position[~own] - point).T).min())
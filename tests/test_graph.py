@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.graph import (connected_edges, csr, dijkstra, fix_network_connectivity, gather,
+                                   topological_levels, DOWNSTREAM, UPDOWNSTREAM, UPSTREAM)
+
+
+def test_csr_groups_items_by_key():
+    keys = np.array([2, 0, 2, 1, 0])
+
+    indptr, items = csr(keys, 4)
+
+    assert [items[indptr[k]:indptr[k + 1]].tolist() for k in range(4)] == [[1, 4], [3], [0, 2], []]
+    assert gather(indptr, items, np.array([2, 3, 0])).tolist() == [0, 2, 1, 4]
+    assert gather(indptr, items, np.array([3])).tolist() == []
+
+
+@pytest.mark.parametrize('direction', [UPSTREAM, DOWNSTREAM, UPDOWNSTREAM])
+def test_connected_edges_matches_depth_first_walk(network, reachable, direction):
+    nodea, nodeb, outlets = network['nodea'], network['nodeb'], network['outlets']
+
+    expected = set()
+    for outlet in outlets.tolist():
+        if direction != DOWNSTREAM:
+            expected |= reachable(nodea, nodeb, outlet, upstream=True)
+        if direction != UPSTREAM:
+            expected |= reachable(nodea, nodeb, outlet)
+
+    assert connected_edges(nodea, nodeb, outlets, direction=direction).tolist() == sorted(expected)
+
+
+def test_fix_network_connectivity_adds_the_shortest_route():
+    # subset 0 -> 1 and 4 -> 5, two routes from 1 to 4 (one and three reaches) and a side branch 1 -> 6
+    nodea = np.array([0, 1, 1, 2, 3, 4, 1])
+    nodeb = np.array([1, 4, 2, 3, 4, 5, 6])
+    subset = np.array([True, False, False, False, False, True, False])
+
+    fixed = fix_network_connectivity(nodea, nodeb, subset)
+
+    assert np.flatnonzero(fixed).tolist() == [0, 1, 5]
+
+
+def test_fix_network_connectivity_links_the_dangling_ends(network, reachable):
+    nodea, nodeb = network['nodea'], network['nodeb']
+    subset = np.random.default_rng(0).random(len(nodea)) < 0.7
+
+    fixed = fix_network_connectivity(nodea, nodeb, subset)
+
+    assert np.all(fixed[subset])
+    targets = set(nodea[subset].tolist())
+    checked = 0
+    for edge in np.flatnonzero(subset)[:200].tolist():
+        if int(nodeb[edge]) in targets:
+            continue
+        # the end reaches the subset in the fixed network if it does in the full network
+        downstream = {int(nodea[e]) for e in reachable(nodea, nodeb, edge) if e != edge}
+        kept = np.flatnonzero(fixed)
+        route = reachable(nodea[kept], nodeb[kept], int(np.searchsorted(kept, edge)))
+        route = {int(nodea[kept[e]]) for e in route if kept[e] != edge}
+        assert bool(downstream & targets) == bool(route & targets)
+        checked += 1
+    assert checked
+
+
+def test_dijkstra_matches_bellman_ford():
+    rng = np.random.default_rng(2)
+    size, count = 60, 240
+    tails, heads = rng.integers(0, size, count), rng.integers(0, size, count)
+    weights = rng.uniform(0.1, 10, count)
+    sources = np.array([0, 7])
+
+    indptr, edges = csr(tails, size)
+    distance, predecessor = dijkstra(indptr, edges, heads, weights, sources)
+
+    expected = np.full(size, np.inf)
+    expected[sources] = 0
+    for _ in range(size):
+        np.minimum.at(expected, heads, expected[tails] + weights)
+    np.testing.assert_allclose(distance, expected)
+
+    # the predecessor edge ends the shortest path
+    reached = np.flatnonzero(predecessor >= 0)
+    np.testing.assert_allclose(distance[tails[predecessor[reached]]] + weights[predecessor[reached]],
+                               distance[reached])
+    assert np.all(heads[predecessor[reached]] == reached)
+
+
+def test_topological_levels_order_the_edges(network):
+    nodea, nodeb = network['nodea'], network['nodeb']
+
+    levels = topological_levels(nodea, nodeb)
+
+    level = np.full(len(nodea), -1)
+    for index, edges in enumerate(levels):
+        assert np.all(level[edges] == -1)
+        level[edges] = index
+    assert np.count_nonzero(level >= 0) > 0.9 * len(nodea)
+    # every edge flowing into the from node of a sorted edge is in a previous level
+    for edge in np.flatnonzero(level >= 0).tolist():
+        upstream = level[nodeb == nodea[edge]]
+        assert np.all((upstream >= 0) & (upstream < level[edge]))
+
+
+def test_topological_levels_skip_the_cycles():
+    # 0 -> 1 -> 2 -> 0 cycle, 3 -> 0 flows into it and 2 -> 4 out of it
+    nodea = np.array([0, 1, 2, 3, 2])
+    nodeb = np.array([1, 2, 0, 0, 4])
+
+    levels = topological_levels(nodea, nodeb)
+
+    assert [edges.tolist() for edges in levels] == [[3]]
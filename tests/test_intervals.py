@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.graph import connected_edges, UPDOWNSTREAM, UPSTREAM
+from bdtopo2refhydro.intervals import downstream_edges, nested_intervals
+from bdtopo2refhydro.principal_stem import principal_stem
+
+
+def test_downstream_edges():
+    nodea = np.array([0, 1, 2, 2, 3])
+    nodeb = np.array([2, 2, 3, 4, 5])
+
+    assert downstream_edges(nodea, nodeb).tolist() == [2, 2, 4, -1, -1]
+
+
+def test_nested_intervals_match_upstream_walk(network):
+    nodea, nodeb, length = network['nodea'], network['nodeb'], network['length']
+    connected = connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM)
+    stem = connected[principal_stem(nodea[connected], nodeb[connected], length[connected])]
+    nodea, nodeb = nodea[stem], nodeb[stem]
+
+    intervals = nested_intervals(nodea, nodeb)
+    entry, exit_ = intervals['DFS_ENTRY'], intervals['DFS_EXIT']
+
+    assert sorted(entry.tolist()) == list(range(len(nodea)))
+    for edge in range(0, len(nodea), 25):
+        upstream = np.flatnonzero((entry >= entry[edge]) & (entry <= exit_[edge]))
+        assert upstream.tolist() == connected_edges(nodea, nodeb, [edge], direction=UPSTREAM).tolist()
+
+
+def test_nested_intervals_leave_out_the_cycles():
+    # 0 -> 1 -> 0 cycle flowing into 1 -> 2, and a separate reach 3 -> 4
+    nodea = np.array([0, 1, 1, 3])
+    nodeb = np.array([1, 0, 2, 4])
+
+    intervals = nested_intervals(nodea, nodeb)
+
+    assert intervals['DFS_ENTRY'].tolist() == [-1, -1, -1, 0]
+    assert intervals['DFS_EXIT'].tolist() == [-1, -1, -1, 0]
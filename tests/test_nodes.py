@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.nodes import identify_nodes, near_pairs, quantize, snap_nodes
+
+
+def test_identify_nodes_shared_endpoints():
+    start = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 0.0]])
+    end = np.array([[1.0, 0.0], [2.0, 0.0], [1.0, 1.0]])
+
+    nodea, nodeb = identify_nodes(start, end)
+
+    assert nodea.tolist() == [0, 1, 1]
+    assert nodeb.tolist() == [1, 2, 3]
+
+
+def test_quantize_merges_close_points():
+    points = np.array([[0.0, 0.0], [1e-10, 0.0], [1.0, 1.0]])
+
+    keys = quantize(points, (0.0, 0.0, 1.0, 1.0), quantization=1000)
+
+    assert keys[0].tolist() == keys[1].tolist() != keys[2].tolist()
+
+
+def test_near_pairs_matches_brute_force():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 20, (500, 2))
+
+    pairs, distance = near_pairs(points, 1.0)
+
+    full = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+    i, j = np.nonzero(np.triu(full <= 1.0, k=1))
+    assert sorted(map(tuple, pairs.tolist())) == sorted(zip(i.tolist(), j.tolist()))
+    np.testing.assert_allclose(distance, full[pairs[:, 0], pairs[:, 1]])
+
+
+def test_snap_nodes_closes_gap():
+    start = np.array([[0.0, 0.0], [1.2, 0.0]])
+    end = np.array([[1.0, 0.0], [2.0, 0.0]])
+    nodea, nodeb = identify_nodes(start, end)
+
+    nodea, nodeb, snapped = snap_nodes(nodea, nodeb, start, end, tolerance=0.5)
+
+    assert nodeb[0] == nodea[1]
+    assert len(snapped['distance']) == 1
+
+
+def test_snap_nodes_never_collapses_an_edge_through_a_chain():
+    # edge 0 is longer than the tolerance, but both of its nodes are near the start of edge 1
+    start = np.array([[0.0, 0.0], [0.75, 0.3]])
+    end = np.array([[1.5, 0.0], [3.0, 3.0]])
+    nodea, nodeb = identify_nodes(start, end)
+
+    nodea, nodeb, snapped = snap_nodes(nodea, nodeb, start, end, tolerance=1.0)
+
+    assert nodea[0] != nodeb[0]
+    assert len(snapped['distance']) == 1
+
+
+def test_snap_nodes_never_collapses_random_edges():
+    rng = np.random.default_rng(1)
+    start = rng.uniform(0, 30, (400, 2))
+    end = start + rng.normal(0, 1.5, (400, 2))
+    nodea, nodeb = identify_nodes(start, end)
+
+    snapped_nodea, snapped_nodeb, _ = snap_nodes(nodea, nodeb, start, end, tolerance=1.0)
+
+    assert np.all(snapped_nodea != snapped_nodeb)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.graph import connected_edges, UPDOWNSTREAM
+from bdtopo2refhydro.orders import network_orders, upstream_accumulation
+from bdtopo2refhydro.principal_stem import principal_stem
+
+# two confluences, 0 and 1 join at node 2, then 2 and 3 at node 4
+NODEA = np.array([0, 1, 2, 3, 4])
+NODEB = np.array([2, 2, 4, 4, 5])
+LENGTH = np.array([1.0, 2.0, 1.0, 5.0, 1.0])
+
+
+@pytest.fixture(scope='module')
+def stem(network):
+    nodea, nodeb, length = network['nodea'], network['nodeb'], network['length']
+    connected = connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM)
+    stem = connected[principal_stem(nodea[connected], nodeb[connected], length[connected])]
+
+    return nodea[stem], nodeb[stem], length[stem]
+
+
+def test_network_orders():
+    orders = network_orders(NODEA, NODEB, LENGTH)
+
+    assert orders['STRAHLER'].tolist() == [1, 1, 2, 1, 2]
+    assert orders['MEASURE'].tolist() == [2.0, 2.0, 1.0, 1.0, 0.0]
+    assert orders['UPLENGTH'].tolist() == [1.0, 2.0, 3.0, 5.0, 6.0]
+    # the main stem follows the longest flow path, 4 then 3
+    assert orders['HACK'].tolist() == [3, 2, 2, 1, 1]
+    assert orders['AXIS'].tolist() == [0, 2, 2, 4, 4]
+    assert orders['LAXIS'].tolist() == [1.0, 3.0, 3.0, 6.0, 6.0]
+
+
+def test_network_orders_skip_the_cycles():
+    # 0 -> 1 -> 0 cycle flowing into 1 -> 2
+    orders = network_orders(np.array([0, 1, 1]), np.array([1, 0, 2]), np.ones(3))
+
+    assert orders['STRAHLER'].tolist() == [0, 0, 0]
+    assert np.all(np.isnan(orders['MEASURE']))
+
+
+def test_upstream_accumulation():
+    accumulation = upstream_accumulation(NODEA, NODEB, LENGTH)
+
+    assert accumulation['CUMLENGTH'].tolist() == [1.0, 2.0, 4.0, 5.0, 10.0]
+    assert accumulation['UPCOUNT'].tolist() == [1, 1, 3, 1, 5]
+    assert accumulation['UPLENGTH'].tolist() == [1.0, 2.0, 3.0, 5.0, 6.0]
+
+
+def test_upstream_accumulation_matches_depth_first_walk(stem, reachable):
+    nodea, nodeb, length = stem
+
+    accumulation = upstream_accumulation(nodea, nodeb, length)
+
+    np.testing.assert_array_equal(accumulation['UPLENGTH'], network_orders(nodea, nodeb, length)['UPLENGTH'])
+    for edge in range(0, len(nodea), 25):
+        upstream = sorted(reachable(nodea, nodeb, edge, upstream=True))
+        assert accumulation['UPCOUNT'][edge] == len(upstream)
+        assert accumulation['CUMLENGTH'][edge] == pytest.approx(length[upstream].sum())
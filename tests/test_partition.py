@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from bdtopo2refhydro.partition import build_partition, drainage_partitions, partitioned_build, weak_components
+
+
+def test_weak_components_match_breadth_first_search(network):
+    nodea, nodeb = network['nodea'], network['nodeb']
+
+    label = weak_components(nodea, nodeb)
+
+    neighbours = defaultdict(set)
+    for a, b in zip(nodea.tolist(), nodeb.tolist()):
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+    component = {}
+    for node in sorted(neighbours):
+        if node in component:
+            continue
+        members, frontier = {node}, [node]
+        while frontier:
+            frontier = [n for m in frontier for n in neighbours[m] if n not in members]
+            members.update(frontier)
+        for member in members:
+            component[member] = min(members)
+
+    assert label.tolist() == [component[a] for a in nodea.tolist()]
+
+
+def test_drainage_partitions_leave_out_the_orphans():
+    # two drained components and an orphan reach 6 -> 7
+    nodea = np.array([0, 1, 3, 6, 4])
+    nodeb = np.array([1, 2, 4, 7, 5])
+
+    partitions = drainage_partitions(nodea, nodeb, np.array([1, 4]))
+
+    assert [partition.tolist() for partition in partitions] == [[0, 1], [2, 4]]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_partitioned_build_matches_the_whole_build(network, workers):
+    nodea, nodeb, length, outlets = network['nodea'], network['nodeb'], network['length'], network['outlets']
+
+    expected = build_partition(nodea, nodeb, length, outlets)
+    result = partitioned_build(nodea, nodeb, length, outlets, workers=workers, task_size=500)
+
+    for expected_array, array in zip(expected, result):
+        assert array.tolist() == expected_array.tolist()
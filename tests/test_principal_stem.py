@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.graph import connected_edges, UPDOWNSTREAM
+from bdtopo2refhydro.principal_stem import principal_stem
+
+
+def test_principal_stem_keeps_the_shortest_channel():
+    # braid between nodes 1 and 2: one reach of length 5 or two reaches of length 1
+    nodea = np.array([0, 1, 1, 3, 2])
+    nodeb = np.array([1, 2, 3, 2, 4])
+    cost = np.array([1.0, 5.0, 1.0, 1.0, 1.0])
+
+    assert principal_stem(nodea, nodeb, cost).tolist() == [0, 2, 3, 4]
+
+
+def test_principal_stem_removes_every_diffluence(network):
+    nodea, nodeb, length = network['nodea'], network['nodeb'], network['length']
+    connected = connected_edges(nodea, nodeb, network['outlets'], direction=UPDOWNSTREAM)
+
+    stem = connected[principal_stem(nodea[connected], nodeb[connected], length[connected])]
+
+    assert len(np.unique(nodea[stem])) == len(stem)
+    # the sources of the connected network are all kept
+    sources = np.setdiff1d(nodea[connected], nodeb[connected])
+    assert np.all(np.isin(sources, nodea[stem]))
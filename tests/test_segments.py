@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.segments import aggregate_segments, merge_lines
+
+
+def test_aggregate_segments_splits_at_confluences_and_diffluences():
+    # chain 0 -> 1 -> 2, confluence of 3 -> 2 and diffluence of 2 -> 4 and 2 -> 5
+    nodea = np.array([0, 1, 2, 3, 2])
+    nodeb = np.array([1, 2, 4, 2, 5])
+
+    segment, position = aggregate_segments(nodea, nodeb)
+
+    assert segment.tolist() == [0, 0, 1, 2, 3]
+    assert position.tolist() == [0, 1, 0, 0, 0]
+
+
+def test_aggregate_segments_splits_where_the_category_changes():
+    nodea = np.array([0, 1, 2])
+    nodeb = np.array([1, 2, 3])
+
+    segment, position = aggregate_segments(nodea, nodeb, category=np.array([1, 1, 2]))
+
+    assert segment.tolist() == [0, 0, 1]
+    assert position.tolist() == [0, 1, 0]
+
+
+def test_merge_lines_drops_the_shared_vertices():
+    # edge 1 is upstream of edge 0 in the same segment
+    coordinates = np.array([[1.0, 0.0], [2.0, 0.0], [0.0, 0.0], [0.5, 0.0], [1.0, 0.0], [5.0, 5.0], [6.0, 6.0]])
+    offsets = np.array([0, 2, 5, 7])
+
+    order, segment_coordinates, segment_offsets = merge_lines(coordinates, offsets, np.array([0, 0, 1]),
+                                                             np.array([1, 0, 0]))
+
+    assert order.tolist() == [1, 0, 2]
+    assert segment_offsets.tolist() == [0, 4, 6]
+    assert segment_coordinates[:4, 0].tolist() == [0.0, 0.5, 1.0, 2.0]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+from bdtopo2refhydro.validation import (cycle_components, error_counts, error_labels, validate_network,
+                                        CONFLICT, CYCLE, ORPHAN, SINK, SOURCE)
+
+
+def test_cycle_components_match_mutual_reachability(reachable):
+    rng = np.random.default_rng(3)
+    nodea, nodeb = rng.integers(0, 40, 60), rng.integers(0, 40, 60)
+
+    labels = cycle_components(nodea, nodeb)
+
+    # nodes reached downstream of each edge, the edge is in a cycle if its from node is one of them
+    reached = [{int(nodeb[e]) for e in reachable(nodea, nodeb, edge)} for edge in range(len(nodea))]
+    in_cycle = [int(nodea[edge]) in reached[edge] for edge in range(len(nodea))]
+    assert any(in_cycle)
+    assert (labels >= 0).tolist() == in_cycle
+    for i in np.flatnonzero(labels >= 0).tolist():
+        for j in np.flatnonzero(labels >= 0).tolist():
+            same = int(nodea[j]) in reached[i] and int(nodea[i]) in reached[j]
+            assert (labels[i] == labels[j]) == same
+    # the label is the lowest node id of the component, each of its nodes starts one of its edges
+    for label in np.unique(labels[labels >= 0]).tolist():
+        assert label == nodea[labels == label].min()
+
+
+def test_validate_network_flags():
+    # outlet 0 -> 1 drained by 2 -> 0 and 3 -> 2, dead end 2 -> 4 with the head to head 5 -> 4,
+    # orphan 6 -> 7 and cycle 8 -> 9 -> 8 flowing into the network
+    nodea = np.array([0, 2, 3, 2, 5, 6, 8, 9, 9])
+    nodeb = np.array([1, 0, 2, 4, 4, 7, 9, 8, 2])
+
+    errors = validate_network(nodea, nodeb, np.array([0]))
+
+    assert errors['flags'].tolist() == [0, 0, 0, SINK | CONFLICT, SINK | SOURCE | CONFLICT, ORPHAN, CYCLE, CYCLE, 0]
+    assert errors['component'].tolist() == [0, 0, 0, 0, 0, 6, 0, 0, 0]
+    assert error_labels(errors['flags'])[4] == 'puits,source,conflit'
+    assert error_counts(errors['flags']) == {'cycle': 2, 'puits': 2, 'source': 1, 'conflit': 2, 'orphelin': 1}
+
+
+def test_validate_network_flags_the_synthetic_defects(network):
+    nodea, nodeb, outlets = network['nodea'], network['nodeb'], network['outlets']
+
+    flags = validate_network(nodea, nodeb, outlets)['flags']
+
+    # the orphan reaches and the reversed reaches are found, the outlets are valid
+    assert np.count_nonzero(flags & ORPHAN) >= 0.5 * 0.01 * len(nodea)
+    assert np.count_nonzero(flags & (SINK | SOURCE | CONFLICT)) > 0
+    assert not np.any(flags[outlets] & SINK)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+-------------------------------------------------------------------------------
+"This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+-------------------------------------------------------------------------------
+"""
+
+import multiprocessing
+import os
+import sys
+
+from bdtopo2refhydro.workers import worker_executable
+
+
+def test_worker_executable_outside_qgis(monkeypatch):
+    monkeypatch.setattr(sys, 'executable', '/usr/bin/python3')
+    monkeypatch.setattr(multiprocessing, 'set_executable', lambda path: None)
+    assert worker_executable()
+
+
+def test_worker_executable_in_qgis(monkeypatch, tmp_path):
+    executables = []
+    monkeypatch.setattr(sys, 'executable', str(tmp_path / 'qgis-bin'))
+    monkeypatch.setattr(sys, 'exec_prefix', str(tmp_path))
+    monkeypatch.setattr(multiprocessing, 'set_executable', executables.append)
+
+    # no interpreter in the prefix, the caller computes serially
+    assert not worker_executable()
+    assert executables == []
+
+    python = tmp_path / ('python.exe' if os.name == 'nt' else os.path.join('bin', 'python3'))
+    python.parent.mkdir(exist_ok=True)
+    python.touch()
+    assert worker_executable()
+    assert executables == [str(python)]